@@ -81,8 +81,11 @@ def bind(app, schedule=True, include_dashboard=True):
     # flush cache to db before shutdown
     import atexit
     from flask_monitoringdashboard.core.cache import flush_cache
+    from flask_monitoringdashboard.core.ingestion import flush
 
     atexit.register(flush_cache)
+    # registered last, so that queued measurements are stored before the cache is flushed
+    atexit.register(flush)
 
     if not include_dashboard:
         @app.teardown_request
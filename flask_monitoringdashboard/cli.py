@@ -20,3 +20,45 @@ def init_db():
     import flask_monitoringdashboard.database
 
     print('Flask-MonitoringDashboard database has been created')
+
+
+@fmd.command()
+@click.option('--verify', is_flag=True,
+              help='Only list the missing indexes, without creating them.')
+@with_appcontext
+def indexes(verify):
+    """Creates the indexes that are missing in an existing database."""
+    from flask_monitoringdashboard.database import DatabaseConnectionWrapper
+
+    database_connection = DatabaseConnectionWrapper().database_connection
+    if verify:
+        missing = database_connection.get_missing_indexes()
+        for table, index in missing:
+            print('Missing index {} on {}'.format(index, table))
+        if missing:
+            raise SystemExit(1)
+        print('All indexes exist')
+        return
+
+    failed = 0
+    for table, index, error in database_connection.create_indexes():
+        if error is None:
+            print('Created index {} on {}'.format(index, table))
+        else:
+            failed += 1
+            print('Index {} on {} could not be created: {}'.format(index, table, error))
+    if failed:
+        raise SystemExit(1)
+    print('All indexes exist')
+
+
+@fmd.command()
+@with_appcontext
+def rebuild_rollups():
+    """Recomputes the rollups from the stored requests. Stop the application while rebuilding."""
+    from flask_monitoringdashboard.database import DatabaseConnectionWrapper
+    from flask_monitoringdashboard.database.rollup import rebuild_rollups as rebuild
+
+    with DatabaseConnectionWrapper().database_connection.session_scope() as session:
+        total = rebuild(session)
+    print('The rollups have been rebuilt from {} requests'.format(total))
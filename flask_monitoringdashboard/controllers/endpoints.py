@@ -1,6 +1,5 @@
 import datetime
 
-from numpy import median
 
 from flask_monitoringdashboard import config
 from flask_monitoringdashboard.core import cache
@@ -8,11 +7,12 @@ from flask_monitoringdashboard.core.blueprints import get_blueprint
 from flask_monitoringdashboard.core.colors import get_color
 from flask_monitoringdashboard.core.measurement import add_decorator
 from flask_monitoringdashboard.core.timezone import to_local_datetime, to_utc_datetime
-from flask_monitoringdashboard.core.utils import simplify
+from flask_monitoringdashboard.core.utils import simplify, get_simplify_quantiles
 from flask_monitoringdashboard.database import DatabaseConnectionWrapper
-from flask_monitoringdashboard.database.count_group import count_requests_group, get_value
+from flask_monitoringdashboard.database.count_group import count_requests_hits, get_value
 from flask_monitoringdashboard.database.data_grouped import (
     get_endpoint_data_grouped,
+    get_endpoint_percentile_grouped,
     get_user_data_grouped,
     get_version_data_grouped,
 )
@@ -21,10 +21,14 @@ from flask_monitoringdashboard.database.endpoint import (
     get_endpoints,
     get_endpoint_by_name,
     update_endpoint,
-    generate_request_error_hits_criterion,
     filter_by_time,
     filter_by_endpoint_id
 )
+from flask_monitoringdashboard.database.rollup import (
+    get_rollup_hits,
+    get_rollup_medians,
+    get_rollup_quantiles,
+)
 from flask_monitoringdashboard.database.versions import get_first_requests
 
 
@@ -40,23 +44,21 @@ def get_endpoint_overview(session):
 
     # First flush last requested info to db
     cache.flush_cache()
-    error_hits_criterion = generate_request_error_hits_criterion()
-
-    hits_today = count_requests_group(session, filter_by_time(today_utc))
-    hits_today_errors = count_requests_group(
-        session, filter_by_time(today_utc, error_hits_criterion)
-    )
-
-    hits_week = count_requests_group(session, filter_by_time(week_ago))
-    hits_week_errors = count_requests_group(
-        session, filter_by_time(week_ago, error_hits_criterion)
-    )
-
-    hits = count_requests_group(session)
 
-    median_today = get_endpoint_data_grouped(session, median, filter_by_time(today_utc))
-    median_week = get_endpoint_data_grouped(session, median, filter_by_time(week_ago))
-    median_overall = get_endpoint_data_grouped(session, median)
+    if config.use_rollups:
+        hits_today, hits_today_errors = get_rollup_hits(session, today_utc)
+        hits_week, hits_week_errors = get_rollup_hits(session, week_ago)
+        hits, _ = get_rollup_hits(session)
+        median_today = get_rollup_medians(session, today_utc)
+        median_week = get_rollup_medians(session, week_ago)
+        median_overall = get_rollup_medians(session)
+    else:
+        hits_today, hits_today_errors, hits_week, hits_week_errors, hits = count_requests_hits(
+            session, today_utc, week_ago
+        )
+        median_today = get_endpoint_percentile_grouped(session, 0.5, filter_by_time(today_utc))
+        median_week = get_endpoint_percentile_grouped(session, 0.5, filter_by_time(week_ago))
+        median_overall = get_endpoint_percentile_grouped(session, 0.5)
     access_times = get_last_requested(session)
 
     return [
@@ -109,9 +111,14 @@ def get_endpoint_versions(session, endpoint_id, versions):
     :param versions: a list of version to be filtered on
     :return: a list of dicts with the performance of each version
     """
-    times = get_version_data_grouped(
-        session, lambda x: simplify(x, 100), filter_by_endpoint_id(endpoint_id)
-    )
+    if config.use_rollups:
+        times = get_rollup_quantiles(
+            session, get_simplify_quantiles(100), endpoint_id=endpoint_id, by_version=True
+        )
+    else:
+        times = get_version_data_grouped(
+            session, lambda x: simplify(x, 100), filter_by_endpoint_id(endpoint_id)
+        )
     first_requests = get_first_requests(session, endpoint_id)
     return [
         {
@@ -131,7 +138,10 @@ def get_api_performance(endpoints):
     """
     with DatabaseConnectionWrapper().database_connection.session_scope() as session:
         db_endpoints = [get_endpoint_by_name(session, end) for end in endpoints]
-        data = get_endpoint_data_grouped(session, lambda x: simplify(x, 10))
+        if config.use_rollups:
+            data = get_rollup_quantiles(session, get_simplify_quantiles(10))
+        else:
+            data = get_endpoint_data_grouped(session, lambda x: simplify(x, 10))
         return [
             {'name': end.name, 'values': get_value(data, end.id, default=[])}
             for end in db_endpoints
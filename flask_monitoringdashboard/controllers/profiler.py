@@ -38,14 +38,20 @@ def get_grouped_profiler(session, endpoint_id):
     :param endpoint_id: endpoint to filter on
     :return:
     """
-    requests = get_grouped_profiled_requests(session, endpoint_id)
+    return group_profiled_requests(get_grouped_profiled_requests(session, endpoint_id))
 
+
+def group_profiled_requests(requests):
+    """
+    :param requests: list of Request objects, together with their stack lines
+    :return: a list of dicts, with the aggregated stack lines of all requests
+    """
     histogram = defaultdict(list)  # path -> [list of values]
     path_hash = PathHash()
 
     for r in requests:
-        for index, stack_line in enumerate(r.stack_lines):
-            key = path_hash.get_stacklines_path(r.stack_lines, index)
+        paths = path_hash.get_stacklines_paths(r.stack_lines)
+        for key, stack_line in zip(paths, r.stack_lines):
             histogram[key].append(stack_line.duration)
 
     table = []
@@ -1,13 +1,17 @@
 import datetime
+from collections import defaultdict
+
 import numpy
+from flask_monitoringdashboard import config
 from flask_monitoringdashboard.core.timezone import to_utc_datetime, to_local_datetime
 from flask_monitoringdashboard.database.count_group import count_requests_per_day, get_value
-from flask_monitoringdashboard.database.endpoint import get_endpoints, get_num_requests
+from flask_monitoringdashboard.database.endpoint import get_endpoints, get_num_requests_per_hour
 from flask_monitoringdashboard.database.request import (
     get_status_code_frequencies,
     get_all_request_status_code_counts,
     get_error_requests_db
 )
+from flask_monitoringdashboard.database.rollup import HOUR, get_rollup_buckets
 
 
 def get_error_requests(session, endpoint_id, *criterion):
@@ -24,7 +28,10 @@ def get_num_requests_data(session, start_date, end_date):
     numdays = (end_date - start_date).days + 1
     days = [start_date + datetime.timedelta(days=i) for i in range(numdays)]
 
-    hits = count_requests_per_day(session, days)
+    if config.use_rollups:
+        hits = count_requests_per_day_rollup(session, days)
+    else:
+        hits = count_requests_per_day(session, days)
     endpoints = get_endpoints(session)
     data = [
         {'name': end.name, 'values': [get_value(hits_day, end.id) for hits_day in hits]}
@@ -34,6 +41,24 @@ def get_num_requests_data(session, start_date, end_date):
     return {'days': [d.strftime('%Y-%m-%d') for d in days], 'data': data}
 
 
+def count_requests_per_day_rollup(session, days):
+    """
+    Same as count_requests_per_day, but computed from the hourly rollups.
+    :param session: session for the database
+    :param days: list with consecutive days (datetime objects)
+    :return: for every day, a list of (endpoint_id, hits) tuples
+    """
+    first_day = datetime.datetime.combine(days[0], datetime.time(0, 0, 0))
+    start = to_utc_datetime(first_day)
+    end = start + datetime.timedelta(days=len(days))
+    hits = [defaultdict(int) for _ in days]
+    for endpoint_id, bucket, count in get_rollup_buckets(session, HOUR, start, end):
+        day_index = (to_local_datetime(bucket) - first_day).days
+        if 0 <= day_index < len(days):
+            hits[day_index][endpoint_id] += count
+    return [list(hits_day.items()) for hits_day in hits]
+
+
 def get_status_code_distribution(session, endpoint_id):
     """
     Gets the distribution of status codes returned by the given endpoint.
@@ -73,12 +98,21 @@ def get_hourly_load(session, endpoint_id, start_date, end_date):
         datetime.datetime.combine(start_date, datetime.time(0, 0, 0, 0))
     )
     end_datetime = to_utc_datetime(datetime.datetime.combine(end_date, datetime.time(23, 59, 59)))
-
-    for time, count in get_num_requests(session, endpoint_id, start_datetime, end_datetime):
-        parsed_time = datetime.datetime.strptime(time, '%Y-%m-%d %H:%M:%S')
-        day_index = (parsed_time - start_datetime).days
-        hour_index = int(to_local_datetime(parsed_time).strftime('%H'))
-        heatmap_data[hour_index][day_index] = count
+    first_day = datetime.datetime.combine(start_date, datetime.time(0, 0, 0))
+
+    if config.use_rollups:
+        for _, bucket, count in get_rollup_buckets(
+                session, HOUR, start_datetime, end_datetime, endpoint_id):
+            local_time = to_local_datetime(bucket)
+            day_index = (local_time - first_day).days
+            if 0 <= day_index < numdays:
+                heatmap_data[local_time.hour][day_index] += count
+    else:
+        for local_time, count in get_num_requests_per_hour(
+                session, endpoint_id, start_datetime, end_datetime):
+            day_index = (local_time - first_day).days
+            if 0 <= day_index < numdays:
+                heatmap_data[local_time.hour][day_index] = count
     return {
         'days': [
             (start_date + datetime.timedelta(days=i)).strftime('%Y-%m-%d') for i in range(numdays)
@@ -1,12 +1,11 @@
 import numpy
 
-from flask_monitoringdashboard.database.count_group import get_value, count_requests_group
-from flask_monitoringdashboard.database.data_grouped import get_two_columns_grouped
-from flask_monitoringdashboard.database.endpoint import get_endpoint_by_name
+from flask_monitoringdashboard.database.count_group import get_value
+from flask_monitoringdashboard.database.data_grouped import get_two_columns_median_grouped
 from flask_monitoringdashboard.database.versions import (
     get_first_requests,
     get_2d_version_data_filter,
-    get_version_requested_query,
+    get_hits_per_endpoint_and_version,
     get_field_name
 )
 
@@ -21,7 +20,9 @@ def get_2d_version_data(session, endpoint_id, versions, column_data, column):
     :return: a dict with 2d information about the version and another column
     """
     first_request = get_first_requests(session, endpoint_id)
-    values = get_two_columns_grouped(session, column, get_2d_version_data_filter(endpoint_id))
+    values = get_two_columns_median_grouped(
+        session, column, get_2d_version_data_filter(endpoint_id, column, column_data, versions)
+    )
     data = [[get_value(values, (data, v)) for v in versions] for data in column_data]
 
     return {
@@ -44,20 +45,26 @@ def get_multi_version_data(session, endpoints, versions):
     :param endpoints: a list of all endpoints for which the data must be
         collected (represented by their name)
     :param versions: a list of versions
-    :return: a 2d list of data
+    :return: a 2d list with, for every endpoint and version, the percentage of the hits of that
+        version that were handled by the endpoint
     """
-    endpoints = [get_endpoint_by_name(session, name) for name in endpoints]
-    requests = [count_requests_group(session,
-                                     get_version_requested_query(v))
-                for v in versions]
+    endpoint_index = {name: i for i, name in enumerate(dict.fromkeys(endpoints))}
+    version_index = {version: i for i, version in enumerate(dict.fromkeys(versions))}
+    total_hits = numpy.zeros(len(version_index))
+    hits = numpy.zeros((len(endpoint_index), len(version_index)))
 
-    total_hits = numpy.zeros(len(versions))
-    hits = numpy.zeros((len(endpoints), len(versions)))
+    rows = get_hits_per_endpoint_and_version(session, list(version_index))
+    if rows:
+        names, row_versions, counts = zip(*rows)
+        columns = numpy.array([version_index[v] for v in row_versions])
+        counts = numpy.array(counts, dtype=float)
+        numpy.add.at(total_hits, columns, counts)
 
-    for i, _ in enumerate(versions):
-        total_hits[i] = max(1, sum([value for key, value in requests[i]]))
+        indices = numpy.array([endpoint_index.get(name, -1) for name in names])
+        known = indices >= 0
+        numpy.add.at(hits, (indices[known], columns[known]), counts[known])
 
-    for j, _ in enumerate(endpoints):
-        for i, _ in enumerate(versions):
-            hits[j][i] = get_value(requests[i], endpoints[j].id) * 100 / total_hits[i]
-    return hits.tolist()
+    percentages = hits * 100 / numpy.maximum(total_hits, 1)
+    rows = [endpoint_index[name] for name in endpoints]
+    columns = [version_index[v] for v in versions]
+    return percentages[numpy.ix_(rows, columns)].tolist()
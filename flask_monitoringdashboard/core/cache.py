@@ -7,6 +7,7 @@ import logging
 
 from flask_monitoringdashboard.core.rules import get_rules
 from flask_monitoringdashboard.database import DatabaseConnectionWrapper
+from flask_monitoringdashboard.database.code_line import init_code_line_cache
 from flask_monitoringdashboard.database.endpoint import (
     get_last_requested,
     get_endpoints_hits,
@@ -63,6 +64,7 @@ def init_cache():
                 average_duration=averages_dict.get(rule.endpoint),
                 hits=hits_dict.get(rule.endpoint),
             )
+        init_code_line_cache(session)
 
 
 def add_to_cache(endpoint_name):
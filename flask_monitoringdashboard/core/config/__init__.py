@@ -42,6 +42,28 @@ class Config(object):
         # database
         self.database_name = 'sqlite:///flask_monitoringdashboard.db'
         self.table_prefix = ''
+        self.ingestion_queue_size = 10000
+        self.ingestion_overflow_policy = 'drop-oldest'
+        self.ingestion_workers = 1
+        self.ingestion_batch_size = 100
+        self.ingestion_flush_interval = 1.0
+        self.code_line_cache_size = 10000
+        self.use_rollups = False
+        self.sketch_relative_accuracy = 0.01
+        self.mongo_read_preference = 'primaryPreferred'
+        self.mongo_read_concern = 'local'
+        self.mongo_retry_attempts = 3
+        self.mongo_retry_backoff = 0.5
+        self.mongo_max_pool_size = 100
+        self.mongo_min_pool_size = 0
+        self.mongo_write_concern = 1
+        self.mongo_journal = False
+        self.mongo_compressors = ''
+        self.mongo_connect_timeout = 5.0
+        self.mongo_socket_timeout = 10.0
+        self.mongo_server_selection_timeout = 5.0
+        self.mongo_wait_queue_timeout = 5.0
+        self.mongo_embedded_profiles = False
 
         # authentication
         self.username = 'admin'
@@ -117,6 +139,44 @@ class Config(object):
                 result of each project is stored in its own database.
             - TABLE_PREFIX: A prefix to every table that the Flask-MonitoringDashboard uses, to
                 ensure that there are no conflicts with the user of the dashboard.
+            - INGESTION_QUEUE_SIZE: Maximum number of measurements that are waiting to be stored
+                in the database. The default value is 10000.
+            - INGESTION_OVERFLOW_POLICY: What to do with a new measurement when the queue is full.
+                Either 'drop-oldest' (default), 'drop-newest' or 'block'.
+            - INGESTION_WORKERS: Number of background threads that store the measurements.
+                The default value is 1.
+            - INGESTION_BATCH_SIZE: Maximum number of measurements that are inserted in a single
+                round trip. The default value is 100.
+            - INGESTION_FLUSH_INTERVAL: Maximum time (in seconds) a measurement waits in the queue
+                before a (partial) batch is written. The default value is 1.0.
+            - CODE_LINE_CACHE_SIZE: Maximum number of code lines of which the id is kept in memory.
+                Use 0 to disable the cache. The default value is 10000.
+            - USE_ROLLUPS: Whether the overview and the hits-charts are computed from the
+                pre-aggregated rollups instead of the Request table. The default value is False.
+            - SKETCH_RELATIVE_ACCURACY: Relative accuracy of the medians and percentiles that are
+                computed from the rollups. The default value is 0.01 (1%).
+            - MONGO_READ_PREFERENCE: Read preference of the MongoDB client. The default value is
+                'primaryPreferred'.
+            - MONGO_READ_CONCERN: Read concern level of the MongoDB client. The default value is
+                'local'.
+            - MONGO_RETRY_ATTEMPTS: Number of times a MongoDB operation is attempted when the
+                connection fails. The default value is 3.
+            - MONGO_RETRY_BACKOFF: Time (in seconds) to wait before the first retry. It doubles
+                after every retry. The default value is 0.5.
+            - MONGO_MAX_POOL_SIZE and MONGO_MIN_POOL_SIZE: Maximum and minimum number of
+                connections in the pool of the MongoDB client. The default values are 100 and 0.
+            - MONGO_WRITE_CONCERN: Write concern (w) of the measurements, e.g. 1, 'majority' or 0
+                for unacknowledged writes. The default value is 1.
+            - MONGO_JOURNAL: Whether writes wait for the journal (j). The default value is False.
+            - MONGO_COMPRESSORS: Comma separated list of wire protocol compressors, e.g.
+                'zstd,snappy'. The default value is '' (no compression).
+            - MONGO_CONNECT_TIMEOUT, MONGO_SOCKET_TIMEOUT, MONGO_SERVER_SELECTION_TIMEOUT and
+                MONGO_WAIT_QUEUE_TIMEOUT: Timeouts (in seconds) of the MongoDB client. The default
+                values are 5.0, 10.0, 5.0 and 5.0.
+            - MONGO_EMBEDDED_PROFILES: Whether the stack lines of a profiled request are embedded
+                in its Request document, instead of stored in the StackLine collection. Profiles
+                that are already in the StackLine collection are then no longer shown. The default
+                value is False.
 
             The config_file must at least contains the following variables in section
             'visualization':
@@ -182,6 +242,69 @@ class Config(object):
             # database
             self.database_name = parse_string(parser, 'database', 'DATABASE', self.database_name)
             self.table_prefix = parse_string(parser, 'database', 'TABLE_PREFIX', self.table_prefix)
+            self.ingestion_queue_size = parse_literal(
+                parser, 'database', 'INGESTION_QUEUE_SIZE', self.ingestion_queue_size
+            )
+            self.ingestion_overflow_policy = parse_string(
+                parser, 'database', 'INGESTION_OVERFLOW_POLICY', self.ingestion_overflow_policy
+            )
+            self.ingestion_workers = parse_literal(
+                parser, 'database', 'INGESTION_WORKERS', self.ingestion_workers
+            )
+            self.ingestion_batch_size = parse_literal(
+                parser, 'database', 'INGESTION_BATCH_SIZE', self.ingestion_batch_size
+            )
+            self.ingestion_flush_interval = parse_literal(
+                parser, 'database', 'INGESTION_FLUSH_INTERVAL', self.ingestion_flush_interval
+            )
+            self.code_line_cache_size = parse_literal(
+                parser, 'database', 'CODE_LINE_CACHE_SIZE', self.code_line_cache_size
+            )
+            self.use_rollups = parse_bool(parser, 'database', 'USE_ROLLUPS', self.use_rollups)
+            self.sketch_relative_accuracy = parse_literal(
+                parser, 'database', 'SKETCH_RELATIVE_ACCURACY', self.sketch_relative_accuracy
+            )
+            self.mongo_read_preference = parse_string(
+                parser, 'database', 'MONGO_READ_PREFERENCE', self.mongo_read_preference
+            )
+            self.mongo_read_concern = parse_string(
+                parser, 'database', 'MONGO_READ_CONCERN', self.mongo_read_concern
+            )
+            self.mongo_retry_attempts = parse_literal(
+                parser, 'database', 'MONGO_RETRY_ATTEMPTS', self.mongo_retry_attempts
+            )
+            self.mongo_retry_backoff = parse_literal(
+                parser, 'database', 'MONGO_RETRY_BACKOFF', self.mongo_retry_backoff
+            )
+            self.mongo_max_pool_size = parse_literal(
+                parser, 'database', 'MONGO_MAX_POOL_SIZE', self.mongo_max_pool_size
+            )
+            self.mongo_min_pool_size = parse_literal(
+                parser, 'database', 'MONGO_MIN_POOL_SIZE', self.mongo_min_pool_size
+            )
+            self.mongo_write_concern = parse_string(
+                parser, 'database', 'MONGO_WRITE_CONCERN', self.mongo_write_concern
+            )
+            self.mongo_journal = parse_bool(parser, 'database', 'MONGO_JOURNAL', self.mongo_journal)
+            self.mongo_compressors = parse_string(
+                parser, 'database', 'MONGO_COMPRESSORS', self.mongo_compressors
+            )
+            self.mongo_connect_timeout = parse_literal(
+                parser, 'database', 'MONGO_CONNECT_TIMEOUT', self.mongo_connect_timeout
+            )
+            self.mongo_socket_timeout = parse_literal(
+                parser, 'database', 'MONGO_SOCKET_TIMEOUT', self.mongo_socket_timeout
+            )
+            self.mongo_server_selection_timeout = parse_literal(
+                parser, 'database', 'MONGO_SERVER_SELECTION_TIMEOUT',
+                self.mongo_server_selection_timeout
+            )
+            self.mongo_wait_queue_timeout = parse_literal(
+                parser, 'database', 'MONGO_WAIT_QUEUE_TIMEOUT', self.mongo_wait_queue_timeout
+            )
+            self.mongo_embedded_profiles = parse_bool(
+                parser, 'database', 'MONGO_EMBEDDED_PROFILES', self.mongo_embedded_profiles
+            )
 
             # visualization
             self.colors = parse_literal(parser, 'visualization', 'COLORS', self.colors)
@@ -0,0 +1,357 @@
+"""
+    Contains the background ingestion path for request measurements.
+    The wrappers from measurement.py only put a small Measurement-record into a bounded in-memory
+    queue. One (or a small pool of) long-lived writer threads drain this queue and store the
+    measurements in the database.
+"""
+import datetime
+import os
+import threading
+import time
+from collections import deque
+
+from flask_monitoringdashboard import config
+from flask_monitoringdashboard.core.cache import update_duration_cache
+from flask_monitoringdashboard.core.logger import log
+from flask_monitoringdashboard.database import DatabaseConnectionWrapper
+from flask_monitoringdashboard.database.code_line import code_line_cache
+from flask_monitoringdashboard.database.outlier import add_outlier
+from flask_monitoringdashboard.database.request import add_request, add_requests
+from flask_monitoringdashboard.database.rollup import add_rollups
+from flask_monitoringdashboard.database.stack_line import add_stack_lines
+
+DROP_OLDEST = 'drop-oldest'
+DROP_NEWEST = 'drop-newest'
+BLOCK = 'block'
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+
+class Measurement(object):
+    """
+    A single measured request, waiting to be stored in the database.
+    """
+
+    __slots__ = (
+        'endpoint_id',
+        'endpoint_name',
+        'duration',
+        'ip',
+        'group_by',
+        'status_code',
+        'time_requested',
+        'stack_lines',
+        'profile',
+        'outlier',
+    )
+
+    def __init__(self, endpoint, duration, ip, group_by, status_code, stack_lines=None,
+                 outlier=None, profile=None):
+        """
+        :param endpoint: Endpoint object
+        :param duration: duration of the request in ms
+        :param ip: IP address of the requester
+        :param group_by: a criteria by which the requests can be grouped
+        :param status_code: HTTP status code of the request
+        :param stack_lines: optional list of (indent, duration, code_line) tuples
+        :param outlier: optional tuple of (cpu_percent, memory, stacktrace, request)
+        :param profile: optional raw profile with a `get_stack_lines()` method, which is converted
+        into stack lines by the writer thread
+        """
+        self.endpoint_id = endpoint.id
+        self.endpoint_name = endpoint.name
+        self.duration = duration
+        self.ip = ip
+        self.group_by = group_by
+        self.status_code = status_code
+        self.time_requested = datetime.datetime.utcnow()
+        self.stack_lines = stack_lines
+        self.profile = profile
+        self.outlier = outlier
+
+    def resolve_profile(self):
+        """
+        Converts the raw profile into stack lines. This looks up source code, so it is done by the
+        writer thread instead of the thread that took the samples.
+        """
+        if self.profile is not None:
+            self.stack_lines = self.profile.get_stack_lines()
+            self.profile = None
+
+    def request_values(self):
+        """
+        :return: a dict with the values of the Request row of this measurement
+        """
+        return dict(
+            duration=self.duration,
+            endpoint_id=self.endpoint_id,
+            ip=self.ip,
+            group_by=self.group_by,
+            status_code=self.status_code,
+            time_requested=self.time_requested,
+        )
+
+
+class IngestionQueue(object):
+    """
+    Bounded FIFO-queue with a configurable overflow policy:
+    - drop-oldest: the oldest queued measurement is discarded to make room for the new one
+    - drop-newest: the new measurement is discarded
+    - block: the caller waits until there is room in the queue
+    """
+
+    def __init__(self, maxsize, policy=DROP_OLDEST):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError('Unknown overflow policy: {}'.format(policy))
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._all_done = threading.Condition(self._lock)
+        self._unfinished = 0
+        self._flush_requested = False
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+
+    def put(self, item):
+        """
+        Adds an item to the queue, respecting the overflow policy.
+        :return: True if the item is queued, False if it was dropped
+        """
+        with self._lock:
+            if len(self._items) >= self.maxsize:
+                if self.policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                if self.policy == DROP_OLDEST:
+                    self._items.popleft()
+                    self._unfinished -= 1
+                    self.dropped += 1
+                else:
+                    while len(self._items) >= self.maxsize:
+                        self._not_full.wait()
+            self._items.append(item)
+            self._unfinished += 1
+            self.enqueued += 1
+            self._not_empty.notify()
+            return True
+
+    def get_batch(self, max_items, timeout=None):
+        """
+        Waits until the queue contains `max_items` items, or until `timeout` seconds have passed.
+        A pending join() ends the wait immediately, unless the queue is empty.
+        :return: a list with at most `max_items` items, possibly empty
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._lock:
+            # an empty queue is waited for, even if a flush is requested; otherwise idle writers
+            # would spin while another writer finishes its batch
+            while len(self._items) < max_items and not (self._flush_requested and self._items):
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    break
+                self._not_empty.wait(remaining)
+            batch = []
+            while self._items and len(batch) < max_items:
+                batch.append(self._items.popleft())
+            if batch:
+                self._not_full.notify_all()
+            return batch
+
+    def task_done(self, count, failed=0):
+        """ Marks `count` items that were returned by get_batch as processed. """
+        with self._lock:
+            self._unfinished -= count
+            self.written += count - failed
+            self.failed += failed
+            if self._unfinished <= 0:
+                self._unfinished = 0
+                self._flush_requested = False
+                self._all_done.notify_all()
+
+    def join(self, timeout=None):
+        """
+        Waits until all queued items are processed.
+        :return: True if the queue is drained, False if the timeout expired
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._lock:
+            if self._unfinished > 0:
+                self._flush_requested = True
+                self._not_empty.notify_all()
+            while self._unfinished > 0:
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._all_done.wait(remaining)
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'policy': self.policy,
+                'maxsize': self.maxsize,
+                'queued': len(self._items),
+                'enqueued': self.enqueued,
+                'dropped': self.dropped,
+                'written': self.written,
+                'failed': self.failed,
+            }
+
+
+class IngestionWriter(threading.Thread):
+    """
+    Long-lived thread that drains the IngestionQueue and stores the measurements.
+    """
+
+    def __init__(self, queue, batch_size, flush_interval):
+        threading.Thread.__init__(self, name='fmd-ingestion-writer')
+        self.daemon = True
+        self._queue = queue
+        self._batch_size = max(1, int(batch_size))
+        self._flush_interval = flush_interval
+
+    def run(self):
+        while True:
+            batch = self._queue.get_batch(self._batch_size, timeout=self._flush_interval)
+            if batch:
+                self._queue.task_done(len(batch), failed=store_measurements(batch))
+
+
+def store_measurements(measurements):
+    """
+    Stores a list of measurements in the database, using a single session. If USE_ROLLUPS is
+    enabled, the measurements are added to the rollups in the same session, such that the rollups
+    can't drift from the stored requests. Raw profiles are first converted into stack lines; a
+    measurement whose profile can't be converted is not stored.
+    :param measurements: list of Measurement objects
+    :return: the number of measurements that could not be stored
+    """
+    resolved = resolve_profiles(measurements)
+    try:
+        with DatabaseConnectionWrapper().database_connection.session_scope() as session:
+            add_measurements(session, resolved)
+            if config.use_rollups:
+                add_rollups(session, resolved)
+    except Exception as error:
+        log('Measurements could not be stored: {}'.format(error))
+        # the cache could contain ids of code lines that have been rolled back
+        code_line_cache.clear()
+        # the whole batch has been rolled back, including its rollups
+        return len(measurements)
+    for measurement in resolved:
+        update_duration_cache(
+            endpoint_name=measurement.endpoint_name, duration=measurement.duration
+        )
+    return len(measurements) - len(resolved)
+
+
+def resolve_profiles(measurements):
+    """
+    Converts the raw profiles of the measurements into stack lines.
+    :param measurements: list of Measurement objects
+    :return: the measurements whose profile could be converted, or that don't have a profile
+    """
+    resolved = []
+    for measurement in measurements:
+        try:
+            measurement.resolve_profile()
+            resolved.append(measurement)
+        except Exception as error:
+            log('Profile could not be resolved: {}'.format(error))
+    return resolved
+
+
+def add_measurements(session, measurements):
+    """
+    Adds the measurements to the session. Measurements without stack lines or outlier information
+    are inserted in a single round trip.
+    :param session: session for the database
+    :param measurements: list of Measurement objects
+    """
+    add_requests(session, [m.request_values() for m in measurements
+                           if not m.stack_lines and not m.outlier])
+    for measurement in measurements:
+        if measurement.stack_lines or measurement.outlier:
+            store_measurement(session, measurement)
+
+
+def store_measurement(session, measurement):
+    """
+    Stores a single measurement, together with its stack lines and outlier information.
+    :param session: session for the database
+    :param measurement: Measurement object
+    """
+    request_id = add_request(session, **measurement.request_values())
+    if measurement.stack_lines:
+        add_stack_lines(session, request_id, measurement.stack_lines, measurement.endpoint_id,
+                        measurement.time_requested)
+    if measurement.outlier:
+        cpu_percent, memory, stacktrace, request = measurement.outlier
+        add_outlier(session, request_id, cpu_percent, memory, stacktrace, request,
+                    measurement.endpoint_id, measurement.time_requested)
+
+
+_queue = None
+_pid = None
+_start_lock = threading.Lock()
+
+
+def get_queue():
+    """
+    Returns the queue of this process. The queue and its writers are created lazily, such that
+    every worker-process of a pre-forking server starts its own writer threads.
+    """
+    global _queue, _pid
+    if _queue is not None and _pid == os.getpid():
+        return _queue
+    with _start_lock:
+        if _queue is None or _pid != os.getpid():
+            queue = IngestionQueue(config.ingestion_queue_size, config.ingestion_overflow_policy)
+            for _ in range(max(1, int(config.ingestion_workers))):
+                IngestionWriter(
+                    queue, config.ingestion_batch_size, config.ingestion_flush_interval
+                ).start()
+            _queue, _pid = queue, os.getpid()
+    return _queue
+
+
+def enqueue(measurement):
+    """
+    Hands a measurement over to the background writers. This is the only work that is done in
+    the thread that handles the request.
+    :param measurement: Measurement object
+    :return: True if the measurement is queued, False if it was dropped
+    """
+    return get_queue().put(measurement)
+
+
+def flush(timeout=5):
+    """
+    Waits until all queued measurements are stored in the database. To be called at shut down.
+    :param timeout: maximum number of seconds to wait
+    :return: True if all measurements are stored
+    """
+    if _queue is None or _pid != os.getpid():
+        return True
+    return _queue.join(timeout)
+
+
+def get_ingestion_stats():
+    """
+    :return: a dict with the number of queued, stored and dropped measurements of this process
+    """
+    if _queue is None or _pid != os.getpid():
+        return {
+            'policy': config.ingestion_overflow_policy,
+            'maxsize': max(1, int(config.ingestion_queue_size)),
+            'queued': 0,
+            'enqueued': 0,
+            'dropped': 0,
+            'written': 0,
+            'failed': 0,
+        }
+    return _queue.stats()
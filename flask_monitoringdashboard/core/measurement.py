@@ -7,8 +7,8 @@ from functools import wraps
 
 from flask_monitoringdashboard import config
 from flask_monitoringdashboard.core.profiler import (
-    start_thread_last_requested,
-    start_performance_thread,
+    record_last_requested,
+    record_performance,
     start_outlier_thread,
     start_profiler_and_outlier_thread,
 )
@@ -51,7 +51,7 @@ def add_wrapper0(endpoint, fun):
     @wraps(fun)
     def wrapper(*args, **kwargs):
         result = fun(*args, **kwargs)
-        start_thread_last_requested(endpoint)
+        record_last_requested(endpoint)
         return result
 
     wrapper.original = fun
@@ -125,7 +125,7 @@ def add_wrapper1(endpoint, fun):
         result, status_code, raised_exception = evaluate(fun, args, kwargs)
 
         duration = time.time() - start_time
-        start_performance_thread(endpoint, duration, status_code)
+        record_performance(endpoint, duration, status_code)
 
         if raised_exception:
             raise raised_exception
@@ -159,13 +159,13 @@ def add_wrapper2(endpoint, fun):
 def add_wrapper3(endpoint, fun):
     @wraps(fun)
     def wrapper(*args, **kwargs):
-        thread = start_profiler_and_outlier_thread(endpoint)
+        profiler = start_profiler_and_outlier_thread(endpoint)
         start_time = time.time()
 
         result, status_code, raised_exception = evaluate(fun, args, kwargs)
 
         duration = time.time() - start_time
-        thread.stop(duration, status_code)
+        profiler.stop(duration, status_code)
 
         if raised_exception:
             raise raised_exception
@@ -1,39 +1,40 @@
 import threading
 
+from flask_monitoringdashboard.core.cache import update_last_requested_cache
 from flask_monitoringdashboard.core.get_ip import get_ip
 from flask_monitoringdashboard.core.group_by import get_group_by
-from flask_monitoringdashboard.core.profiler.base_profiler import BaseProfiler
+from flask_monitoringdashboard.core.ingestion import Measurement, enqueue
 from flask_monitoringdashboard.core.profiler.outlier_profiler import OutlierProfiler
-from flask_monitoringdashboard.core.profiler.performance_profiler import PerformanceProfiler
 from flask_monitoringdashboard.core.profiler.stacktrace_profiler import StacktraceProfiler
 
 
-def start_thread_last_requested(endpoint):
+def record_last_requested(endpoint):
     """
-    Starts a thread that updates the last_requested time in the database.
+    Updates the last_requested time of the endpoint in the in-memory cache.
+    Used for monitoring-level == 0
     :param endpoint: Endpoint object
     """
-    BaseProfiler(endpoint).start()
+    update_last_requested_cache(endpoint_name=endpoint.name)
 
 
-def start_performance_thread(endpoint, duration, status_code):
+def record_performance(endpoint, duration, status_code):
     """
-    Starts a thread that updates performance, utilization and last_requested in the database.
+    Queues a measurement for updating performance, utilization and last_requested in the database.
+    Used for monitoring-level == 1
     :param endpoint: Endpoint object
-    :param duration: duration of the request
+    :param duration: duration of the request (in seconds)
     :param status_code: HTTP status code of the request
     """
-    group_by = get_group_by()
-    PerformanceProfiler(endpoint, get_ip(), duration, group_by, status_code).start()
+    enqueue(Measurement(endpoint, duration * 1000, get_ip(), get_group_by(), status_code))
 
 
-def start_profiler_thread(endpoint):
-    """ Starts a thread that profiles the main thread. """
+def start_profiler(endpoint):
+    """ Starts profiling the current thread, using the sampler of this process. """
     current_thread = threading.current_thread().ident
     group_by = get_group_by()
-    thread = StacktraceProfiler(current_thread, endpoint, get_ip(), group_by)
-    thread.start()
-    return thread
+    profiler = StacktraceProfiler(current_thread, endpoint, get_ip(), group_by)
+    profiler.start()
+    return profiler
 
 
 def start_outlier_thread(endpoint):
@@ -46,12 +47,15 @@ def start_outlier_thread(endpoint):
 
 
 def start_profiler_and_outlier_thread(endpoint):
-    """ Starts two threads: PerformanceProfiler and StacktraceProfiler.  """
+    """
+    Starts a thread that collects outliers, and profiles the current thread using the sampler
+    of this process.
+    """
     current_thread = threading.current_thread().ident
     ip = get_ip()
     group_by = get_group_by()
     outlier = OutlierProfiler(current_thread, endpoint, ip, group_by)
-    thread = StacktraceProfiler(current_thread, endpoint, ip, group_by, outlier)
-    thread.start()
+    profiler = StacktraceProfiler(current_thread, endpoint, ip, group_by, outlier)
+    profiler.start()
     outlier.start()
-    return thread
+    return profiler
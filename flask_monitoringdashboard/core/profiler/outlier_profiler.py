@@ -1,16 +1,14 @@
 import sys
 import threading
-import traceback
 
 import psutil
 from flask import request
 
 from flask_monitoringdashboard import config
-from flask_monitoringdashboard.core.cache import update_duration_cache, get_avg_endpoint
+from flask_monitoringdashboard.core.cache import get_avg_endpoint
+from flask_monitoringdashboard.core.ingestion import Measurement, enqueue
 from flask_monitoringdashboard.core.logger import log
-from flask_monitoringdashboard.database import DatabaseConnectionWrapper
-from flask_monitoringdashboard.database.outlier import add_outlier
-from flask_monitoringdashboard.database.request import add_request
+from flask_monitoringdashboard.core.profiler.util.frame_walker import walk_frames, get_source_line
 
 
 class OutlierProfiler(threading.Thread):
@@ -43,13 +41,16 @@ class OutlierProfiler(threading.Thread):
                 log('Can\'t get the stacktrace of the main thread.')
                 return
             in_endpoint_code = False
-            # filename, line number, function name, source code line
-            for fn, ln, fun, line in traceback.extract_stack(frame):
+            # code object, line number
+            for code, ln in walk_frames(frame):
+                fn, fun = code.co_filename, code.co_name
                 if self._endpoint.name == fun:
                     in_endpoint_code = True
                 if in_endpoint_code:
                     stack_list.append(
-                        'File: "{}", line {}, in "{}": "{}"'.format(fn, ln, fun, line)
+                        'File: "{}", line {}, in "{}": "{}"'.format(
+                            fn, ln, fun, get_source_line(fn, ln)
+                        )
                     )
 
             # Set the values in the object
@@ -59,36 +60,25 @@ class OutlierProfiler(threading.Thread):
 
     def stop(self, duration, status_code):
         self._exit.set()
-        update_duration_cache(endpoint_name=self._endpoint.name, duration=duration * 1000)
-        with DatabaseConnectionWrapper().database_connection.session_scope() as session:
-            request_id = add_request(
-                session,
-                duration=duration * 1000,
-                endpoint_id=self._endpoint.id,
-                ip=self._ip,
-                group_by=self._group_by,
-                status_code=status_code,
+        enqueue(
+            Measurement(
+                self._endpoint,
+                duration * 1000,
+                self._ip,
+                self._group_by,
+                status_code,
+                outlier=self.get_outlier(),
             )
-            if self._memory:
-                add_outlier(
-                    session,
-                    request_id,
-                    self._cpu_percent,
-                    self._memory,
-                    self._stacktrace,
-                    self._request,
-                )
+        )
 
     def stop_by_profiler(self):
         self._exit.set()
 
-    def add_outlier(self, session, request_id):
+    def get_outlier(self):
+        """
+        :return: a tuple (cpu_percent, memory, stacktrace, request) if the request is an outlier,
+        otherwise None
+        """
         if self._memory:
-            add_outlier(
-                session,
-                request_id,
-                self._cpu_percent,
-                self._memory,
-                self._stacktrace,
-                self._request,
-            )
+            return self._cpu_percent, self._memory, self._stacktrace, self._request
+        return None
@@ -0,0 +1,95 @@
+"""
+    Contains the process-wide sampler that is shared by all StacktraceProfilers.
+    Per tick, a single snapshot of the stack of every thread is taken, and the frames are handed to
+    every profiler that is currently registered. This makes the sampling cost independent of the
+    number of requests that are profiled at the same time.
+"""
+import os
+import sys
+import threading
+import time
+
+from flask_monitoringdashboard import config
+from flask_monitoringdashboard.core.logger import log
+
+
+class Sampler(threading.Thread):
+    """
+    Long-lived thread that samples the stack of all threads that are being profiled.
+    The thread is idle while no profiler is registered.
+    """
+
+    def __init__(self):
+        threading.Thread.__init__(self, name='fmd-sampler')
+        self.daemon = True
+        self._profilers = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    def register(self, profiler):
+        """
+        Starts sampling for the given profiler. The profiler is sampled until its `stopped`
+        property is True, after which the sampler calls `profiler.on_stopped()`.
+        :param profiler: StacktraceProfiler object
+        """
+        with self._lock:
+            self._profilers.append(profiler)
+        self._wakeup.set()
+
+    def run(self):
+        while True:
+            with self._lock:
+                profilers = list(self._profilers)
+            if not profilers:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            current_time = time.time()
+            frames = sys._current_frames()
+            for profiler in profilers:
+                if profiler.stopped:
+                    self._finish(profiler)
+                    continue
+                frame = frames.get(profiler.thread_to_monitor)
+                if frame is None:
+                    log('Can\'t get the stacktrace of the main thread. Stopping StacktraceProfiler')
+                    log('Thread to monitor: %s' % profiler.thread_to_monitor)
+                    log('Running threads: %s' % frames.keys())
+                    self._finish(profiler)
+                    continue
+                profiler.sample(frame, current_time)
+            del frames
+
+            elapsed = time.time() - current_time
+            if config.sampling_period > elapsed:
+                time.sleep(config.sampling_period - elapsed)
+
+    def _finish(self, profiler):
+        with self._lock:
+            self._profilers.remove(profiler)
+        try:
+            profiler.on_stopped()
+        except Exception as error:
+            log('Profiler could not be stopped: {}'.format(error))
+
+
+_sampler = None
+_pid = None
+_start_lock = threading.Lock()
+
+
+def get_sampler():
+    """
+    Returns the sampler of this process. The sampler is created lazily, such that every
+    worker-process of a pre-forking server starts its own sampler thread.
+    """
+    global _sampler, _pid
+    if _sampler is not None and _pid == os.getpid():
+        return _sampler
+    with _start_lock:
+        if _sampler is None or _pid != os.getpid():
+            sampler = Sampler()
+            sampler.start()
+            _sampler, _pid = sampler, os.getpid()
+    return _sampler
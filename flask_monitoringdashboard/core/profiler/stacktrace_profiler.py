@@ -1,141 +1,152 @@
 import inspect
-import sys
 import threading
 import time
-import traceback
-from collections import defaultdict
 
 from flask_monitoringdashboard import config
-from flask_monitoringdashboard.core.cache import update_duration_cache
+from flask_monitoringdashboard.core.ingestion import Measurement, enqueue
 from flask_monitoringdashboard.core.logger import log
-from flask_monitoringdashboard.core.profiler.util import order_histogram
-from flask_monitoringdashboard.core.profiler.util.path_hash import PathHash
-from flask_monitoringdashboard.database import DatabaseConnectionWrapper
-from flask_monitoringdashboard.database.request import add_request
-from flask_monitoringdashboard.database.stack_line import add_stack_line
+from flask_monitoringdashboard.core.profiler.sampler import get_sampler
+from flask_monitoringdashboard.core.profiler.util import CallTree
+from flask_monitoringdashboard.core.profiler.util.frame_walker import walk_frames, get_source_line
 
 FILENAME = 'flask_monitoringdashboard/core/measurement.py'
-FILENAME_LEN = len(FILENAME)
 
 
-class StacktraceProfiler(threading.Thread):
+def _function_name(location):
+    return location[0].co_name
+
+
+class StacktraceProfiler(object):
     """
     Used for profiling the performance per line code.
-    This is used when monitoring-level == 2 and monitoring-level == 3
+    This is used when monitoring-level == 3. The samples are taken by the process-wide Sampler.
     """
 
     def __init__(self, thread_to_monitor, endpoint, ip, group_by, outlier_profiler=None):
-        threading.Thread.__init__(self)
-        self._keeprunning = True
-        self._thread_to_monitor = thread_to_monitor
+        self.thread_to_monitor = thread_to_monitor
         self._endpoint = endpoint
         self._ip = ip
         self._group_by = group_by
         self._duration = 0
-        self._histogram = defaultdict(float)
-        self._path_hash = PathHash()
-        self._lines_body = []
+        self._call_tree = CallTree()
         self._total = 0
         self._outlier_profiler = outlier_profiler
         self._status_code = 404
+        self._last_sample = time.time()
+        self._stopped = False
+        self._finished = threading.Event()
+
+    def start(self):
+        """ Registers this profiler at the sampler of this process. """
+        self._last_sample = time.time()
+        get_sampler().register(self)
+
+    @property
+    def stopped(self):
+        return self._stopped
 
-    def run(self):
+    def sample(self, frame, current_time):
         """
-        Continuously takes a snapshot from the stacktrace (only the main-thread). Filters
-        everything before the endpoint has been called (i.e. the Flask library).
+        Processes a snapshot of the stacktrace of the monitored thread. Filters everything
+        before the endpoint has been called (i.e. the Flask library).
         Directly computes the histogram, since this is more efficient for performance
-        :return:
+        :param frame: the current frame of the monitored thread
+        :param current_time: moment when the snapshot was taken
         """
-        current_time = time.time()
-        while self._keeprunning:
-            newcurrent_time = time.time()
-            duration = newcurrent_time - current_time
-            current_time = newcurrent_time
-
-            try:
-                frame = sys._current_frames()[self._thread_to_monitor]
-            except KeyError:
-                log('Can\'t get the stacktrace of the main thread. Stopping StacktraceProfiler')
-                log('Thread to monitor: %s' % self._thread_to_monitor)
-                log('Running threads: %s' % sys._current_frames().keys())
+        duration = current_time - self._last_sample
+        self._last_sample = current_time
+
+        stack = walk_frames(frame)
+        start = None
+        for index, (code, _) in enumerate(stack):
+            if self._endpoint.name == code.co_name:
+                start = index
+                break
+            if code.co_name == 'wrapper' and code.co_filename.endswith(FILENAME):
+                start = index + 1
                 break
-            in_endpoint_code = False
-            self._path_hash.set_path('')
-            # filename, line number, function name, source code line
-            for fn, ln, fun, line in traceback.extract_stack(frame):
-                if self._endpoint.name == fun:
-                    in_endpoint_code = True
-                if in_endpoint_code:
-                    key = (self._path_hash.get_path(fn, ln), fun, line)
-                    self._histogram[key] += duration
-                if len(fn) > FILENAME_LEN and fn[-FILENAME_LEN:] == FILENAME and fun == "wrapper":
-                    in_endpoint_code = True
-            if in_endpoint_code:
-                self._total += duration
-
-            elapsed = time.time() - current_time
-            if config.sampling_period > elapsed:
-                time.sleep(config.sampling_period - elapsed)
-
-        self._on_thread_stopped()
+        if start is not None:
+            self._call_tree.add(stack[start:], duration)
+            self._total += duration
 
     def stop(self, duration, status_code):
         self._duration = duration * 1000
         self._status_code = status_code
         if self._outlier_profiler:
             self._outlier_profiler.stop_by_profiler()
-        self._keeprunning = False
-
-    def _on_thread_stopped(self):
-        update_duration_cache(endpoint_name=self._endpoint.name, duration=self._duration)
-        with DatabaseConnectionWrapper().database_connection.session_scope() as session:
-            request_id = add_request(
-                session,
-                duration=self._duration,
-                endpoint_id=self._endpoint.id,
-                ip=self._ip,
-                status_code=self._status_code,
-                group_by=self._group_by,
-            )
-            self._lines_body = order_histogram(self._histogram.items())
-            self.insert_lines_db(session, request_id)
-            if self._outlier_profiler:
-                self._outlier_profiler.add_outlier(session, request_id)
-
-    def insert_lines_db(self, session, request_id):
-        position = 0
-        for code_line in self.get_funcheader():
-            add_stack_line(
-                session,
-                request_id,
-                position=position,
-                indent=0,
-                duration=self._duration,
-                code_line=code_line,
+        self._stopped = True
+
+    def join(self, timeout=None):
+        """
+        Waits until the sampler has processed the stopped profiler.
+        :return: True if the profiler is finished, False if the timeout expired
+        """
+        return self._finished.wait(timeout)
+
+    def on_stopped(self):
+        """
+        Called by the sampler, once the profiler is stopped. Only the raw call tree is enqueued;
+        the source lines and the function header are resolved by the ingestion writer.
+        """
+        try:
+            self._enqueue_measurement()
+        finally:
+            self._finished.set()
+
+    def _enqueue_measurement(self):
+        enqueue(
+            Measurement(
+                self._endpoint,
+                self._duration,
+                self._ip,
+                self._group_by,
+                self._status_code,
+                profile=Profile(self._endpoint.name, self._duration, self._total, self._call_tree),
+                outlier=self._outlier_profiler.get_outlier() if self._outlier_profiler else None,
             )
-            position += 1
+        )
 
-        for key, val in self._lines_body:
-            path, fun, line = key
-            fn, ln = self._path_hash.get_last_fn_ln(path)
-            indent = self._path_hash.get_indent(path)
+
+class Profile(object):
+    """
+    The raw result of a StacktraceProfiler, i.e. the call tree with the sampled code locations.
+    This is converted into stack lines by the ingestion writer, outside of the sampler thread.
+    """
+
+    def __init__(self, endpoint_name, duration, total, call_tree):
+        """
+        :param endpoint_name: name of the profiled endpoint
+        :param duration: duration of the request in ms
+        :param total: sum of the durations of all samples
+        :param call_tree: CallTree object with the sampled stacks
+        """
+        self._endpoint_name = endpoint_name
+        self._duration = duration
+        self._total = total
+        self._call_tree = call_tree
+
+    def get_stack_lines(self):
+        """
+        :return: a list of (indent, duration, code_line) tuples, ordered by their position in the
+        flattened stack tree
+        """
+        stack_lines = [(0, self._duration, code_line) for code_line in self.get_funcheader()]
+
+        source_lines = {}
+        for indent, (code, ln), val in self._call_tree.walk(key=_function_name):
+            fn = code.co_filename
+            if (fn, ln) not in source_lines:
+                source_lines[fn, ln] = get_source_line(fn, ln)
             duration = val * self._duration / self._total if self._total != 0 else 0
-            add_stack_line(
-                session,
-                request_id,
-                position=position,
-                indent=indent,
-                duration=duration,
-                code_line=(fn, ln, fun, line),
-            )
-            position += 1
+            stack_lines.append((indent, duration, (fn, ln, code.co_name, source_lines[fn, ln])))
+        return stack_lines
 
     def get_funcheader(self):
         lines_returned = []
         try:
-            fun = config.app.view_functions.get(self._endpoint.name)
+            fun = config.app.view_functions.get(self._endpoint_name)
             if not fun:
-                return [(self._endpoint.name, 0, "None", self._endpoint.name)]
+                return [(self._endpoint_name, 0, "None", self._endpoint_name)]
         except AttributeError as error:
             log(error)
             fun = None
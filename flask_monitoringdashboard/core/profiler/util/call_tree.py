@@ -0,0 +1,78 @@
+"""
+Class used for building the histogram of a profiled request.
+"""
+
+
+class CallTreeNode(object):
+    __slots__ = ('location_id', 'indent', 'duration', 'children')
+
+    def __init__(self, location_id, indent):
+        self.location_id = location_id
+        self.indent = indent
+        self.duration = 0
+        # location id -> CallTreeNode
+        self.children = {}
+
+
+class CallTree(object):
+    """
+    Interned call-tree (trie) of the sampled stacks.
+    Every code location (e.g. a tuple of code object and line number) is mapped to an integer id.
+    A sampled stack is a path from the root of the tree, and the duration of the sample is
+    accumulated in every node on that path:
+
+        add([a, b], 5)
+        add([a, c], 3)
+
+        ==>  a (8)
+             |- b (5)
+             |- c (3)
+    """
+
+    def __init__(self):
+        self._root = CallTreeNode(None, 0)
+        self._location_ids = {}
+        self._locations = []
+
+    def _intern(self, location):
+        location_id = self._location_ids.get(location)
+        if location_id is None:
+            location_id = len(self._locations)
+            self._location_ids[location] = location_id
+            self._locations.append(location)
+        return location_id
+
+    def add(self, stack, duration):
+        """
+        :param stack: list of code locations, ordered from the outermost to the innermost call
+        :param duration: time that is accumulated in every node of the stack
+        """
+        node = self._root
+        for location in stack:
+            location_id = self._intern(location)
+            child = node.children.get(location_id)
+            if child is None:
+                child = node.children[location_id] = CallTreeNode(location_id, node.indent + 1)
+            child.duration += duration
+            node = child
+
+    def walk(self, key=None):
+        """
+        Flattens the tree using a single depth-first walk.
+        :param key: optional function (location -> value) for ordering the children of a node
+        :return: a list of (indent, location, duration) tuples. The indent of the outermost calls
+        is 1.
+        """
+        result = []
+        pending = list(reversed(self._children(self._root, key)))
+        while pending:
+            node = pending.pop()
+            result.append((node.indent, self._locations[node.location_id], node.duration))
+            pending.extend(reversed(self._children(node, key)))
+        return result
+
+    def _children(self, node, key):
+        children = list(node.children.values())
+        if key:
+            children.sort(key=lambda child: key(self._locations[child.location_id]))
+        return children
@@ -0,0 +1,28 @@
+"""
+Cheap alternative to traceback.extract_stack, used while sampling.
+Only the code object and line number of every frame are collected. The source text of a line is
+resolved afterwards, once per unique code location.
+"""
+import linecache
+
+
+def walk_frames(frame):
+    """
+    :param frame: the innermost frame of a thread
+    :return: a list of (code, line_number) tuples, ordered from the outermost to the innermost frame
+    """
+    stack = []
+    while frame is not None:
+        stack.append((frame.f_code, frame.f_lineno))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def get_source_line(fn, ln):
+    """
+    :param fn: filename
+    :param ln: line number
+    :return: the source code of the line, without leading and trailing white spaces
+    """
+    return linecache.getline(fn, ln).strip()
@@ -109,3 +109,20 @@ class PathHash(object):
                 code_line.filename, self._string_hash.hash(code_line.code)
             )
         return self._current_path
+
+    def get_stacklines_paths(self, stack_lines):
+        """
+        Computes the StackLinePath of every stack line in a single pass. This gives the same
+        result as calling get_stacklines_path for every index.
+        :param stack_lines: list of StackLine objects.
+        :return: list with the StackLinePath of every stack line
+        """
+        paths = []
+        parents = {}  # indent -> path of the last stack line with that indent
+        for stack_line in stack_lines:
+            self._current_path = parents.get(stack_line.indent - 1, '')
+            code_line = stack_line.code
+            path = self.append(code_line.filename, self._string_hash.hash(code_line.code))
+            parents[stack_line.indent] = path
+            paths.append(path)
+        return paths
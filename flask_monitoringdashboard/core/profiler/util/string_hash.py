@@ -6,6 +6,7 @@ Class used for hashing the paths.
 class StringHash(object):
     def __init__(self):
         self._h = {}
+        self._reverse = []  # hash -> string
 
     def hash(self, string):
         """
@@ -20,7 +21,8 @@ class StringHash(object):
         """
         if string in self._h:
             return self._h[string]
-        self._h[string] = len(self._h)
+        self._h[string] = len(self._reverse)
+        self._reverse.append(string)
         return self._h[string]
 
     def unhash(self, hash):
@@ -31,9 +33,6 @@ class StringHash(object):
         :param hash: string to be unhashed
         :return: the value that corresponds to the given hash
         """
-
-        for k, v in self._h.items():
-            if v == hash:
-                return k
-
+        if isinstance(hash, int) and 0 <= hash < len(self._reverse):
+            return self._reverse[hash]
         raise ValueError('Value not possible to unhash: {}'.format(hash))
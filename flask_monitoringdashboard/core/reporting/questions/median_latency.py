@@ -1,12 +1,9 @@
-import numpy as np
-from scipy.stats import median_test
-
 from flask_monitoringdashboard.core.reporting.questions.report_question import (
     ReportAnswer,
     ReportQuestion,
 )
-from flask_monitoringdashboard.database import DatabaseConnectionWrapper
-from flask_monitoringdashboard.database.request import get_latencies_sample
+from flask_monitoringdashboard.core.statistics import median_tests, medians
+from flask_monitoringdashboard.database.request import get_latencies_samples
 
 
 class MedianLatencyReportAnswer(ReportAnswer):
@@ -47,37 +44,55 @@ class MedianLatencyReportAnswer(ReportAnswer):
 
 
 class MedianLatency(ReportQuestion):
-    def get_answer(self, endpoint, requests_criterion, baseline_requests_criterion):
-        with DatabaseConnectionWrapper().database_connection.session_scope() as session:
-            latencies_sample = get_latencies_sample(session, endpoint.id,
-                                                    requests_criterion)
-            baseline_latencies_sample = get_latencies_sample(
-                session, endpoint.id, baseline_requests_criterion
+    def fetch_data(self, session, requests_criterion, baseline_requests_criterion):
+        samples = get_latencies_samples(session, requests_criterion)
+        baseline_samples = get_latencies_samples(session, baseline_requests_criterion)
+        return {
+            endpoint_id: (samples.get(endpoint_id, []), baseline_samples.get(endpoint_id, []))
+            for endpoint_id in set(samples) | set(baseline_samples)
+        }
+
+    def prepare(self, data):
+        endpoint_ids = list(data)
+        samples = [data[endpoint_id][0] for endpoint_id in endpoint_ids]
+        baseline_samples = [data[endpoint_id][1] for endpoint_id in endpoint_ids]
+        sample_medians = medians(samples)
+        baseline_medians = medians(baseline_samples)
+        p_values = median_tests(samples, baseline_samples)
+        return {
+            endpoint_id: (
+                samples[i],
+                baseline_samples[i],
+                float(sample_medians[i]),
+                float(baseline_medians[i]),
+                float(p_values[i]),
             )
+            for i, endpoint_id in enumerate(endpoint_ids)
+        }
 
-            if len(latencies_sample) == 0 or len(baseline_latencies_sample) == 0:
-                return MedianLatencyReportAnswer(
-                    is_significant=False,
-                    latencies_sample=latencies_sample,
-                    baseline_latencies_sample=baseline_latencies_sample,
-                )
-
-            median = float(np.median(latencies_sample))
-            baseline_median = float(np.median(baseline_latencies_sample))
-
-            percentual_diff = (median - baseline_median) / baseline_median * 100
-
-            _, p, _, _ = median_test(latencies_sample, baseline_latencies_sample)
-
-            is_significant = abs(float(percentual_diff)) > 0 and float(p) < 0.05
+    def answer(self, data):
+        if data is None:
+            data = ([], [], None, None, None)
+        latencies_sample, baseline_latencies_sample, median, baseline_median, p = data
 
+        if len(latencies_sample) == 0 or len(baseline_latencies_sample) == 0:
             return MedianLatencyReportAnswer(
-                is_significant=is_significant,
-                percentual_diff=percentual_diff,
-                # Sample latencies
+                is_significant=False,
                 latencies_sample=latencies_sample,
                 baseline_latencies_sample=baseline_latencies_sample,
-                # Latency medians
-                median=median,
-                baseline_median=baseline_median,
             )
+
+        percentual_diff = (median - baseline_median) / baseline_median * 100
+
+        is_significant = abs(float(percentual_diff)) > 0 and p < 0.05
+
+        return MedianLatencyReportAnswer(
+            is_significant=is_significant,
+            percentual_diff=percentual_diff,
+            # Sample latencies
+            latencies_sample=latencies_sample,
+            baseline_latencies_sample=baseline_latencies_sample,
+            # Latency medians
+            median=median,
+            baseline_median=baseline_median,
+        )
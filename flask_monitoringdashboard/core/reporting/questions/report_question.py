@@ -1,5 +1,7 @@
 from abc import ABCMeta, abstractmethod
 
+from flask_monitoringdashboard.database import DatabaseConnectionWrapper
+
 
 class ReportAnswer:
     __metaclass__ = ABCMeta
@@ -30,5 +32,33 @@ class ReportQuestion:
     __metaclass__ = ABCMeta
 
     @abstractmethod
-    def get_answer(self, endpoint, requests_criterion, baseline_requests_criterion):
+    def fetch_data(self, session, requests_criterion, baseline_requests_criterion):
+        """
+        Fetches the data that is needed to answer the question for all endpoints at once.
+        :return: a `dict` that maps the endpoint_id to the data of that endpoint
+        """
+        pass
+
+    def prepare(self, data):
+        """
+        Computes the statistics that are needed to answer the question for all endpoints at once,
+        e.g. with vectorized numpy operations.
+        :param data: the `dict` that is returned by `fetch_data`
+        :return: a `dict` that maps the endpoint_id to the data that is passed to `answer`
+        """
+        return data
+
+    @abstractmethod
+    def answer(self, data):
+        """
+        Answers the question for a single endpoint. This doesn't access the database, such that
+        the answers of different endpoints can be computed concurrently.
+        :param data: the data of the endpoint, or None if the endpoint has no data
+        :return: a ReportAnswer
+        """
         pass
+
+    def get_answer(self, endpoint, requests_criterion, baseline_requests_criterion):
+        with DatabaseConnectionWrapper().database_connection.session_scope() as session:
+            data = self.fetch_data(session, requests_criterion, baseline_requests_criterion)
+        return self.answer(self.prepare(data).get(endpoint.id))
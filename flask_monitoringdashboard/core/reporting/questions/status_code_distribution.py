@@ -1,10 +1,8 @@
-from flask_monitoringdashboard.controllers.requests import \
-    get_status_code_frequencies_in_interval
 from flask_monitoringdashboard.core.reporting.questions.report_question import (
     ReportAnswer,
     ReportQuestion,
 )
-from flask_monitoringdashboard.database import DatabaseConnectionWrapper
+from flask_monitoringdashboard.database.request import get_status_code_frequencies_per_endpoint
 
 
 class StatusCodeDistributionReportAnswer(ReportAnswer):
@@ -32,18 +30,20 @@ class StatusCodeDistribution(ReportQuestion):
     MIN_NUM_REQUESTS = 30
     MIN_PERCENTAGE_DIFF_THRESHOLD = 3
 
-    def get_answer(self, endpoint, requests_criterion, baseline_requests_criterion):
-
-        with DatabaseConnectionWrapper().database_connection.session_scope() as session:
-
-            frequencies = get_status_code_frequencies_in_interval(session, endpoint.id,
-                                                                  requests_criterion)
-
-            baseline_frequencies = get_status_code_frequencies_in_interval(
-                session,
-                endpoint.id,
-                baseline_requests_criterion
+    def fetch_data(self, session, requests_criterion, baseline_requests_criterion):
+        frequencies = get_status_code_frequencies_per_endpoint(session, *requests_criterion)
+        baseline_frequencies = get_status_code_frequencies_per_endpoint(
+            session, *baseline_requests_criterion
+        )
+        return {
+            endpoint_id: (
+                frequencies.get(endpoint_id, {}), baseline_frequencies.get(endpoint_id, {})
             )
+            for endpoint_id in set(frequencies) | set(baseline_frequencies)
+        }
+
+    def answer(self, data):
+        frequencies, baseline_frequencies = data or ({}, {})
 
         # all monitored status codes in both intervals
         all_monitored_status_codes = set(baseline_frequencies.keys()).union(
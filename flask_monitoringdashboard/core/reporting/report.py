@@ -0,0 +1,77 @@
+"""
+    Contains the engine that makes a report. The data of all questions is fetched with a few
+    grouped queries for all endpoints together, using a single session. Afterwards, the questions
+    are prepared with vectorized statistics for all endpoints together, and answered for every
+    endpoint, which doesn't access the database.
+"""
+import time
+
+from flask_monitoringdashboard.core.logger import log
+from flask_monitoringdashboard.core.reporting.questions.median_latency import MedianLatency
+from flask_monitoringdashboard.core.reporting.questions.status_code_distribution import (
+    StatusCodeDistribution,
+)
+from flask_monitoringdashboard.database import DatabaseConnectionWrapper
+from flask_monitoringdashboard.database.endpoint import get_endpoints
+
+
+def get_questions():
+    return [MedianLatency(), StatusCodeDistribution()]
+
+
+def make_endpoint_summary(endpoint, questions, data):
+    """
+    :param endpoint: tuple of (id, name) of the endpoint
+    :param questions: list of ReportQuestion objects
+    :param data: list with the prepared data of every question, in the same order as `questions`
+    :return: a dict with the answers of all questions for the endpoint
+    """
+    endpoint_id, endpoint_name = endpoint
+    summary = dict(
+        endpoint_id=endpoint_id,
+        endpoint_name=endpoint_name,
+        answers=[],
+        has_anything_significant=False,
+    )
+
+    for question, question_data in zip(questions, data):
+        answer = question.answer(question_data.get(endpoint_id))
+
+        if answer.is_significant():
+            summary['has_anything_significant'] = True
+
+        summary['answers'].append(answer.serialize())
+
+    return summary
+
+
+def make_report(requests_criterion, baseline_requests_criterion):
+    """
+    :param requests_criterion: criteria for the requests that are compared
+    :param baseline_requests_criterion: criteria for the requests of the baseline
+    :return: a dict with the summaries of all endpoints, and the time (in ms) that is needed for
+    fetching the data, answering the questions and making the whole report.
+    """
+    questions = get_questions()
+    start = time.perf_counter()
+
+    with DatabaseConnectionWrapper().database_connection.session_scope() as session:
+        endpoints = [(endpoint.id, endpoint.name) for endpoint in get_endpoints(session)]
+        data = [
+            question.fetch_data(session, requests_criterion, baseline_requests_criterion)
+            for question in questions
+        ]
+    fetched = time.perf_counter()
+    data = [question.prepare(question_data) for question, question_data in zip(questions, data)]
+
+    summaries = [make_endpoint_summary(endpoint, questions, data) for endpoint in endpoints]
+    end = time.perf_counter()
+
+    timing = dict(
+        fetch=(fetched - start) * 1000,
+        evaluate=(end - fetched) * 1000,
+        total=(end - start) * 1000,
+    )
+    log('Made a report of {} endpoints in {:.1f} ms (fetching: {:.1f} ms, evaluating: {:.1f} ms)'
+        .format(len(endpoints), timing['total'], timing['fetch'], timing['evaluate']))
+    return dict(summaries=summaries, timing=timing)
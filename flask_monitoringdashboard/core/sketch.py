@@ -0,0 +1,123 @@
+"""
+    Contains a mergeable quantile sketch, used for computing medians and percentiles of the
+    request durations without loading every single duration.
+"""
+import math
+
+MIN_VALUE = 1e-9
+
+
+class DDSketch(object):
+    """
+    Quantile sketch with a relative accuracy guarantee (DDSketch, Masson et al. 2019).
+    Every value is counted in a logarithmically sized bin, such that a quantile q is answered
+    with a value v that satisfies |v - x_q| <= relative_accuracy * x_q, where x_q is the exact
+    quantile. Two sketches are merged by adding their bins, which makes it possible to combine
+    the sketches of different time buckets, processes and hosts.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError('The relative accuracy must be between 0 and 1')
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.bins = {}  # index -> count
+        self.zero_count = 0
+        self.count = 0
+
+    def key(self, value):
+        """ :return: the index of the bin that contains the given (positive) value """
+        return int(math.ceil(math.log(value) / self._log_gamma))
+
+    def value(self, key):
+        """ :return: the representative value of a bin """
+        return 2 * self._gamma ** key / (self._gamma + 1)
+
+    def add(self, value, count=1):
+        if value <= MIN_VALUE:
+            self.zero_count += count
+        else:
+            key = self.key(value)
+            self.bins[key] = self.bins.get(key, 0) + count
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+        self.count += count
+
+    def merge(self, other):
+        """
+        Adds all values of another sketch to this sketch. If both sketches have a different
+        accuracy, the bins of the other sketch are re-binned using their representative values.
+        """
+        if other.relative_accuracy == self.relative_accuracy:
+            for key, count in other.bins.items():
+                self.bins[key] = self.bins.get(key, 0) + count
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+            self.zero_count += other.zero_count
+            self.count += other.count
+        else:
+            self.add(0, other.zero_count)
+            for key, count in other.bins.items():
+                self.add(other.value(key), count)
+        return self
+
+    def _collapse(self):
+        """ Merges the lowest bins, such that the highest quantiles keep their accuracy. """
+        keys = sorted(self.bins)
+        excess = len(keys) - self.max_bins
+        self.bins[keys[excess]] += sum(self.bins.pop(key) for key in keys[:excess])
+
+    def quantile(self, q):
+        """
+        :param q: quantile between 0 and 1, e.g. 0.5 for the median
+        :return: the approximated quantile, or None if the sketch is empty
+        """
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs):
+        """
+        :param qs: list of quantiles between 0 and 1
+        :return: list with the approximated quantiles, in the same order
+        """
+        if not self.count:
+            return [None for _ in qs]
+        keys = sorted(self.bins)
+        result = []
+        for q in qs:
+            rank = q * (self.count - 1)
+            if rank < self.zero_count or not keys:
+                result.append(0)
+                continue
+            seen = self.zero_count
+            value = self.value(keys[-1])
+            for key in keys:
+                seen += self.bins[key]
+                if seen > rank:
+                    value = self.value(key)
+                    break
+            result.append(value)
+        return result
+
+    def to_dict(self):
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'zero_count': self.zero_count,
+            'bins': {str(key): count for key, count in self.bins.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, values):
+        sketch = cls(values['relative_accuracy'])
+        sketch.zero_count = values.get('zero_count', 0)
+        sketch.bins = {int(key): count for key, count in values.get('bins', {}).items()}
+        sketch.count = sketch.zero_count + sum(sketch.bins.values())
+        return sketch
+
+    @classmethod
+    def from_values(cls, values, relative_accuracy=0.01):
+        sketch = cls(relative_accuracy)
+        for value in values:
+            sketch.add(value)
+        return sketch
@@ -0,0 +1,101 @@
+"""
+    Contains vectorized statistics. The samples of many endpoints are put in a single float64
+    array (padded with NaN), such that their medians and median tests are computed with a few
+    numpy operations instead of a Python loop over the endpoints.
+"""
+import numpy as np
+from scipy.stats import chi2
+
+
+def percentiles(values, qs):
+    """
+    :param values: list of values
+    :param qs: list of percentiles between 0 and 100
+    :return: list with the percentiles of the values, in the same order as `qs`
+    """
+    return np.percentile(np.asarray(values, dtype=np.float64), qs).tolist()
+
+
+def to_padded_array(samples, width=None):
+    """
+    :param samples: list of k samples, each a list of values
+    :param width: number of columns, at least the length of the largest sample
+    :return: a (k, width) float64 array, in which row i starts with the values of sample i. The
+    remaining values are NaN.
+    """
+    if width is None:
+        width = max((len(sample) for sample in samples), default=0)
+    data = np.full((len(samples), width), np.nan)
+    for i, sample in enumerate(samples):
+        data[i, :len(sample)] = sample
+    return data
+
+
+def _nanmedian(data):
+    """ :return: the median of every row, or NaN if the row has no values """
+    result = np.full(data.shape[0], np.nan)
+    non_empty = ~np.isnan(data).all(axis=1)
+    if data.shape[1] > 0 and non_empty.any():
+        result[non_empty] = np.nanmedian(data[non_empty], axis=1)
+    return result
+
+
+def medians(samples):
+    """
+    :param samples: list of k samples, each a list of values
+    :return: a float64 array with the median of every sample, or NaN if the sample is empty
+    """
+    return _nanmedian(to_padded_array(samples))
+
+
+def median_tests(samples, baseline_samples):
+    """
+    Performs Mood's median test for k pairs of samples at once. The result is the same as calling
+    `scipy.stats.median_test(samples[i], baseline_samples[i])` for every i, which uses ties
+    "below" and Yates' correction.
+    :param samples: list of k samples, each a list of values
+    :param baseline_samples: list of k samples, each a list of values
+    :return: a float64 array with k p-values. If a test is not defined, because a sample is
+    empty or all values are at one side of the grand median, the p-value is 1.
+    """
+    lengths = np.array([len(sample) for sample in samples], dtype=np.int64)
+    baseline_lengths = np.array([len(sample) for sample in baseline_samples], dtype=np.int64)
+    p_values = np.ones(len(lengths))
+    if len(lengths) == 0:
+        return p_values
+
+    width = int((lengths + baseline_lengths).max())
+    data = np.full((len(lengths), width), np.nan)
+    for i, (sample, baseline_sample) in enumerate(zip(samples, baseline_samples)):
+        data[i, :lengths[i]] = sample
+        data[i, lengths[i]:lengths[i] + baseline_lengths[i]] = baseline_sample
+    grand_medians = _nanmedian(data)
+
+    # NaN values are never above the grand median
+    with np.errstate(invalid='ignore'):
+        above = data > grand_medians[:, None]
+    in_sample = np.arange(width)[None, :] < lengths[:, None]
+    above_sample = (above & in_sample).sum(axis=1)
+    above_baseline = above.sum(axis=1) - above_sample
+
+    # contingency tables with shape (k, 2, 2): [[above], [below or equal]] x [sample, baseline]
+    observed = np.empty((len(lengths), 2, 2))
+    observed[:, 0, 0] = above_sample
+    observed[:, 0, 1] = above_baseline
+    observed[:, 1, 0] = lengths - above_sample
+    observed[:, 1, 1] = baseline_lengths - above_baseline
+
+    row_sums = observed.sum(axis=2)
+    column_sums = observed.sum(axis=1)
+    valid = (row_sums > 0).all(axis=1) & (column_sums > 0).all(axis=1)
+    if not valid.any():
+        return p_values
+
+    observed, row_sums, column_sums = observed[valid], row_sums[valid], column_sums[valid]
+    totals = observed.sum(axis=(1, 2))
+    expected = row_sums[:, :, None] * column_sums[:, None, :] / totals[:, None, None]
+    diff = expected - observed
+    observed = observed + np.minimum(0.5, np.abs(diff)) * np.sign(diff)
+    statistics = ((observed - expected) ** 2 / expected).sum(axis=(1, 2))
+    p_values[valid] = chi2.sf(statistics, 1)
+    return p_values
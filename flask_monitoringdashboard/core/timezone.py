@@ -1,16 +1,23 @@
 import datetime
 
 
+def get_utc_offset():
+    """
+    :return: the current offset (timedelta) of the configured timezone with respect to UTC
+    """
+    from flask_monitoringdashboard import config
+
+    return config.timezone.utcoffset(datetime.datetime.utcnow())
+
+
 def to_local_datetime(dt):
     """
     Convert datetime (UTC) to local datetime based on the configuration.
     :param dt: UTC datetime object
     :return local datetime
     """
-    from flask_monitoringdashboard import config
-
     if dt:
-        return dt + config.timezone.utcoffset(datetime.datetime.utcnow())
+        return dt + get_utc_offset()
     return None
 
 
@@ -20,8 +27,6 @@ def to_utc_datetime(dt):
     :param dt: local datetime object
     :return UTC datetime
     """
-    from flask_monitoringdashboard import config
-
     if dt:
-        return dt - config.timezone.utcoffset(datetime.datetime.utcnow())
+        return dt - get_utc_offset()
     return None
@@ -1,10 +1,10 @@
-import numpy as np
 from flask import url_for
 from werkzeug.routing import BuildError
 
 from flask_monitoringdashboard import config
 from flask_monitoringdashboard.core.colors import get_color
 from flask_monitoringdashboard.core.rules import get_rules
+from flask_monitoringdashboard.core.statistics import percentiles
 from flask_monitoringdashboard.core.timezone import to_local_datetime
 from flask_monitoringdashboard.database.count import count_requests, count_total_requests
 from flask_monitoringdashboard.database.endpoint import get_endpoint_by_id
@@ -82,4 +82,12 @@ def simplify(values, n=5):
     """
     if len(values) <= n:
         return values
-    return [np.percentile(values, i * 100 // (n - 1)) for i in range(n)]
+    return percentiles(values, [i * 100 // (n - 1) for i in range(n)])
+
+
+def get_simplify_quantiles(n=5):
+    """
+    :param n: length of the list that is returned by simplify
+    :return: the quantiles (between 0 and 1) that are used by simplify
+    """
+    return [i * 100 // (n - 1) / 100 for i in range(n)]
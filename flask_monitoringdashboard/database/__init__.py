@@ -35,6 +35,9 @@ class DatabaseConnectionWrapper:
         then it return a new instance of the wrapper pointing to the new config
         """
         new_database_connection_wrapper = DatabaseConnectionWrapper(config=new_config)
+        if self.database_name != new_database_connection_wrapper.database_name:
+            from flask_monitoringdashboard.database.code_line import code_line_cache
+            code_line_cache.clear()
         if self.get_database_type() != new_database_connection_wrapper.get_database_type() and \
                 self.database_name != new_database_connection_wrapper.database_name:
             new_database_connection_wrapper.database_connection.connect()
@@ -1,6 +1,58 @@
+import threading
+from collections import OrderedDict
+
+from flask_monitoringdashboard import config
 from flask_monitoringdashboard.database import DatabaseConnectionWrapper
 
 
+class CodeLineCache(object):
+    """
+    Bounded LRU-cache that maps a (filename, line_number, function_name, code) quadruple to the id
+    of its CodeLine. Code lines hardly change within a deployment, so most profiled requests can
+    be stored without looking up their code lines. The cache is local to the process and belongs
+    to a single database: it is cleared when another database is used.
+    """
+
+    def __init__(self):
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+        self._database_name = None
+
+    def validate(self, database_name):
+        """ Clears the cache if it was filled from another database. """
+        with self._lock:
+            if self._database_name != database_name:
+                self._ids.clear()
+                self._database_name = database_name
+
+    def get(self, code_line):
+        with self._lock:
+            code_id = self._ids.get(code_line)
+            if code_id is not None:
+                self._ids.move_to_end(code_line)
+            return code_id
+
+    def put(self, code_line, code_id):
+        maxsize = config.code_line_cache_size
+        if maxsize <= 0:
+            return
+        with self._lock:
+            self._ids[code_line] = code_id
+            self._ids.move_to_end(code_line)
+            while len(self._ids) > maxsize:
+                self._ids.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+    def __len__(self):
+        return len(self._ids)
+
+
+code_line_cache = CodeLineCache()
+
+
 def get_code_line(session, fn, ln, name, code):
     """
     Get a CodeLine object from a given quadruple of fn, ln, name, code. If the CodeLine object
@@ -13,3 +65,57 @@ def get_code_line(session, fn, ln, name, code):
     :return: a CodeLine object
     """
     return DatabaseConnectionWrapper().database_connection.code_line_queries(session).get_code_line(fn, ln, name, code)
+
+
+def get_code_lines(session, code_lines):
+    """
+    Bulk version of get_code_line. The existing CodeLine objects are retrieved with a single query,
+    and the missing ones are inserted in a single batch.
+    :param session: session for the database
+    :param code_lines: iterable of (filename, line_number, function_name, code) quadruples
+    :return: a dict that maps every quadruple to its CodeLine object
+    """
+    code_line_queries = DatabaseConnectionWrapper().database_connection.code_line_queries(session)
+    return code_line_queries.get_code_lines(code_lines)
+
+
+def get_code_line_ids(session, code_lines):
+    """
+    Same as get_code_lines, but only returns the ids. Known quadruples are served from the
+    code_line_cache, and the database is only queried for the other ones.
+    :param session: session for the database
+    :param code_lines: iterable of (filename, line_number, function_name, code) quadruples
+    :return: a dict that maps every quadruple to the id of its CodeLine
+    """
+    code_line_cache.validate(DatabaseConnectionWrapper().database_name)
+    result = {}
+    missing = []
+    for code_line in set(code_lines):
+        code_id = code_line_cache.get(code_line)
+        if code_id is None:
+            missing.append(code_line)
+        else:
+            result[code_line] = code_id
+    if missing:
+        for code_line, db_code_line in get_code_lines(session, missing).items():
+            code_line_cache.put(code_line, db_code_line.id)
+            result[code_line] = db_code_line.id
+    return result
+
+
+def init_code_line_cache(session):
+    """
+    Fills the code_line_cache with the most recently added CodeLines.
+    :param session: session for the database
+    """
+    code_line_cache.validate(DatabaseConnectionWrapper().database_name)
+    if config.code_line_cache_size <= 0:
+        return
+    code_line_queries = DatabaseConnectionWrapper().database_connection.code_line_queries(session)
+    latest_code_lines = code_line_queries.get_latest_code_lines(config.code_line_cache_size)
+    for db_code_line in reversed(latest_code_lines):
+        code_line_cache.put(
+            (db_code_line.filename, db_code_line.line_number, db_code_line.function_name,
+             db_code_line.code),
+            db_code_line.id,
+        )
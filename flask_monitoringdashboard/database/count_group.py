@@ -1,5 +1,7 @@
 import datetime
-from flask_monitoringdashboard.core.timezone import to_utc_datetime
+from collections import defaultdict
+
+from flask_monitoringdashboard.core.timezone import get_utc_offset, to_utc_datetime
 from flask_monitoringdashboard.database import DatabaseConnectionWrapper
 
 
@@ -26,15 +28,46 @@ def count_requests_group(session, *where):
     return DatabaseConnectionWrapper().database_connection.count_queries(session).count_request_per_endpoint(*where)
 
 
+def count_requests_hits(session, today, week_ago):
+    """
+    Counts the hits and errors of all endpoints today, in the last week and overall, using a
+    single scan over the requests.
+    :param session: session for the database
+    :param today: datetime object (UTC) of the start of today
+    :param week_ago: datetime object (UTC) of one week ago
+    :return: a tuple of five lists with (endpoint_id, value) tuples: the hits today, the errors
+    today, the hits in the last week, the errors in the last week and the hits overall.
+    """
+    count_queries = DatabaseConnectionWrapper().database_connection.count_queries(session)
+    rows = count_queries.count_request_hits_per_endpoint(today, week_ago)
+    return tuple([(row[0], int(row[i] or 0)) for row in rows] for i in range(1, 6))
+
+
 def count_requests_per_day(session, list_of_days):
-    """ Return the number of hits for all endpoints per day.
+    """ Return the number of hits for all endpoints per day, using a single query that groups the
+    requests by their local day.
     :param session: session for the database
     :param list_of_days: list with datetime.datetime objects. """
-    result = []
+    if not list_of_days:
+        return []
+    start = to_utc_datetime(datetime.datetime.combine(min(list_of_days), datetime.time(0, 0, 0)))
+    end = to_utc_datetime(datetime.datetime.combine(max(list_of_days), datetime.time(0, 0, 0))) + \
+        datetime.timedelta(days=1)
+    hits = defaultdict(list)
     count_queries_obj = DatabaseConnectionWrapper().database_connection.count_queries(session)
-    for day in list_of_days:
-        dt_begin = to_utc_datetime(datetime.datetime.combine(day, datetime.time(0, 0, 0)))
-        dt_end = dt_begin + datetime.timedelta(days=1)
-        result.append(
-            count_queries_obj.count_request_per_endpoint(*count_queries_obj.generate_time_query(dt_begin, dt_end)))
-    return result
+    for day, endpoint_id, count in count_queries_obj.count_request_per_endpoint_per_day(
+            start, end, get_utc_offset().total_seconds()):
+        hits[to_date(day)].append((endpoint_id, count))
+    return [hits[to_date(day)] for day in list_of_days]
+
+
+def to_date(day):
+    """
+    :param day: date, datetime or ISO formatted string
+    :return: the corresponding date object
+    """
+    if isinstance(day, datetime.datetime):
+        return day.date()
+    if isinstance(day, datetime.date):
+        return day
+    return datetime.datetime.strptime(str(day)[:10], '%Y-%m-%d').date()
@@ -1,63 +1,56 @@
 import time
 import datetime
 import os
+import threading
 from contextlib import contextmanager
 from werkzeug.security import generate_password_hash, check_password_hash
+from flask_monitoringdashboard.core.sketch import DDSketch
 from flask_monitoringdashboard.core.timezone import to_local_datetime
 from flask_monitoringdashboard import config
 from flask_monitoringdashboard.database.data_base_queries.query_base_object import \
     CodeLineQueriesBase, CountQueriesBase, UserQueriesBase, QueryBaseObject, \
     CustomGraphQueryBase, EndpointQueryBase, OutlierQueryBase, VersionQueryBase, \
-    StackLineQueryBase, RequestQueryBase, DatabaseConnectionBase
+    StackLineQueryBase, RequestQueryBase, RollupQueryBase, DatabaseConnectionBase
 import uuid
-from pymongo import MongoClient, uri_parser
-from pymongo.errors import AutoReconnect, ServerSelectionTimeoutError, DuplicateKeyError
+from pymongo import MongoClient, UpdateOne, uri_parser
+from pymongo.monitoring import ConnectionPoolListener
+from pymongo.errors import ConnectionFailure, DuplicateKeyError, BulkWriteError, OperationFailure, \
+    PyMongoError
+
+
+MAX_RETRY_BACKOFF = 5
 
 
 def safe_mongo_call(call):
+    """
+    Retries a call when the connection to MongoDB fails, waiting `config.mongo_retry_backoff`
+    seconds before the first retry and doubling this (up to MAX_RETRY_BACKOFF) afterwards. Other
+    errors are raised immediately.
+    """
     def _safe_mongo_call(*args, **kwargs):
-        for i in range(5):
+        attempts = max(1, int(config.mongo_retry_attempts))
+        for i in range(attempts):
             try:
                 return call(*args, **kwargs)
-            except (AutoReconnect, ServerSelectionTimeoutError):
-                time.sleep(pow(2, i))
-        else:
-            raise AutoReconnect()
+            except ConnectionFailure:
+                if i == attempts - 1:
+                    raise
+                time.sleep(min(config.mongo_retry_backoff * pow(2, i), MAX_RETRY_BACKOFF))
 
     return _safe_mongo_call
 
 
-def safe_mongo_call_find(call, call_type):
-    """
-    In order to minimize the risk of failure and the impact on the app performance,
-    we need to allow the application to be able to read from the secondaries.
-    In such cases, we will have an eventual data consistence. Hence, we should re-try to read
-    """
-    def has_content(result):
-        if call_type == "find_one":
-            # we will have content is the object is not None
-            return result is not None
-        if call_type == "find":
-            return result and len(list(result.clone())) > 0
-
-    def _safe_mongo_call_find(*args, **kwargs):
-        for i in range(5):
-            try:
-                for _i in range(6):
-                    result = call(*args, **kwargs)
-                    if _i == 5 or has_content(result):
-                        return result
-                    else:
-                        time.sleep(pow(2, i))
-            except (AutoReconnect, ServerSelectionTimeoutError):
-                time.sleep(pow(2, i))
-        else:
-            raise AutoReconnect()
-
-    return _safe_mongo_call_find
+def do_nothing_function(*args, **kwargs): pass
 
 
-def do_nothing_function(*args, **kwargs): pass
+def format_utc_offset(utc_offset):
+    """
+    :param utc_offset: offset in seconds
+    :return: the offset formatted as '+HH:MM', which MongoDB accepts as timezone
+    """
+    utc_offset = int(utc_offset)
+    return "{}{:02d}:{:02d}".format("-" if utc_offset < 0 else "+", abs(utc_offset) // 3600,
+                                    abs(utc_offset) % 3600 // 60)
 
 
 class CollectionWrapper:
@@ -70,10 +63,7 @@ class CollectionWrapper:
             if item in ["create_index", "drop_indexes"] and \
                     os.environ.get("MONITORING_DISABLED_INDEX_CREATION") == "true":
                 return do_nothing_function
-            if item in ["find", "find_one"]:
-                return safe_mongo_call_find(elem, item)
-            else:
-                return safe_mongo_call(elem)
+            return safe_mongo_call(elem)
 
 
 class Base(dict):
@@ -184,6 +174,11 @@ class Request(Base):
         current_collection.create_index([("endpoint_id", 1), ("time_requested", 1)], background=True)
         current_collection.create_index([("id", 1), ("time_requested", 1)], background=True)
         current_collection.create_index([("status_code", 1), ("time_requested", 1)], background=True)
+        # only the profiled requests, for the embedded profile layout
+        current_collection.create_index([("endpoint_id", 1), ("time_requested", -1)],
+                                        background=True,
+                                        name="profiled_endpoint_id_time_requested",
+                                        partialFilterExpression={"stack_lines": {"$exists": True}})
 
 
 class Outlier(Base):
@@ -206,6 +201,8 @@ class Outlier(Base):
         current_collection.create_index([("endpoint_id", 1)], background=True)
         current_collection.create_index([("request_id", 1)], background=True)
         current_collection.create_index([("endpoint_id", 1), ("request_id", 1)], background=True)
+        current_collection.create_index([("endpoint_id", 1), ("time_requested", -1),
+                                         ("__creation_datetime__", -1)], background=True)
 
 
 class CodeLine(Base):
@@ -247,7 +244,10 @@ class StackLine(Base):
     def create_other_indexes(self, current_collection):
         current_collection.create_index([("endpoint_id", 1)], background=True)
         current_collection.create_index([("endpoint_id", 1), ("request_id", 1)], background=True)
-        current_collection.create_index([("endpoint_id", 1), ("request_id", 1)], background=True)
+        current_collection.create_index([("request_id", 1)], background=True)
+        current_collection.create_index([("endpoint_id", 1), ("position", 1),
+                                         ("time_requested", -1), ("__creation_datetime__", -1)],
+                                        background=True)
 
 
 class CustomGraph(Base):
@@ -289,7 +289,90 @@ class CustomGraphData(Base):
         current_collection.create_index([("graph_id", 1), ("time", 1)])
 
 
+class RequestRollup(Base):
+    def __init__(self, **new_content):
+        new_content["__tablename__"] = '{}RequestRollup'.format(config.table_prefix)
+        if not new_content.get("id"):
+            new_content["id"] = str(uuid.uuid4())
+        super().__init__(new_content)
+
+    def create_other_indexes(self, current_collection):
+        current_collection.create_index([("endpoint_id", 1), ("version_requested", 1),
+                                         ("granularity", 1), ("bucket", 1)],
+                                        unique=True, background=True)
+        current_collection.create_index([("granularity", 1), ("bucket", 1)], background=True)
+
+
+class IndexRecorder:
+    """ Collects the indexes that a table would create, without creating them. """
+
+    def __init__(self):
+        self.indexes = {}
+
+    def create_index(self, keys, **kwargs):
+        name = kwargs.get("name") or "_".join(
+            "{}_{}".format(key, direction) for key, direction in keys)
+        self.indexes[name] = (keys, kwargs)
+
+
+class PoolStatistics(ConnectionPoolListener):
+    """
+    Keeps track of the connections in the pools of the MongoDB client, since pymongo doesn't
+    expose these numbers itself.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = dict(open=0, in_use=0, created=0, closed=0, checkout_failures=0, cleared=0)
+
+    def _add(self, **values):
+        with self._lock:
+            for key, value in values.items():
+                self._stats[key] += value
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, idle=self._stats['open'] - self._stats['in_use'])
+
+    def connection_created(self, event):
+        self._add(open=1, created=1)
+
+    def connection_closed(self, event):
+        self._add(open=-1, closed=1)
+
+    def connection_checked_out(self, event):
+        self._add(in_use=1)
+
+    def connection_checked_in(self, event):
+        self._add(in_use=-1)
+
+    def connection_check_out_failed(self, event):
+        self._add(checkout_failures=1)
+
+    def pool_cleared(self, event):
+        self._add(cleared=1)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+
 class MongoDBDatabaseConnection(DatabaseConnectionBase):
+    def __init__(self):
+        super().__init__()
+        self.pool_statistics = None
+
     @property
     def user_queries(self):
         return UserQueries
@@ -326,6 +409,10 @@ class MongoDBDatabaseConnection(DatabaseConnectionBase):
     def version_query(self):
         return VersionQuery
 
+    @property
+    def rollup_query(self):
+        return RollupQuery
+
     @property
     def user(self):
         return User
@@ -358,9 +445,14 @@ class MongoDBDatabaseConnection(DatabaseConnectionBase):
     def custom_graph_data(self):
         return CustomGraphData
 
+    @property
+    def request_rollup(self):
+        return RequestRollup
+
     @staticmethod
     def get_tables():
-        return [User, Endpoint, Request, Outlier, StackLine, CodeLine, CustomGraph, CustomGraphData]
+        return [User, Endpoint, Request, Outlier, StackLine, CodeLine, CustomGraph, CustomGraphData,
+                RequestRollup]
 
     @safe_mongo_call
     def init_database(self):
@@ -371,10 +463,84 @@ class MongoDBDatabaseConnection(DatabaseConnectionBase):
             collection.create_index([("id", 1)], unique=True, background=True)
             current_table.create_other_indexes(collection)
 
+    def get_declared_indexes(self):
+        """ :return: a list of (table, {index name: (keys, options)}) tuples """
+        result = []
+        for table in self.get_tables():
+            current_table = table()
+            recorder = IndexRecorder()
+            recorder.create_index([("id", 1)], unique=True, background=True)
+            current_table.create_other_indexes(recorder)
+            result.append((current_table, recorder.indexes))
+        return result
+
+    def get_missing_indexes(self):
+        result = []
+        for table, indexes in self.get_declared_indexes():
+            existing = self.db_connection[table.__tablename__].index_information()
+            result.extend((table.__tablename__, name)
+                          for name in sorted(indexes) if name not in existing)
+        return result
+
+    def create_indexes(self):
+        missing = set(self.get_missing_indexes())
+        result = []
+        for table, indexes in self.get_declared_indexes():
+            for name in sorted(indexes):
+                if (table.__tablename__, name) not in missing:
+                    continue
+                keys, options = indexes[name]
+                try:
+                    self.db_connection[table.__tablename__].create_index(keys, **options)
+                    result.append((table.__tablename__, name, None))
+                except PyMongoError as error:
+                    result.append((table.__tablename__, name, error))
+        return result
+
     def connect(self):
         parsed_uri = uri_parser.parse_uri(config.database_name)
         database_name = parsed_uri["database"]
-        self.db_connection = MongoClient(config.database_name)[database_name]
+        self.pool_statistics = PoolStatistics()
+        self.db_connection = MongoClient(
+            config.database_name,
+            event_listeners=[self.pool_statistics],
+            **self.get_client_options(parsed_uri["options"])
+        )[database_name]
+
+    def get_pool_stats(self):
+        if self.pool_statistics is None:
+            return {}
+        return dict(
+            self.pool_statistics.stats(),
+            max_size=self.db_connection.client.options.pool_options.max_pool_size,
+        )
+
+    @staticmethod
+    def get_client_options(uri_options):
+        """
+        :param uri_options: the options that are specified in the connection string
+        :return: the options of the client that are configured, but not in the connection string
+        """
+        write_concern = str(config.mongo_write_concern)
+        options = dict(
+            readPreference=config.mongo_read_preference,
+            readConcernLevel=config.mongo_read_concern,
+            retryReads=True,
+            retryWrites=True,
+            maxPoolSize=config.mongo_max_pool_size,
+            minPoolSize=config.mongo_min_pool_size,
+            w=int(write_concern) if write_concern.isdigit() else write_concern,
+            connectTimeoutMS=int(config.mongo_connect_timeout * 1000),
+            socketTimeoutMS=int(config.mongo_socket_timeout * 1000),
+            serverSelectionTimeoutMS=int(config.mongo_server_selection_timeout * 1000),
+            waitQueueTimeoutMS=int(config.mongo_wait_queue_timeout * 1000),
+        )
+        if options['w'] != 0:
+            # journaling can't be requested for unacknowledged writes
+            options['journal'] = config.mongo_journal
+        if config.mongo_compressors:
+            options['compressors'] = config.mongo_compressors
+        return {key: value for key, value in options.items() if key.lower() not in uri_options}
 
     @contextmanager
     def session_scope(self):
@@ -411,6 +577,10 @@ class CommonRouting(QueryBaseObject):
         # So, we skip them for the moment
         pass
 
+    def flush(self):
+        # Documents are written immediately
+        pass
+
     def finalize_update(self, obj):
         obj.get_collection(self.session).update_one({"id": obj.id}, {"$set": obj})
 
@@ -424,9 +594,15 @@ class CommonRouting(QueryBaseObject):
     def get_field_name(name, obj):
         return name
 
+    @staticmethod
+    def get_projection(model_class):
+        # the embedded profiles of requests are only loaded by the StackLineQuery
+        return {"stack_lines": 0} if model_class is Request else None
+
     def find_by_id(self, obj, obj_id):
         try:
-            return obj(**obj().get_collection(self.session).find_one({"id": obj_id}))
+            collection = obj().get_collection(self.session)
+            return obj(**collection.find_one({"id": obj_id}, self.get_projection(obj)))
         except TypeError:
             raise NoResultFound()
 
@@ -434,7 +610,9 @@ class CommonRouting(QueryBaseObject):
         return model_class().get_collection(self.session).count_documents({})
 
     def find_all(self, model_class):
-        return list(model_class(**elem) for elem in model_class().get_collection(self.session).find({}))
+        collection = model_class().get_collection(self.session)
+        return list(model_class(**elem) for elem in
+                    collection.find({}, self.get_projection(model_class)))
 
 
 class UserQueries(CommonRouting, UserQueriesBase):
@@ -484,6 +662,36 @@ class CodeLineQueries(CommonRouting, CodeLineQueriesBase):
             new_code_line = CodeLine(**code_line)
         return new_code_line
 
+    def get_latest_code_lines(self, limit):
+        return [CodeLine(**elem) for elem in
+                CodeLine().get_collection(self.session).find().sort([("_id", -1)]).limit(limit)]
+
+    def get_code_lines(self, code_lines):
+        code_lines = set(code_lines)
+        if not code_lines:
+            return {}
+        code_line_collection = CodeLine().get_collection(self.session)
+        result = {}
+        for elem in code_line_collection.find({
+            "filename": {"$in": list({code_line[0] for code_line in code_lines})},
+            "line_number": {"$in": list({code_line[1] for code_line in code_lines})},
+        }):
+            key = (elem["filename"], elem["line_number"], elem["function_name"], elem["code"])
+            if key in code_lines:
+                result[key] = CodeLine(**elem)
+        missing = [
+            CodeLine(filename=fn, line_number=ln, function_name=name, code=code)
+            for fn, ln, name, code in code_lines
+            if (fn, ln, name, code) not in result
+        ]
+        if missing:
+            code_line_collection.insert_many(missing, ordered=False)
+            for code_line in missing:
+                key = (code_line["filename"], code_line["line_number"], code_line["function_name"],
+                       code_line["code"])
+                result[key] = code_line
+        return result
+
 
 class CountQueries(CommonRouting, CountQueriesBase):
     def count_rows(self, column, *criterion):
@@ -506,6 +714,9 @@ class CountQueries(CommonRouting, CountQueriesBase):
         return Outlier().get_collection(self.session).count_documents({"endpoint_id": endpoint_id})
 
     def count_profiled_requests(self, endpoint_id):
+        if config.mongo_embedded_profiles:
+            return Request().get_collection(self.session).count_documents(
+                {"endpoint_id": endpoint_id, "stack_lines": {"$exists": True}})
         pipeline = list()
         pipeline.append({"$match": {"endpoint_id": endpoint_id}})
         pipeline.append({"$group": {"_id": "$request_id"}})
@@ -523,19 +734,90 @@ class CountQueries(CommonRouting, CountQueriesBase):
         return list((elem["_id"], elem["counting"]) for elem in
                     Request().get_collection(self.session).aggregate(query))
 
+    def count_request_hits_per_endpoint(self, today, week_ago):
+        is_error = {"$and": [{"$gte": ["$status_code", 400]}, {"$lt": ["$status_code", 600]}]}
+        is_today = {"$gte": ["$time_requested", today]}
+        is_week = {"$gte": ["$time_requested", week_ago]}
+
+        def count_if(*criterion):
+            return {"$sum": {"$cond": [{"$and": list(criterion)}, 1, 0]}}
+
+        query = [
+            {"$group": {
+                "_id": "$endpoint_id",
+                "today": count_if(is_today),
+                "today_errors": count_if(is_today, is_error),
+                "week": count_if(is_week),
+                "week_errors": count_if(is_week, is_error),
+                "overall": {"$sum": 1},
+            }}
+        ]
+        rows = Request().get_collection(self.session).aggregate(query)
+        return list((elem["_id"], elem["today"], elem["today_errors"], elem["week"],
+                     elem["week_errors"], elem["overall"]) for elem in rows)
+
+    def count_request_per_endpoint_per_day(self, start, end, utc_offset):
+        query = [
+            {"$match": {"time_requested": {"$gte": start, "$lt": end}}},
+            {"$group": {
+                "_id": {
+                    "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$time_requested",
+                                              "timezone": format_utc_offset(utc_offset)}},
+                    "endpoint_id": "$endpoint_id",
+                },
+                "counting": {"$sum": 1}
+            }}
+        ]
+        return list((elem["_id"]["day"], elem["_id"]["endpoint_id"], elem["counting"]) for elem in
+                    Request().get_collection(self.session).aggregate(query))
+
     @staticmethod
     def generate_time_query(dt_begin, dt_end):
-        return [{"$and": [{"time_requested": {"$gte": dt_begin}}, {"time_requested": {"$lt": dt_end}}]}]
+        return [{"$and": [{"time_requested": {"$gte": dt_begin}},
+                          {"time_requested": {"$lt": dt_end}}]}]
 
     def get_data_grouped(self, column, *where):
-        return list((elem[column], elem["duration"])
-                    for elem in Request().get_collection(self.session).find({"$and": list(where)}
-                                                                            if len(where) > 0
-                                                                            else {}).sort([(column, 1)]))
+        collection = Request().get_collection(self.session)
+        rows = collection.find({"$and": list(where)} if len(where) > 0 else {}, {"stack_lines": 0})
+        return list((elem[column], elem["duration"]) for elem in rows.sort([(column, 1)]))
 
     def get_two_columns_grouped(self, column, *where):
+        collection = Request().get_collection(self.session)
+        rows = collection.find({"$and": list(where)}, {"stack_lines": 0})
         return list(((elem[column], elem["version_requested"]), elem["duration"]) for elem in
-                    Request().get_collection(self.session).find({"$and": list(where)}).sort([(column, 1)]))
+                    rows.sort([(column, 1)]))
+
+    def get_percentile_grouped(self, column, q, *where):
+        return [(key["key"], value)
+                for key, value in self._get_percentiles(q, {"key": column}, where)]
+
+    def get_two_columns_percentile_grouped(self, column, q, *where):
+        return [((key["key"], key["version"]), value) for key, value in
+                self._get_percentiles(q, {"key": column, "version": "version_requested"}, where)]
+
+    def _get_percentiles(self, q, columns, where):
+        """
+        :param columns: dict of names -> fields to group on
+        :return: a list of ({name: value}, percentile) tuples
+        """
+        match = [{"$match": {"$and": list(where)}}] if where else []
+        group_key = {name: "${}".format(field) for name, field in columns.items()}
+        collection = Request().get_collection(self.session)
+        try:
+            # $percentile requires MongoDB 7.0, and is computed with a t-digest (approximate)
+            return [(elem["_id"], elem["percentile"][0]) for elem in collection.aggregate(match + [
+                {"$group": {
+                    "_id": group_key,
+                    "percentile": {"$percentile": {"input": "$duration", "p": [q],
+                                                   "method": "approximate"}},
+                }},
+            ])]
+        except OperationFailure:
+            rows = collection.aggregate(match + [
+                {"$sort": {field: 1 for field in columns.values()}},
+                {"$project": {"_id": 0, "key": group_key, "duration": 1}},
+            ], allowDiskUse=True)
+            return self.stream_percentiles(((row["key"], row["duration"]) for row in rows), q)
 
 
 class CustomGraphQuery(CommonRouting, CustomGraphQueryBase):
@@ -566,13 +848,19 @@ class CustomGraphQuery(CommonRouting, CustomGraphQueryBase):
 
 
 class EndpointQuery(CommonRouting, EndpointQueryBase):
-    def get_num_requests(self, endpoint_id, start_date, end_date):
-        query = {
-            "$and": [{"time_requested": {"$gte": start_date}}, {"time_requested": {"$lte": end_date}}]
-        }
+    def get_num_requests_per_hour(self, endpoint_id, start_date, end_date, utc_offset):
+        match = {"time_requested": {"$gte": start_date, "$lte": end_date}}
         if endpoint_id:
-            query["endpoint_id"] = endpoint_id
-        return list(r["time_requested"] for r in Request().get_collection(self.session).find(query))
+            match["endpoint_id"] = endpoint_id
+        query = [
+            {"$match": match},
+            {"$group": {
+                "_id": {"$dateToString": {"format": "%Y-%m-%d %H", "date": "$time_requested",
+                                          "timezone": format_utc_offset(utc_offset)}},
+                "counting": {"$sum": 1}
+            }}
+        ]
+        return list((elem["_id"], elem["counting"]) for elem in Request().get_collection(self.session).aggregate(query))
 
     def get_statistics(self, endpoint_id, field_name, limit):
         query = [
@@ -667,37 +955,47 @@ class EndpointQuery(CommonRouting, EndpointQueryBase):
 
     @staticmethod
     def filter_by_time(current_time, hits_criterion=None):
-        return {
-            "$and": [{"time_requested": {"$gte": current_time}}, hits_criterion] if hits_criterion else
-            [{"time_requested": {"$gte": current_time}}]
-        }
+        if hits_criterion:
+            return {"$and": [{"time_requested": {"$gte": current_time}}, hits_criterion]}
+        return {"$and": [{"time_requested": {"$gte": current_time}}]}
 
 
 class OutlierQuery(CommonRouting, OutlierQueryBase):
-    def create_outlier_record(self, outlier):
+    def create_outlier_record(self, outlier, endpoint_id=None, time_requested=None):
         if not outlier:
             return
-        outlier.endpoint_id = Request().get_collection(self.session).find_one({
-            "id": outlier.request_id
-        })["endpoint_id"]
+        if endpoint_id is None or time_requested is None:
+            request = Request().get_collection(self.session).find_one(
+                {"id": outlier.request_id}, {"endpoint_id": 1, "time_requested": 1})
+            endpoint_id = request["endpoint_id"] if endpoint_id is None else endpoint_id
+            if time_requested is None:
+                time_requested = request.get("time_requested")
+        outlier.endpoint_id = endpoint_id
+        outlier.time_requested = time_requested
         outlier.get_collection(self.session).insert_one(outlier)
 
     def get_outliers_sorted(self, endpoint_id, offset, per_page):
-        requests = list(Request().get_collection(self.session).find({
-            "endpoint_id": endpoint_id
-        }).sort([("time_requested", 1)]))
-        outliers = dict()
-        for elem in Outlier().get_collection(self.session).find({"endpoint_id": endpoint_id}).skip(int(offset)).limit(
-                int(per_page)):
-            outliers.setdefault(elem["request_id"], []).append(Outlier(**elem))
+        # outliers that were stored without the time of their request are sorted by creation time
+        pipeline = [
+            {"$match": {"endpoint_id": endpoint_id}},
+            {"$sort": {"time_requested": -1, "__creation_datetime__": -1}},
+            {"$skip": int(offset)},
+            {"$limit": int(per_page)},
+            {"$lookup": {
+                "from": Request().__tablename__,
+                "localField": "request_id",
+                "foreignField": "id",
+                "as": "request",
+            }},
+            {"$unwind": "$request"},
+            {"$project": {"request.stack_lines": 0}},
+        ]
         results = []
-        for request in requests:
-            if outliers.get(request["id"]):
-                for current_outlier in outliers[request["id"]]:
-                    current_outlier["request"] = Request(**request)
-                results.extend(outliers[request["id"]])
-            if len(results) > int(per_page):
-                break
+        for elem in Outlier().get_collection(self.session).aggregate(pipeline):
+            request = elem.pop("request")
+            outlier = Outlier(**elem)
+            outlier["request"] = Request(**request)
+            results.append(outlier)
         return results
 
     def get_outliers_cpus(self, endpoint_id):
@@ -729,8 +1027,13 @@ class VersionQuery(CommonRouting, VersionQueryBase):
                     Request().get_collection(self.session).aggregate(query))
 
     @staticmethod
-    def get_2d_version_data_filter(endpoint_id):
-        return {"endpoint_id": endpoint_id}
+    def get_2d_version_data_filter(endpoint_id, column=None, values=None, versions=None):
+        criterion = {"endpoint_id": endpoint_id}
+        if values is not None:
+            criterion[column] = {"$in": list(values)}
+        if versions is not None:
+            criterion["version_requested"] = {"$in": list(versions)}
+        return criterion
 
     def get_first_requests(self, endpoint_id, limit=None):
         query = [
@@ -743,85 +1046,212 @@ class VersionQuery(CommonRouting, VersionQueryBase):
         ]
         if limit:
             query.append({"$limit": int(limit)})
-        return list((elem["_id"], elem["minTime"]) for elem in Request().get_collection(self.session).aggregate(query))
+        rows = Request().get_collection(self.session).aggregate(query)
+        return list((elem["_id"], elem["minTime"]) for elem in rows)
+
+    def get_hits_per_endpoint_and_version(self, versions):
+        query = [
+            {"$match": {"version_requested": {"$in": list(versions)}}},
+            {"$group": {
+                "_id": {"endpoint_id": "$endpoint_id", "version": "$version_requested"},
+                "counting": {"$sum": 1}
+            }},
+            {"$lookup": {
+                "from": '{}Endpoint'.format(config.table_prefix),
+                "localField": "_id.endpoint_id",
+                "foreignField": "id",
+                "as": "endpoint"
+            }},
+            {"$unwind": "$endpoint"}
+        ]
+        return list((elem["endpoint"]["name"], elem["_id"]["version"], elem["counting"]) for elem in
+                    Request().get_collection(self.session).aggregate(query))
 
 
 class StackLineQuery(CommonRouting, StackLineQueryBase):
-    def create_stack_line(self, new_stack_line):
-        new_stack_line.endpoint_id = Request().get_collection(self.session).find_one({
-            "id": new_stack_line.request_id
-        })["endpoint_id"]
-        new_stack_line.get_collection(self.session).insert_one(new_stack_line)
+    def create_stack_line(self, new_stack_line, endpoint_id=None, time_requested=None):
+        self.bulk_create([new_stack_line], endpoint_id, time_requested)
 
-    def get_profiled_requests(self, endpoint_id, offset, per_page):
-        requests = list(Request().get_collection(self.session).find({
-            "endpoint_id": endpoint_id
-        }).sort([("time_requested", 1)]))
-        if not requests:
-            return []
-        stack_line_list = StackLine().get_collection(self.session).find({"endpoint_id": endpoint_id})
-        if not stack_line_list:
-            return []
-        stack_lines = dict()
-        code_line_ids = []
-        for elem in stack_line_list:
-            if elem.get("code_id"):
-                code_line_ids.append(elem["code_id"])
-                stack_lines.setdefault(elem["request_id"], []).append(StackLine(**elem))
+    def bulk_create(self, stack_lines, endpoint_id=None, time_requested=None):
+        if not stack_lines:
+            return
+        if config.mongo_embedded_profiles:
+            self.embed_stack_lines(stack_lines)
+            return
+        requests = {}
+        if endpoint_id is None or time_requested is None:
+            request_ids = list({stack_line.request_id for stack_line in stack_lines})
+            requests = {
+                elem["id"]: elem for elem in Request().get_collection(self.session).find(
+                    {"id": {"$in": request_ids}}, {"id": 1, "endpoint_id": 1, "time_requested": 1})
+            }
+        for stack_line in stack_lines:
+            request = requests.get(stack_line.request_id, {})
+            stack_line.endpoint_id = request["endpoint_id"] if endpoint_id is None else endpoint_id
+            # the profiled requests are paginated using the stack lines at position 0
+            if stack_line.position == 0:
+                stack_line.time_requested = request.get("time_requested") \
+                    if time_requested is None else time_requested
+        StackLine().get_collection(self.session).insert_many(stack_lines, ordered=False)
+
+    def embed_stack_lines(self, stack_lines):
+        """
+        Stores the stack lines of a request as an array of (code_id, indent, duration) in the
+        document of the request, ordered by their position.
+        """
+        stack_lines_per_request = dict()
+        for stack_line in sorted(stack_lines, key=lambda elem: elem.position):
+            stack_lines_per_request.setdefault(stack_line.request_id, []).append(
+                [stack_line.code_id, stack_line.indent, stack_line.duration])
+        collection = Request().get_collection(self.session)
+        for request_id, embedded in stack_lines_per_request.items():
+            collection.update_one({"id": request_id}, {"$set": {"stack_lines": embedded}})
+
+    def get_embedded_profiles(self, endpoint_id, offset=0, limit=None):
+        """
+        :return: a list of the most recent profiled requests of the endpoint, together with their
+        stack lines and code lines, using the embedded profile layout.
+        """
+        cursor = Request().get_collection(self.session).find(
+            {"endpoint_id": endpoint_id, "stack_lines": {"$exists": True}}
+        ).sort([("time_requested", -1)]).skip(int(offset))
+        if limit is not None:
+            cursor = cursor.limit(int(limit))
+        requests = list(cursor)
+        code_line_ids = list(
+            {code_id for request in requests for code_id, _, _ in request["stack_lines"]})
         code_lines = {elem["id"]: CodeLine(**elem) for elem in
                       CodeLine().get_collection(self.session).find({"id": {"$in": code_line_ids}})}
         results = []
-        for request in requests[int(offset):]:
-            for stack_line in stack_lines.get(request["id"], {}):
-                if stack_line.get("code_id"):
-                    # stack_lines[request["id"]].request = Request(**request)
-                    stack_line["code"] = code_lines.get(stack_line["code_id"])
-                    new_request = Request(**request)
-                    new_request.setdefault("stack_lines", []).append(stack_line)
-                    results.append(new_request)
-            if len(results) > int(per_page):
-                break
+        for elem in requests:
+            embedded = elem.pop("stack_lines")
+            request = Request(**elem)
+            stack_lines = []
+            for position, (code_id, indent, duration) in enumerate(embedded):
+                stack_line = StackLine(request_id=request.id, endpoint_id=endpoint_id,
+                                       position=position, indent=indent, duration=duration,
+                                       code_id=code_id)
+                stack_line["code"] = code_lines.get(code_id)
+                stack_lines.append(stack_line)
+            request["stack_lines"] = stack_lines
+            results.append(request)
         return results
 
-    def get_grouped_profiled_requests(self, endpoint_id):
-        stack_lines_list = StackLine().get_collection(self.session).find(
-            {"endpoint_id": endpoint_id}).limit(100).sort([("request_id", -1)])
-        if not stack_lines_list:
-            return []
-        stack_lines = dict()
-        code_line_ids = []
-        for elem in stack_lines_list:
-            if elem.get("code_id"):
-                code_line_ids.append(elem["code_id"])
-                stack_lines.setdefault(elem["request_id"], []).append(StackLine(**elem))
+    def get_profiled_requests(self, endpoint_id, offset, per_page):
+        if config.mongo_embedded_profiles:
+            return self.get_embedded_profiles(endpoint_id, offset, per_page)
+        return self.get_paginated_profiles(endpoint_id, offset, per_page)
+
+    def get_paginated_profiles(self, endpoint_id, offset, limit):
+        """
+        :return: a list of the most recent profiled requests of the endpoint, together with their
+        stack lines and code lines, using the StackLine collection. Only the requests of a single
+        page are loaded.
+        """
+        # every profiled request has a stack line at position 0, which has the time of its request.
+        # Stack lines that were stored without this time are sorted by creation time
+        pipeline = [
+            {"$match": {"endpoint_id": endpoint_id, "position": 0}},
+            {"$sort": {"time_requested": -1, "__creation_datetime__": -1}},
+            {"$skip": int(offset)},
+            {"$limit": int(limit)},
+            {"$lookup": {
+                "from": Request().__tablename__,
+                "localField": "request_id",
+                "foreignField": "id",
+                "as": "request",
+            }},
+            {"$unwind": "$request"},
+            {"$project": {"request.stack_lines": 0}},
+            {"$lookup": {
+                "from": StackLine().__tablename__,
+                "localField": "request_id",
+                "foreignField": "request_id",
+                "as": "stack_lines",
+            }},
+            {"$project": {"_id": 0, "request": 1, "stack_lines": 1}},
+        ]
+        profiles = list(StackLine().get_collection(self.session).aggregate(pipeline))
+        code_line_ids = list({stack_line.get("code_id") for profile in profiles
+                              for stack_line in profile["stack_lines"]})
         code_lines = {elem["id"]: CodeLine(**elem) for elem in
                       CodeLine().get_collection(self.session).find({"id": {"$in": code_line_ids}})}
-        requests = list(Request().get_collection(self.session).find({
-            "id": {"$in": list(stack_lines.keys())}
-        }).sort([("time_requested", 1)]))
         results = []
-        for request in requests:
-            for stack_line in stack_lines.get(request["id"], {}):
-                if stack_line.get("code_id"):
-                    # stack_lines[request["id"]].request = Request(**request)
-                    stack_line["code"] = code_lines.get(stack_line["code_id"])
-                    new_request = Request(**request)
-                    new_request.setdefault("stack_lines", []).append(stack_line)
-                    results.append(new_request)
+        for profile in profiles:
+            request = Request(**profile["request"])
+            stack_lines = []
+            for elem in sorted(profile["stack_lines"], key=lambda line: line.get("position") or 0):
+                stack_line = StackLine(**elem)
+                stack_line["code"] = code_lines.get(elem.get("code_id"))
+                stack_lines.append(stack_line)
+            request["stack_lines"] = stack_lines
+            results.append(request)
         return results
 
+    def get_grouped_profiled_requests(self, endpoint_id):
+        if config.mongo_embedded_profiles:
+            # the most recent 100 requests, otherwise the profiler gets too large
+            return self.get_embedded_profiles(endpoint_id, limit=100)
+        return self.get_paginated_profiles(endpoint_id, 0, 100)
+
     def find_by_request_id(self, request_id):
+        if config.mongo_embedded_profiles:
+            request = Request().get_collection(self.session).find_one(
+                {"id": request_id, "stack_lines": {"$exists": True}},
+                {"endpoint_id": 1, "stack_lines": {"$slice": 1}})
+            if request is None or not request["stack_lines"]:
+                return None
+            code_id, indent, duration = request["stack_lines"][0]
+            return StackLine(request_id=request_id, endpoint_id=request["endpoint_id"], position=0,
+                             indent=indent, duration=duration, code_id=code_id)
         return StackLine().get_collection(self.session).find_one({"request_id": request_id})
 
 
 class RequestQuery(CommonRouting, RequestQueryBase):
+    def bulk_create(self, requests):
+        Request().get_collection(self.session).insert_many(requests, ordered=False)
+
     def get_latencies_sample(self, endpoint_id, criterion, sample_size):
         if criterion and isinstance(criterion, dict):
             criterion = [criterion]
-        return list(elem.get("duration") for elem in Request().get_collection(self.session).find({
-            "endpoint_id": endpoint_id,
-            "$and": list(criterion)
-        } if criterion and len(criterion) > 0 else {"endpoint_id": endpoint_id}).limit(int(sample_size)))
+        match = {"endpoint_id": endpoint_id}
+        if criterion and len(criterion) > 0:
+            match["$and"] = list(criterion)
+        # $sample returns all documents if at most sample_size of them match
+        return list(elem["duration"] for elem in Request().get_collection(self.session).aggregate([
+            {"$match": match},
+            {"$sample": {"size": int(sample_size)}},
+            {"$project": {"_id": 0, "duration": 1}},
+        ]))
+
+    def get_latencies_samples(self, criterion, sample_size):
+        if criterion and isinstance(criterion, dict):
+            criterion = [criterion]
+        match = {"$and": list(criterion)} if criterion and len(criterion) > 0 else {}
+        try:
+            # $topN requires MongoDB 5.2. Ordering on a random number gives a uniform sample of
+            # every endpoint in a single pipeline.
+            return {elem["_id"]: elem["durations"] for elem in
+                    Request().get_collection(self.session).aggregate([
+                        {"$match": match},
+                        {"$project": {"_id": 0, "endpoint_id": 1, "duration": 1,
+                                      "random": {"$rand": {}}}},
+                        {"$group": {
+                            "_id": "$endpoint_id",
+                            "durations": {"$topN": {"n": int(sample_size), "sortBy": {"random": 1},
+                                                    "output": "$duration"}},
+                        }},
+                    ], allowDiskUse=True)}
+        except OperationFailure:
+            return self._get_latencies_samples_per_endpoint(criterion, sample_size)
+
+    def _get_latencies_samples_per_endpoint(self, criterion, sample_size):
+        samples = {}
+        for endpoint in Endpoint().get_collection(self.session).find({}, {"id": 1}):
+            sample = self.get_latencies_sample(endpoint["id"], criterion, sample_size)
+            if sample:
+                samples[endpoint["id"]] = sample
+        return samples
 
     def get_error_requests_db(self, endpoint_id, criterion):
         and_condition = [
@@ -835,7 +1265,23 @@ class RequestQuery(CommonRouting, RequestQueryBase):
         return list(Request(**elem) for elem in Request().get_collection(self.session).find({
             "endpoint_id": endpoint_id,
             "$and": and_condition
-        }))
+        }, {"stack_lines": 0}))
+
+    def get_status_code_frequencies_per_endpoint(self, *criterion):
+        and_condition = [
+            {"status_code": {"$ne": None}},
+            {"status_code": {"$exists": True}}
+        ]
+        if len(criterion) > 0:
+            and_condition.append({"$and": list(criterion)})
+        return list((elem["_id"]["endpoint_id"], elem["_id"]["status_code"], elem["counting"]) for elem in
+                    Request().get_collection(self.session).aggregate([
+                        {"$match": {"$and": and_condition}},
+                        {"$group": {
+                            "_id": {"endpoint_id": "$endpoint_id", "status_code": "$status_code"},
+                            "counting": {"$sum": 1}
+                        }}
+                    ]))
 
     def get_all_request_status_code_counts(self, endpoint_id):
         return list((elem["_id"], elem["counting"]) for elem in Request().get_collection(self.session).aggregate([
@@ -877,12 +1323,148 @@ class RequestQuery(CommonRouting, RequestQueryBase):
         ])}
 
     def get_date_of_first_request(self):
-        result = Request().get_collection(self.session).find_one(sort=[("time_requested", 1)])
+        result = Request().get_collection(self.session).find_one({}, {"time_requested": 1},
+                                                                 sort=[("time_requested", 1)])
         return result.get("time_requested") if result else None
 
     def get_date_of_first_request_version(self, version):
         result = Request().get_collection(self.session).find_one({
             "version_requested": version
-        }, sort=[("time_requested", 1)])
+        }, {"time_requested": 1}, sort=[("time_requested", 1)])
         return result.get("time_requested") if result else None
 
+
+class RollupQuery(CommonRouting, RollupQueryBase):
+    def update_rollups(self, rollups):
+        if not rollups:
+            return
+        operations = [
+            UpdateOne(
+                {
+                    "endpoint_id": rollup["endpoint_id"],
+                    "version_requested": rollup["version_requested"],
+                    "granularity": rollup["granularity"],
+                    "bucket": rollup["bucket"],
+                },
+                {
+                    "$setOnInsert": {"id": str(uuid.uuid4())},
+                    "$inc": dict(self._sketch_increments(rollup["sketch"]), **{
+                        "count": rollup["count"],
+                        "error_count": rollup["error_count"],
+                        "duration_sum": rollup["duration_sum"],
+                    }),
+                    "$min": {"duration_min": rollup["duration_min"]},
+                    "$max": {"duration_max": rollup["duration_max"]},
+                },
+                upsert=True,
+            )
+            for rollup in rollups
+        ]
+        # $inc is not idempotent, so this write is not retried by safe_mongo_call: after a network
+        # timeout, the server may already have applied it. The driver retries it safely instead
+        # (retryWrites), since it can detect whether the first attempt was applied.
+        collection = RequestRollup().get_collection(self.session).collection
+        try:
+            collection.bulk_write(operations, ordered=True)
+        except BulkWriteError as error:
+            # Another process inserted the same bucket concurrently. The operations before the
+            # failing one are applied, the remaining ones can now be applied as an update.
+            failed = error.details["writeErrors"][0]["index"]
+            collection.bulk_write(operations[failed:], ordered=True)
+
+    def get_rollup_totals(self, ranges):
+        pipeline = [
+            {"$match": {"$or": [self._range_criterion(*time_range) for time_range in ranges]}},
+            {"$group": {
+                "_id": "$endpoint_id",
+                "count": {"$sum": "$count"},
+                "error_count": {"$sum": "$error_count"},
+                "duration_sum": {"$sum": "$duration_sum"},
+                "duration_min": {"$min": "$duration_min"},
+                "duration_max": {"$max": "$duration_max"},
+            }},
+        ]
+        return [
+            (elem["_id"], elem["count"], elem["error_count"], elem["duration_sum"],
+             elem["duration_min"], elem["duration_max"])
+            for elem in RequestRollup().get_collection(self.session).aggregate(pipeline)
+        ]
+
+    def get_rollup_buckets(self, granularity, start, end, endpoint_id=None):
+        criterion = self._range_criterion(granularity, start, end)
+        if endpoint_id is not None:
+            criterion["endpoint_id"] = endpoint_id
+        pipeline = [
+            {"$match": criterion},
+            {"$group": {
+                "_id": {"endpoint_id": "$endpoint_id", "bucket": "$bucket"},
+                "count": {"$sum": "$count"},
+            }},
+        ]
+        return [
+            (elem["_id"]["endpoint_id"], elem["_id"]["bucket"], elem["count"])
+            for elem in RequestRollup().get_collection(self.session).aggregate(pipeline)
+        ]
+
+    def get_rollup_sketches(self, ranges, endpoint_id=None):
+        criterion = {"$or": [self._range_criterion(*time_range) for time_range in ranges]}
+        if endpoint_id is not None:
+            criterion["endpoint_id"] = endpoint_id
+        pipeline = [
+            {"$match": criterion},
+            {"$project": {"endpoint_id": 1, "version_requested": 1, "sketches": 1}},
+        ]
+        result = []
+        for elem in RequestRollup().get_collection(self.session).aggregate(pipeline):
+            for accuracy, bins in (elem.get("sketches") or {}).items():
+                sketch = DDSketch.from_dict({
+                    "relative_accuracy": float(accuracy.replace("_", ".")),
+                    "zero_count": bins.pop("zero", 0),
+                    "bins": bins,
+                })
+                result.append((elem["endpoint_id"], elem["version_requested"], sketch))
+        return result
+
+    def get_requests_for_rollup(self, after, limit):
+        pipeline = []
+        if after is not None:
+            pipeline.append({"$match": {"_id": {"$gt": after}}})
+        pipeline.extend([
+            {"$sort": {"_id": 1}},
+            {"$limit": limit},
+            {"$project": {"endpoint_id": 1, "version_requested": 1, "time_requested": 1,
+                          "duration": 1, "status_code": 1}},
+        ])
+        rows = list(Request().get_collection(self.session).aggregate(pipeline))
+        return rows[-1]["_id"] if rows else after, [
+            (row["endpoint_id"], row.get("version_requested"), row["time_requested"],
+             row["duration"], row.get("status_code"))
+            for row in rows
+        ]
+
+    def delete_rollups(self):
+        RequestRollup().get_collection(self.session).delete_many({})
+
+    @staticmethod
+    def _sketch_increments(sketch):
+        """
+        The bins of the sketches are stored per accuracy, such that they can be merged atomically
+        with $inc: {"sketches": {"0_01": {"zero": 2, "462": 10, ...}}}
+        """
+        prefix = "sketches.{}.".format(repr(sketch.relative_accuracy).replace(".", "_"))
+        increments = {prefix + str(key): count for key, count in sketch.bins.items()}
+        if sketch.zero_count:
+            increments[prefix + "zero"] = sketch.zero_count
+        return increments
+
+    @staticmethod
+    def _range_criterion(granularity, start, end):
+        criterion = {"granularity": granularity}
+        bucket = {}
+        if start is not None:
+            bucket["$gte"] = start
+        if end is not None:
+            bucket["$lt"] = end
+        if bucket:
+            criterion["bucket"] = bucket
+        return criterion
@@ -1,5 +1,9 @@
+import itertools
+import random
 from abc import ABC, abstractmethod
 
+import numpy
+
 
 class DatabaseConnectionBase(ABC):
     def __init__(self):
@@ -50,6 +54,11 @@ class DatabaseConnectionBase(ABC):
     def version_query(self):
         raise NotImplementedError()
 
+    @property
+    @abstractmethod
+    def rollup_query(self):
+        raise NotImplementedError()
+
     @property
     @abstractmethod
     def user(self):
@@ -90,12 +99,39 @@ class DatabaseConnectionBase(ABC):
     def custom_graph_data(self):
         raise NotImplementedError()
 
+    @property
+    @abstractmethod
+    def request_rollup(self):
+        raise NotImplementedError()
+
     def init_database(self):
         raise NotImplementedError()
 
     def connect(self):
         raise NotImplementedError()
 
+    def get_missing_indexes(self):
+        """
+        :return: a list of (table name, index name) tuples of the indexes that don't exist yet
+        """
+        raise NotImplementedError()
+
+    def create_indexes(self):
+        """
+        Creates the indexes that don't exist yet, without blocking the database for writes if
+        possible.
+        :return: a list of (table name, index name, error) tuples, error is None if the index was
+        created
+        """
+        raise NotImplementedError()
+
+    def get_pool_stats(self):
+        """
+        :return: a dict with live statistics of the connection pool, e.g. the number of connections
+        that are in use. Empty if the pool doesn't keep any statistics.
+        """
+        raise NotImplementedError()
+
     def session_scope(self):
         raise NotImplementedError()
 
@@ -115,6 +151,10 @@ class QueryBaseObject(ABC):
     def commit(self):
         raise NotImplementedError()
 
+    def flush(self):
+        """ Sends the pending changes to the database, without committing them. """
+        raise NotImplementedError()
+
     def expunge_all(self):
         raise NotImplementedError()
 
@@ -165,6 +205,12 @@ class CodeLineQueriesBase(QueryBaseObject, ABC):
     def get_code_line(self, fn, ln, name, code):
         raise NotImplementedError()
 
+    def get_code_lines(self, code_lines):
+        raise NotImplementedError()
+
+    def get_latest_code_lines(self, limit):
+        raise NotImplementedError()
+
 
 class CountQueriesBase(QueryBaseObject, ABC):
     def count_rows(self, column, *criterion):
@@ -185,6 +231,19 @@ class CountQueriesBase(QueryBaseObject, ABC):
     def count_request_per_endpoint(self, column, *criterion):
         raise NotImplementedError()
 
+    def count_request_hits_per_endpoint(self, today, week_ago):
+        raise NotImplementedError()
+
+    def count_request_per_endpoint_per_day(self, start, end, utc_offset):
+        """
+        :param start: datetime object (UTC), only the requests since this moment are counted
+        :param end: datetime object (UTC), only the requests before this moment are counted
+        :param utc_offset: offset of the local time in seconds, which determines the local day
+        :return: a list of (day, endpoint_id, hits) tuples. The day is either a date object or an
+        ISO formatted string, depending on the database.
+        """
+        raise NotImplementedError()
+
     @staticmethod
     def generate_time_query(dt_begin, dt_end):
         raise NotImplementedError()
@@ -195,6 +254,27 @@ class CountQueriesBase(QueryBaseObject, ABC):
     def get_two_columns_grouped(self, column, *where):
         raise NotImplementedError()
 
+    def get_percentile_grouped(self, column, q, *where):
+        raise NotImplementedError()
+
+    def get_two_columns_percentile_grouped(self, column, q, *where):
+        raise NotImplementedError()
+
+    @staticmethod
+    def stream_percentiles(rows, q):
+        """
+        Fallback for databases that can't compute percentiles themselves.
+        :param rows: iterable of (key, duration) rows, ordered by key
+        :param q: percentile between 0 and 1
+        :return: a list of (key, percentile) tuples. Only the durations of a single key are kept
+        in memory at the same time.
+        """
+        result = []
+        for key, group in itertools.groupby(rows, key=lambda row: row[0]):
+            durations = numpy.fromiter((row[1] for row in group), dtype=float)
+            result.append((key, float(numpy.percentile(durations, q * 100))))
+        return result
+
 
 class CustomGraphQueryBase(QueryBaseObject, ABC):
     def find_or_create_graph(self, name):
@@ -211,7 +291,15 @@ class CustomGraphQueryBase(QueryBaseObject, ABC):
 
 
 class EndpointQueryBase(QueryBaseObject, ABC):
-    def get_num_requests(self, endpoint_id, start_date, end_date):
+    def get_num_requests_per_hour(self, endpoint_id, start_date, end_date, utc_offset):
+        """
+        :param endpoint_id: if None, the requests of all endpoints are counted
+        :param start_date: datetime object (UTC)
+        :param end_date: datetime object (UTC)
+        :param utc_offset: offset of the local time in seconds
+        :return: a list of (hour, hits) tuples, where hour is the local hour formatted as
+        'YYYY-MM-DD HH'
+        """
         raise NotImplementedError()
 
     def get_statistics(self, endpoint_id, field_name, limit):
@@ -252,7 +340,12 @@ class EndpointQueryBase(QueryBaseObject, ABC):
 
 
 class OutlierQueryBase(QueryBaseObject, ABC):
-    def create_outlier_record(self, obj):
+    def create_outlier_record(self, obj, endpoint_id=None, time_requested=None):
+        """
+        :param obj: the Outlier object
+        :param endpoint_id: id of the endpoint of the request. If None, it is looked up when needed.
+        :param time_requested: time of the request. If None, it is looked up when needed.
+        """
         raise NotImplementedError()
 
     def get_outliers_sorted(self, endpoint_id, offset, per_page):
@@ -274,15 +367,45 @@ class VersionQueryBase(QueryBaseObject, ABC):
         raise NotImplementedError()
 
     @staticmethod
-    def get_2d_version_data_filter(endpoint_id):
+    def get_2d_version_data_filter(endpoint_id, column=None, values=None, versions=None):
+        """
+        :param endpoint_id: only the requests of this endpoint are selected
+        :param column: column of the values
+        :param values: if not None, only the requests with one of these values in `column` are
+        selected
+        :param versions: if not None, only the requests with one of these versions are selected
+        """
         raise NotImplementedError()
 
     def get_first_requests(self, endpoint_id, limit=None):
         raise NotImplementedError()
 
+    def get_hits_per_endpoint_and_version(self, versions):
+        """
+        :param versions: list of versions
+        :return: a list of (endpoint name, version, hits) tuples of all requests with one of the
+        versions
+        """
+        raise NotImplementedError()
+
 
 class StackLineQueryBase(QueryBaseObject, ABC):
-    def create_stack_line(self, stack_line):
+    def create_stack_line(self, stack_line, endpoint_id=None, time_requested=None):
+        """
+        :param stack_line: the StackLine object
+        :param endpoint_id: id of the endpoint of the request. If None, it is looked up when needed.
+        :param time_requested: time of the request. If None, it is looked up when needed.
+        """
+        raise NotImplementedError()
+
+    def bulk_create(self, stack_lines, endpoint_id=None, time_requested=None):
+        """
+        :param stack_lines: list of StackLine objects
+        :param endpoint_id: id of the endpoint of the request of all stack lines. If None, it is
+        looked up when needed.
+        :param time_requested: time of the request of all stack lines. If None, it is looked up
+        when needed.
+        """
         raise NotImplementedError()
 
     def get_profiled_requests(self, endpoint_id, offset, per_page):
@@ -296,9 +419,40 @@ class StackLineQueryBase(QueryBaseObject, ABC):
 
 
 class RequestQueryBase(QueryBaseObject, ABC):
+    def bulk_create(self, requests):
+        raise NotImplementedError()
+
     def get_latencies_sample(self, endpoint_id, criterion, sample_size):
+        """
+        :return: a uniform random sample (without replacement) of the durations of the requests
+        of an endpoint that satisfy the criterion. All durations are returned if there are at
+        most `sample_size` of them.
+        """
         raise NotImplementedError()
 
+    def get_latencies_samples(self, criterion, sample_size):
+        """
+        Same as get_latencies_sample, but for all endpoints at once.
+        :return: a dict that maps the endpoint_id to its sample
+        """
+        raise NotImplementedError()
+
+    @staticmethod
+    def reservoir_sample(values, sample_size):
+        """
+        Draws a uniform random sample from an iterable in a single pass, keeping only
+        `sample_size` values in memory (Algorithm R).
+        """
+        sample = []
+        for index, value in enumerate(values):
+            if index < sample_size:
+                sample.append(value)
+            else:
+                position = random.randint(0, index)
+                if position < sample_size:
+                    sample[position] = value
+        return sample
+
     def get_error_requests_db(self, endpoint_id, criterion):
         raise NotImplementedError()
 
@@ -316,6 +470,12 @@ class RequestQueryBase(QueryBaseObject, ABC):
     def get_status_code_frequencies(self, endpoint_id, *criterion):
         raise NotImplementedError()
 
+    def get_status_code_frequencies_per_endpoint(self, *criterion):
+        """
+        :return: a list of (endpoint_id, status_code, count) tuples
+        """
+        raise NotImplementedError()
+
     def get_date_of_first_request(self):
         raise NotImplementedError()
 
@@ -323,3 +483,21 @@ class RequestQueryBase(QueryBaseObject, ABC):
         raise NotImplementedError()
 
 
+class RollupQueryBase(QueryBaseObject, ABC):
+    def update_rollups(self, rollups):
+        raise NotImplementedError()
+
+    def get_rollup_totals(self, ranges):
+        raise NotImplementedError()
+
+    def get_rollup_buckets(self, granularity, start, end, endpoint_id=None):
+        raise NotImplementedError()
+
+    def get_rollup_sketches(self, ranges, endpoint_id=None):
+        raise NotImplementedError()
+
+    def get_requests_for_rollup(self, after, limit):
+        raise NotImplementedError()
+
+    def delete_rollups(self):
+        raise NotImplementedError()
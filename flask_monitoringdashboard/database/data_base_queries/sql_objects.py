@@ -1,19 +1,24 @@
 import time
 import datetime
+import json
 import random
+import sqlite3
+from collections import defaultdict
 from contextlib import contextmanager
 from werkzeug.security import generate_password_hash, check_password_hash
+from flask_monitoringdashboard.core.sketch import DDSketch
 from flask_monitoringdashboard.core.timezone import to_local_datetime
 from flask_monitoringdashboard import config
 from flask_monitoringdashboard.database.data_base_queries.query_base_object import \
     CodeLineQueriesBase, CountQueriesBase, UserQueriesBase, QueryBaseObject, \
     CustomGraphQueryBase, EndpointQueryBase, OutlierQueryBase, VersionQueryBase, \
-    StackLineQueryBase, RequestQueryBase, DatabaseConnectionBase
+    StackLineQueryBase, RequestQueryBase, RollupQueryBase, DatabaseConnectionBase
 from flask_monitoringdashboard.core.logger import log
 
 from sqlalchemy import (
     Boolean,
     Column,
+    Date,
     Integer,
     String,
     DateTime,
@@ -21,20 +26,47 @@ from sqlalchemy import (
     Float,
     TEXT,
     ForeignKey,
+    Index,
+    inspect,
     exc,
     func,
     distinct,
     desc,
-    and_
+    and_,
+    or_,
+    case,
+    cast,
+    literal_column,
+    tablesample,
+    text,
 )
 
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship, scoped_session, joinedload
 from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.util import ClauseAdapter
 
 
 Base = declarative_base()
 
+# Id-range sampling is used if at least this fraction of the ids in the range matches the criterion
+MIN_SAMPLE_DENSITY = 0.05
+SAMPLE_ROUNDS = 3
+SAMPLE_CHUNK_SIZE = 500
+# functions for ordering rows randomly, per dialect
+RANDOM_FUNCTIONS = {
+    'sqlite': func.random,
+    'postgresql': func.random,
+    'mysql': func.rand,
+    'mssql': func.newid,
+}
+
+
+def _index(table_name, *columns, **kwargs):
+    """ :return: an Index on the given columns, with a name that is unique within the database """
+    return Index('ix_{}_{}'.format(table_name, '_'.join(columns)), *columns, **kwargs)
+
 
 class User(Base):
     """Table for storing user management."""
@@ -86,6 +118,13 @@ class Request(Base):
     """Table for storing measurements of requests."""
 
     __tablename__ = '{}Request'.format(config.table_prefix)
+    __table_args__ = (
+        _index(__tablename__, 'endpoint_id', 'time_requested'),
+        _index(__tablename__, 'time_requested'),
+        _index(__tablename__, 'version_requested', 'endpoint_id'),
+        _index(__tablename__, 'endpoint_id', 'group_by'),
+        _index(__tablename__, 'status_code', 'time_requested'),
+    )
 
     id = Column(Integer, primary_key=True)
 
@@ -118,6 +157,9 @@ class Outlier(Base):
     """Table for storing information about outliers."""
 
     __tablename__ = '{}Outlier'.format(config.table_prefix)
+    __table_args__ = (
+        _index(__tablename__, 'request_id'),
+    )
 
     id = Column(Integer, primary_key=True)
 
@@ -150,6 +192,9 @@ class CodeLine(Base):
     identifies a line in the code."""
 
     __tablename__ = '{}CodeLine'.format(config.table_prefix)
+    __table_args__ = (
+        _index(__tablename__, 'filename', 'line_number', 'function_name', 'code', unique=True),
+    )
 
     id = Column(Integer, primary_key=True)
 
@@ -170,6 +215,9 @@ class StackLine(Base):
     """Table for storing lines of execution paths of calls."""
 
     __tablename__ = '{}StackLine'.format(config.table_prefix)
+    __table_args__ = (
+        _index(__tablename__, 'code_id'),
+    )
 
     request_id = Column(Integer, ForeignKey(Request.id), primary_key=True)
     request = relationship(Request, backref="stack_lines")
@@ -210,6 +258,9 @@ class CustomGraphData(Base):
     """Table for storing data collected by custom graphs."""
 
     __tablename__ = '{}CustomGraphData'.format(config.table_prefix)
+    __table_args__ = (
+        _index(__tablename__, 'graph_id', 'time'),
+    )
 
     id = Column(Integer, primary_key=True)
 
@@ -224,7 +275,51 @@ class CustomGraphData(Base):
     """Actual value that is measured."""
 
 
+class RequestRollup(Base):
+    """Table for storing pre-aggregated measurements of requests. Every row contains the
+    aggregates of all requests of an endpoint and version within a time bucket."""
+
+    __tablename__ = '{}RequestRollup'.format(config.table_prefix)
+    __table_args__ = (
+        _index(__tablename__, 'granularity', 'bucket'),
+    )
+
+    endpoint_id = Column(Integer, ForeignKey(Endpoint.id), primary_key=True)
+    """The endpoint that handled the requests."""
+
+    version_requested = Column(String(100), primary_key=True)
+    """Version when the requests were handled."""
+
+    granularity = Column(Integer, primary_key=True)
+    """Length of the time bucket in seconds: 60, 3600 or 86400."""
+
+    bucket = Column(DateTime, primary_key=True)
+    """Start of the time bucket (UTC)."""
+
+    count = Column(Integer, nullable=False, default=0)
+    """Number of requests."""
+
+    error_count = Column(Integer, nullable=False, default=0)
+    """Number of requests with a 4xx or 5xx status code."""
+
+    duration_sum = Column(Float, nullable=False, default=0)
+    """Sum of the processing time of the requests in milliseconds."""
+
+    duration_min = Column(Float)
+    """Smallest processing time in milliseconds."""
+
+    duration_max = Column(Float)
+    """Largest processing time in milliseconds."""
+
+    sketch = Column(TEXT)
+    """Quantile sketch of the processing times, serialized as JSON."""
+
+
 class SqlDatabaseConnection(DatabaseConnectionBase):
+    def __init__(self):
+        super().__init__()
+        self.engine = None
+
     @property
     def user_queries(self):
         return UserQueries
@@ -261,6 +356,10 @@ class SqlDatabaseConnection(DatabaseConnectionBase):
     def version_query(self):
         return VersionQuery
 
+    @property
+    def rollup_query(self):
+        return RollupQuery
+
     @property
     def user(self):
         return User
@@ -293,9 +392,14 @@ class SqlDatabaseConnection(DatabaseConnectionBase):
     def custom_graph_data(self):
         return CustomGraphData
 
+    @property
+    def request_rollup(self):
+        return RequestRollup
+
     @staticmethod
     def get_tables():
-        return [User, Endpoint, Request, Outlier, StackLine, CodeLine, CustomGraph, CustomGraphData]
+        return [User, Endpoint, Request, Outlier, StackLine, CodeLine, CustomGraph, CustomGraphData,
+                RequestRollup]
 
     def init_database(self):
         pass
@@ -305,8 +409,63 @@ class SqlDatabaseConnection(DatabaseConnectionBase):
         engine = create_engine(config.database_name)
         Base.metadata.create_all(engine)
         Base.metadata.bind = engine
+        self.engine = engine
         self.db_connection = sessionmaker(bind=engine)
 
+    def get_pool_stats(self):
+        if self.engine is None:
+            return {}
+        pool = self.engine.pool
+        if not isinstance(pool, QueuePool):
+            # other pools, e.g. the NullPool of SQLite, don't keep statistics
+            return {}
+        return dict(
+            max_size=pool.size(),
+            in_use=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=pool.overflow(),
+        )
+
+    def get_missing_indexes(self):
+        inspector = inspect(self.engine)
+        existing = set()
+        for table_name in inspector.get_table_names():
+            existing.update(
+                (table_name, index['name']) for index in inspector.get_indexes(table_name))
+        return [
+            (table.name, index.name)
+            for table in Base.metadata.sorted_tables
+            for index in sorted(table.indexes, key=lambda i: i.name)
+            if (table.name, index.name) not in existing
+        ]
+
+    def create_indexes(self):
+        """
+        Creates the missing indexes one by one. PostgreSQL builds them concurrently and MySQL
+        (InnoDB) builds them online, such that the application can keep writing requests. SQLite
+        locks the database while an index is being built.
+        """
+        indexes = {(table.name, index.name): index for table in Base.metadata.sorted_tables
+                   for index in table.indexes}
+        result = []
+        for key in self.get_missing_indexes():
+            index = indexes[key]
+            try:
+                if self.engine.dialect.name == 'postgresql':
+                    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+                    index.dialect_options['postgresql']['concurrently'] = True
+                    try:
+                        with self.engine.connect() as connection:
+                            index.create(connection.execution_options(isolation_level='AUTOCOMMIT'))
+                    finally:
+                        index.dialect_options['postgresql']['concurrently'] = False
+                else:
+                    index.create(self.engine)
+                result.append(key + (None,))
+            except exc.SQLAlchemyError as error:
+                result.append(key + (error,))
+        return result
+
     @contextmanager
     def session_scope(self):
         """When accessing the database, use the following syntax:
@@ -357,6 +516,9 @@ class CommonRouting(QueryBaseObject):
     def commit(self):
         self.session.commit()
 
+    def flush(self):
+        self.session.flush()
+
     def finalize_update(self, obj):
         # Update is done when session.commit is called
         pass
@@ -419,9 +581,57 @@ class CodeLineQueries(CommonRouting, CodeLineQueriesBase):
         )
         if not result:
             result = CodeLine(filename=fn, line_number=ln, function_name=name, code=code)
-            self.session.add(result)
-            self.session.flush()
+            try:
+                with self.session.begin_nested():
+                    self.session.add(result)
+            except exc.IntegrityError:
+                # another process inserted the same code line concurrently
+                return self.get_code_line(fn, ln, name, code)
+
+        return result
 
+    def get_code_lines(self, code_lines):
+        code_lines = set(code_lines)
+        result = self._find_code_lines(code_lines)
+        missing = [code_line for code_line in code_lines if code_line not in result]
+        if missing:
+            try:
+                with self.session.begin_nested():
+                    self.session.bulk_insert_mappings(CodeLine, [
+                        dict(filename=fn, line_number=ln, function_name=name, code=code)
+                        for fn, ln, name, code in missing
+                    ])
+            except exc.IntegrityError:
+                pass  # another process inserted some of them concurrently, they are found below
+            result.update(self._find_code_lines(missing))
+        for code_line in code_lines:
+            if code_line not in result:
+                # e.g. the database truncated the values, so they can't be matched anymore
+                result[code_line] = self.get_code_line(*code_line)
+        return result
+
+    def get_latest_code_lines(self, limit):
+        result = self.session.query(CodeLine).order_by(desc(CodeLine.id)).limit(limit).all()
+        self.session.expunge_all()
+        return result
+
+    def _find_code_lines(self, code_lines):
+        """
+        Finds the existing CodeLines with a single query. The query selects a superset of the
+        requested rows, which is filtered on the exact quadruple afterwards.
+        """
+        code_lines = set(code_lines)
+        if not code_lines:
+            return {}
+        rows = self.session.query(CodeLine).filter(
+            CodeLine.filename.in_({code_line[0] for code_line in code_lines}),
+            CodeLine.line_number.in_({code_line[1] for code_line in code_lines}),
+        ).all()
+        result = {}
+        for row in rows:
+            key = (row.filename, row.line_number, row.function_name, row.code)
+            if key in code_lines:
+                result[key] = row
         return result
 
 
@@ -459,6 +669,64 @@ class CountQueries(CommonRouting, CountQueriesBase):
             .all()
         )
 
+    def count_request_hits_per_endpoint(self, today, week_ago):
+        is_error = and_(Request.status_code >= 400, Request.status_code < 600)
+        is_today = Request.time_requested >= today
+        is_week = Request.time_requested >= week_ago
+
+        def count_if(*criterion):
+            return func.sum(case([(and_(*criterion), 1)], else_=0))
+
+        return (
+            self.session.query(
+                Request.endpoint_id,
+                count_if(is_today),
+                count_if(is_today, is_error),
+                count_if(is_week),
+                count_if(is_week, is_error),
+                func.count(Request.id),
+            )
+            .group_by(Request.endpoint_id)
+            .all()
+        )
+
+    def count_request_per_endpoint_per_day(self, start, end, utc_offset):
+        day = self._local_day(Request.time_requested, utc_offset)
+        if day is None:
+            result = []
+            while start < end:
+                result.extend(
+                    (to_local_datetime(start).date(), endpoint_id, hits) for endpoint_id, hits in
+                    self.count_request_per_endpoint(
+                        *self.generate_time_query(start, start + datetime.timedelta(days=1))))
+                start += datetime.timedelta(days=1)
+            return result
+        t = (
+            self.session.query(day.label('day'), Request.endpoint_id.label('endpoint_id'))
+                .filter(Request.time_requested >= start, Request.time_requested < end)
+                .subquery('t')
+        )
+        return (
+            self.session.query(t.c.day, t.c.endpoint_id, func.count())
+                .group_by(t.c.day, t.c.endpoint_id)
+                .all()
+        )
+
+    def _local_day(self, column, utc_offset):
+        """ :return: an expression for the local day of a (UTC) datetime column, or None if the
+        dialect is not supported """
+        utc_offset = int(utc_offset)
+        dialect = self.session.get_bind().dialect.name
+        if dialect == 'sqlite':
+            return func.date(column, '{:+d} seconds'.format(utc_offset))
+        if dialect == 'postgresql':
+            return cast(column + datetime.timedelta(seconds=utc_offset), Date)
+        if dialect == 'mysql':
+            return func.date(func.timestampadd(literal_column('SECOND'), utc_offset, column))
+        if dialect == 'mssql':
+            return cast(func.dateadd(literal_column('second'), utc_offset, column), Date)
+        return None
+
     @staticmethod
     def generate_time_query(dt_begin, dt_end):
         return [Request.time_requested >= dt_begin, Request.time_requested < dt_end]
@@ -472,6 +740,71 @@ class CountQueries(CommonRouting, CountQueriesBase):
         )
         return [((g, v), t) for g, v, t in result]
 
+    def get_percentile_grouped(self, column, q, *where):
+        return self._get_percentiles(q, [column], where)
+
+    def get_two_columns_percentile_grouped(self, column, q, *where):
+        return [((g, v), value) for g, v, value in
+                self._get_percentiles(q, [column, Request.version_requested], where)]
+
+    def _get_percentiles(self, q, columns, where):
+        """
+        :return: a list of rows with the values of the columns, followed by the percentile
+        """
+        dialect = self.session.get_bind().dialect
+        if dialect.name == 'postgresql':
+            return (
+                self.session.query(*columns, func.percentile_cont(q).within_group(Request.duration))
+                    .filter(*where)
+                    .group_by(*columns)
+                    .all()
+            )
+        if self._supports_window_functions(dialect):
+            return self._get_percentiles_window(q, columns, where)
+        rows = (
+            self.session.query(*columns, Request.duration)
+                .filter(*where)
+                .order_by(*columns)
+                .yield_per(10000)
+        )
+        return [key + (value,) for key, value in
+                self.stream_percentiles(((tuple(row[:-1]), row[-1]) for row in rows), q)]
+
+    def _get_percentiles_window(self, q, columns, where):
+        """
+        Computes percentile_cont with window functions: the rows are ranked per group, and only
+        the (at most) two rows around the requested position are returned, which are interpolated
+        in the same way as numpy.percentile.
+        """
+        ranked = self.session.query(
+            *[column.label('key{}'.format(i)) for i, column in enumerate(columns)],
+            Request.duration.label('duration'),
+            func.row_number().over(partition_by=columns, order_by=Request.duration).label('rn'),
+            func.count().over(partition_by=columns).label('cnt'),
+        )
+        t = ranked.filter(*where).subquery('t')
+        keys = [t.c['key{}'.format(i)] for i in range(len(columns))]
+        position = (t.c.cnt - 1) * q  # 0-based position of the percentile
+        index = t.c.rn - 1
+        fraction = func.max(position) - func.min(index)
+        interpolated = self.session.query(
+            *keys,
+            # a weighted sum, such that the median of two values equals their mean exactly
+            func.min(t.c.duration) * (1 - fraction) + func.max(t.c.duration) * fraction,
+        )
+        criterion = or_(and_(index <= position, position < t.c.rn),
+                        and_(index >= position, index < position + 1))
+        return interpolated.filter(criterion).group_by(*keys).all()
+
+    @staticmethod
+    def _supports_window_functions(dialect):
+        if dialect.name == 'sqlite':
+            return sqlite3.sqlite_version_info >= (3, 25)
+        if dialect.name == 'mysql':
+            version = dialect.server_version_info or (0,)
+            return version >= ((10, 2) if getattr(dialect, '_is_mariadb', False) else (8, 0))
+        return True
+
 
 class CustomGraphQuery(CommonRouting, CustomGraphQueryBase):
     def find_or_create_graph(self, name):
@@ -503,15 +836,37 @@ class CustomGraphQuery(CommonRouting, CustomGraphQueryBase):
 
 
 class EndpointQuery(CommonRouting, EndpointQueryBase):
-    def get_num_requests(self, endpoint_id, start_date, end_date):
-        query = self.session.query(Request.time_requested)
+    def get_num_requests_per_hour(self, endpoint_id, start_date, end_date, utc_offset):
+        criterion = [Request.time_requested >= start_date, Request.time_requested <= end_date]
         if endpoint_id:
-            query = query.filter(Request.endpoint_id == endpoint_id)
-        result = query.filter(
-            Request.time_requested >= start_date, Request.time_requested <= end_date
-        ).all()
-
-        return [r[0] for r in result]
+            criterion.append(Request.endpoint_id == endpoint_id)
+        hour = self._local_hour(Request.time_requested, utc_offset)
+        if hour is None:
+            hours = defaultdict(int)
+            offset = datetime.timedelta(seconds=utc_offset)
+            rows = self.session.query(Request.time_requested).filter(*criterion).yield_per(10000)
+            for time_requested, in rows:
+                hours[(time_requested + offset).strftime('%Y-%m-%d %H')] += 1
+            return list(hours.items())
+        t = self.session.query(hour.label('hour')).filter(*criterion).subquery('t')
+        return self.session.query(t.c.hour, func.count()).group_by(t.c.hour).all()
+
+    def _local_hour(self, column, utc_offset):
+        """ :return: an expression that formats the local time of a (UTC) datetime column as
+        'YYYY-MM-DD HH', or None if the dialect is not supported """
+        utc_offset = int(utc_offset)
+        dialect = self.session.get_bind().dialect.name
+        if dialect == 'sqlite':
+            return func.strftime('%Y-%m-%d %H', column, '{:+d} seconds'.format(utc_offset))
+        if dialect == 'postgresql':
+            return func.to_char(column + datetime.timedelta(seconds=utc_offset), 'YYYY-MM-DD HH24')
+        if dialect == 'mysql':
+            return func.date_format(func.timestampadd(literal_column('SECOND'), utc_offset, column),
+                                    '%Y-%m-%d %H')
+        if dialect == 'mssql':
+            return func.convert(literal_column('VARCHAR(13)'),
+                                func.dateadd(literal_column('second'), utc_offset, column), 120)
+        return None
 
     def get_statistics(self, endpoint_id, field_name, limit):
         query = (
@@ -600,7 +955,7 @@ class EndpointQuery(CommonRouting, EndpointQueryBase):
 
 
 class OutlierQuery(CommonRouting, OutlierQueryBase):
-    def create_outlier_record(self, outlier):
+    def create_outlier_record(self, outlier, endpoint_id=None, time_requested=None):
         self.session.add(outlier)
 
     def get_outliers_sorted(self, endpoint_id, offset, per_page):
@@ -646,8 +1001,13 @@ class VersionQuery(CommonRouting, VersionQueryBase):
         return query.all()
 
     @staticmethod
-    def get_2d_version_data_filter(endpoint_id):
-        return Request.endpoint_id == endpoint_id
+    def get_2d_version_data_filter(endpoint_id, column=None, values=None, versions=None):
+        criterion = [Request.endpoint_id == endpoint_id]
+        if values is not None:
+            criterion.append(column.in_(values))
+        if versions is not None:
+            criterion.append(Request.version_requested.in_(versions))
+        return and_(*criterion)
 
     def get_first_requests(self, endpoint_id, limit=None):
         query = (
@@ -662,11 +1022,23 @@ class VersionQuery(CommonRouting, VersionQueryBase):
             query = query.limit(limit)
         return query.all()
 
+    def get_hits_per_endpoint_and_version(self, versions):
+        return (
+            self.session.query(Endpoint.name, Request.version_requested, func.count(Request.id))
+                .join(Request.endpoint)
+                .filter(Request.version_requested.in_(versions))
+                .group_by(Endpoint.name, Request.version_requested)
+                .all()
+        )
+
 
 class StackLineQuery(CommonRouting, StackLineQueryBase):
-    def create_stack_line(self, new_stack_line):
+    def create_stack_line(self, new_stack_line, endpoint_id=None, time_requested=None):
         self.session.add(new_stack_line)
 
+    def bulk_create(self, stack_lines, endpoint_id=None, time_requested=None):
+        self.session.bulk_save_objects(stack_lines)
+
     def get_profiled_requests(self, endpoint_id, offset, per_page):
         result = (
             self.session.query(Request)
@@ -708,21 +1080,133 @@ class StackLineQuery(CommonRouting, StackLineQueryBase):
 
 
 class RequestQuery(CommonRouting, RequestQueryBase):
+    def bulk_create(self, requests):
+        # The ids are not fetched, such that all rows are inserted with a single executemany
+        self.session.bulk_save_objects(requests)
+
     def get_latencies_sample(self, endpoint_id, criterion, sample_size):
-        query = (
-            self.session.query(Request.duration).filter(Request.endpoint_id == endpoint_id, *criterion)
+        criterion = [Request.endpoint_id == endpoint_id, *criterion]
+        # reads at most sample_size + 1 rows, instead of counting all requests that match
+        durations = [duration for duration, in
+                     self.session.query(Request.duration).filter(*criterion).limit(sample_size + 1)]
+        if len(durations) <= sample_size:
+            return durations
+        return self._get_latencies_large_sample(criterion, sample_size)
+
+    def get_latencies_samples(self, criterion, sample_size):
+        counts = (
+            self.session.query(Request.endpoint_id, func.count(Request.id))
+                .filter(*criterion)
+                .group_by(Request.endpoint_id)
+                .all()
         )
-        # return random rows: See https://stackoverflow.com/a/60815
-        dialect = self.session.bind.dialect.name
-
-        if dialect == 'sqlite':
-            query = query.order_by(func.random())
-        elif dialect == 'mysql':
-            query = query.order_by(func.rand())
+        small = [endpoint_id for endpoint_id, count in counts if count <= sample_size]
+        samples = defaultdict(list)
+        for i in range(0, len(small), SAMPLE_CHUNK_SIZE):
+            rows = self.session.query(Request.endpoint_id, Request.duration).filter(
+                Request.endpoint_id.in_(small[i:i + SAMPLE_CHUNK_SIZE]), *criterion)
+            for endpoint_id, duration in rows:
+                samples[endpoint_id].append(duration)
+        for endpoint_id, count in counts:
+            if count > sample_size:
+                samples[endpoint_id] = self._get_latencies_large_sample(
+                    [Request.endpoint_id == endpoint_id, *criterion], sample_size)
+        return dict(samples)
+
+    def _get_latencies_large_sample(self, criterion, sample_size):
+        """
+        :return: a sample of the durations of the requests that satisfy the criterion, if more
+        than `sample_size` requests satisfy it.
+        """
+        sample = None
+        if self.session.get_bind().dialect.name == 'postgresql':
+            sample = self._get_latencies_tablesample(criterion, sample_size)
+        else:
+            min_id, max_id = (
+                self.session.query(func.min(Request.id), func.max(Request.id))
+                    .filter(*criterion)
+                    .one()
+            )
+            if min_id is not None:
+                sample = self._get_latencies_id_range(criterion, sample_size, min_id, max_id)
+        if sample is None:
+            return self._get_latencies_random_order(criterion, sample_size)
+        return sample
 
-        query = query.limit(sample_size)
+    def _get_latencies_random_order(self, criterion, sample_size):
+        """
+        Used if the ids of the matching requests are too sparse for id-range sampling. The rows
+        are shuffled by the database, such that only the sample is sent to Python.
+        """
+        random_order = RANDOM_FUNCTIONS.get(self.session.get_bind().dialect.name)
+        query = self.session.query(Request.duration).filter(*criterion)
+        if random_order is None:
+            rows = query.yield_per(10000)
+            return self.reservoir_sample((duration for duration, in rows), sample_size)
+        return [duration for duration, in query.order_by(random_order()).limit(sample_size)]
+
+    def _get_latencies_tablesample(self, criterion, sample_size):
+        """
+        Samples the table with TABLESAMPLE SYSTEM, which only reads the sampled pages. Every row
+        has the same probability to be in the sample. The percentage starts at twice the sample
+        size relative to the estimated number of rows in the table, and is doubled until enough
+        rows match the criterion.
+        :return: the sample
+        """
+        estimate = self.session.execute(
+            text('SELECT max(reltuples) FROM pg_class WHERE relname = :name'),
+            {'name': Request.__tablename__},
+        ).scalar()
+        percentage = 100.0
+        if estimate and estimate > 0:
+            percentage = min(100.0, 200.0 * sample_size / estimate)
+        while True:
+            sampled = tablesample(Request.__table__, func.system(percentage))
+            adapter = ClauseAdapter(sampled)
+            rows = (
+                self.session.query(sampled.c.duration)
+                    .filter(*[adapter.traverse(c) for c in criterion])
+                    .all()
+            )
+            if len(rows) >= sample_size:
+                return [duration for duration, in random.sample(rows, sample_size)]
+            if percentage >= 100.0:
+                return [duration for duration, in rows]
+            percentage = min(100.0, 2 * percentage)
 
-        return [item.duration for item in query.all()]
+    def _get_latencies_id_range(self, criterion, sample_size, min_id, max_id):
+        """
+        Draws random ids between min_id and max_id (without replacement), and keeps the ids of
+        the requests that satisfy the criterion. Every matching request has the same probability
+        to be drawn. The number of ids is proportional to the sample size, divided by the
+        fraction of the ids that matched so far.
+        :return: the sample, or None if too many ids didn't match
+        """
+        span = max_id - min_id + 1
+        tried = set()
+        durations = []
+        density = 1.0
+        for _ in range(SAMPLE_ROUNDS):
+            needed = sample_size - len(durations)
+            if needed <= 0 or len(tried) >= span:
+                break
+            number = min(span - len(tried), int(1.2 * needed / density) + 1)
+            ids = []
+            while len(ids) < number:
+                candidate = random.randint(min_id, max_id)
+                if candidate not in tried:
+                    tried.add(candidate)
+                    ids.append(candidate)
+            for i in range(0, len(ids), SAMPLE_CHUNK_SIZE):
+                rows = self.session.query(Request.duration).filter(
+                    Request.id.in_(ids[i:i + SAMPLE_CHUNK_SIZE]), *criterion)
+                durations.extend(duration for duration, in rows)
+            density = len(durations) / len(tried)
+            if density < MIN_SAMPLE_DENSITY:
+                return None
+        if len(durations) < sample_size:
+            return None
+        return random.sample(durations, sample_size)
 
     def get_error_requests_db(self, endpoint_id, criterion):
         criteria = and_(
@@ -755,6 +1239,13 @@ class RequestQuery(CommonRouting, RequestQueryBase):
             .group_by(Request.status_code).all()
         return dict(status_code_counts)
 
+    def get_status_code_frequencies_per_endpoint(self, *criterion):
+        status_code_counts = self.session.query(
+            Request.endpoint_id, Request.status_code, func.count(Request.status_code))
+        return status_code_counts \
+            .filter(Request.status_code.isnot(None), *criterion) \
+            .group_by(Request.endpoint_id, Request.status_code).all()
+
     def get_date_of_first_request(self):
         result = self.session.query(Request.time_requested).order_by(Request.time_requested).first()
         return result[0] if result else None
@@ -767,3 +1258,109 @@ class RequestQuery(CommonRouting, RequestQueryBase):
                 .first()
         )
         return result[0] if result else None
+
+
+class RollupQuery(CommonRouting, RollupQueryBase):
+    def update_rollups(self, rollups):
+        if not rollups:
+            return
+        try:
+            with self.session.begin_nested():
+                self._update_rollups(rollups)
+        except exc.IntegrityError:
+            # another process created one of the rollups concurrently, it exists now
+            with self.session.begin_nested():
+                self._update_rollups(rollups)
+
+    def _update_rollups(self, rollups):
+        # The sketch can't be merged by the database, so all affected rows are fetched and locked
+        # with a single query (SELECT ... FOR UPDATE, which is a no-op on SQLite: there writes are
+        # serialized). The filter selects a superset, the exact rows are matched below.
+        rows = self.session.query(RequestRollup).filter(
+            RequestRollup.endpoint_id.in_({rollup['endpoint_id'] for rollup in rollups}),
+            RequestRollup.version_requested.in_(
+                {rollup['version_requested'] for rollup in rollups}),
+            RequestRollup.granularity.in_({rollup['granularity'] for rollup in rollups}),
+            RequestRollup.bucket.in_({rollup['bucket'] for rollup in rollups}),
+        ).with_for_update().all()
+        existing = {
+            (row.endpoint_id, row.version_requested, row.granularity, row.bucket): row
+            for row in rows
+        }
+        for rollup in rollups:
+            row = existing.get((rollup['endpoint_id'], rollup['version_requested'],
+                                rollup['granularity'], rollup['bucket']))
+            if row is None:
+                values = dict(rollup, sketch=json.dumps(rollup['sketch'].to_dict()))
+                self.session.add(RequestRollup(**values))
+                continue
+            row.count += rollup['count']
+            row.error_count += rollup['error_count']
+            row.duration_sum += rollup['duration_sum']
+            row.duration_min = min(row.duration_min, rollup['duration_min'])
+            row.duration_max = max(row.duration_max, rollup['duration_max'])
+            sketch = rollup['sketch']
+            if row.sketch:
+                sketch = DDSketch.from_dict(json.loads(row.sketch)).merge(sketch)
+            row.sketch = json.dumps(sketch.to_dict())
+        self.session.flush()
+
+    def get_rollup_totals(self, ranges):
+        totals = self.session.query(
+            RequestRollup.endpoint_id,
+            func.sum(RequestRollup.count),
+            func.sum(RequestRollup.error_count),
+            func.sum(RequestRollup.duration_sum),
+            func.min(RequestRollup.duration_min),
+            func.max(RequestRollup.duration_max),
+        )
+        criterion = or_(*[self._range_criterion(*time_range) for time_range in ranges])
+        return totals.filter(criterion).group_by(RequestRollup.endpoint_id).all()
+
+    def get_rollup_buckets(self, granularity, start, end, endpoint_id=None):
+        criterion = [self._range_criterion(granularity, start, end)]
+        if endpoint_id is not None:
+            criterion.append(RequestRollup.endpoint_id == endpoint_id)
+        return (
+            self.session.query(RequestRollup.endpoint_id, RequestRollup.bucket,
+                               func.sum(RequestRollup.count))
+                .filter(*criterion)
+                .group_by(RequestRollup.endpoint_id, RequestRollup.bucket)
+                .all()
+        )
+
+    def get_rollup_sketches(self, ranges, endpoint_id=None):
+        criterion = [or_(*[self._range_criterion(*time_range) for time_range in ranges]),
+                     RequestRollup.sketch.isnot(None)]
+        if endpoint_id is not None:
+            criterion.append(RequestRollup.endpoint_id == endpoint_id)
+        rows = (
+            self.session.query(RequestRollup.endpoint_id, RequestRollup.version_requested,
+                               RequestRollup.sketch)
+                .filter(*criterion)
+                .all()
+        )
+        return [(row[0], row[1], DDSketch.from_dict(json.loads(row[2]))) for row in rows]
+
+    def get_requests_for_rollup(self, after, limit):
+        rows = self.session.query(
+            Request.id,
+            Request.endpoint_id,
+            Request.version_requested,
+            Request.time_requested,
+            Request.duration,
+            Request.status_code,
+        ).filter(Request.id > (after or 0)).order_by(Request.id).limit(limit).all()
+        return rows[-1][0] if rows else after, [tuple(row[1:]) for row in rows]
+
+    def delete_rollups(self):
+        self.session.query(RequestRollup).delete()
+
+    @staticmethod
+    def _range_criterion(granularity, start, end):
+        criterion = [RequestRollup.granularity == granularity]
+        if start is not None:
+            criterion.append(RequestRollup.bucket >= start)
+        if end is not None:
+            criterion.append(RequestRollup.bucket < end)
+        return and_(*criterion)
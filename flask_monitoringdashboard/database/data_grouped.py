@@ -62,6 +62,21 @@ def get_endpoint_data_grouped(session, func, *where):
                             *where)
 
 
+def get_endpoint_percentile_grouped(session, q, *where):
+    """
+    Computes a percentile of the durations per endpoint. The computation is done by the database
+    if possible.
+    :param session: session for the database
+    :param q: percentile between 0 and 1, e.g. 0.5 for the median
+    :param where: additional where clause
+    :return: a list of (endpoint_id, percentile) tuples
+    """
+    database_connection = DatabaseConnectionWrapper().database_connection
+    column = database_connection.count_queries.get_field_name(
+        "endpoint_id", database_connection.request)
+    return database_connection.count_queries(session).get_percentile_grouped(column, q, *where)
+
+
 def get_version_data_grouped(session, func, *where):
     """
     :param session: session for the database
@@ -101,3 +116,16 @@ def get_two_columns_grouped(session, column, *where):
     return group_result(
         DatabaseConnectionWrapper().database_connection.count_queries(session).get_two_columns_grouped(column, *where),
         median)
+
+
+def get_two_columns_median_grouped(session, column, *where):
+    """
+    Computes the median duration per value of `column` and version. The computation is done by the
+    database if possible.
+    :param session: session for the database
+    :param column: column that is used for the grouping (together with the Request.version)
+    :param where: additional where clause
+    :return: a list of ((value, version), median) tuples
+    """
+    return DatabaseConnectionWrapper().database_connection.count_queries(
+        session).get_two_columns_percentile_grouped(column, 0.5, *where)
@@ -2,36 +2,24 @@
 Contains all functions that access an Endpoint object
 """
 import datetime
-from collections import defaultdict
+
+from flask_monitoringdashboard.core.timezone import get_utc_offset
 from flask_monitoringdashboard.database import DatabaseConnectionWrapper
 
 
-def get_num_requests(session, endpoint_id, start_date, end_date):
+def get_num_requests_per_hour(session, endpoint_id, start_date, end_date):
     """
-    Returns a list with all dates on which an endpoint is accessed.
+    Returns the number of hits per hour of an endpoint, grouped by the database.
     :param session: session for the database
     :param endpoint_id: if None, the result is the sum of all endpoints
-    :param start_date: datetime.date object
-    :param end_date: datetime.date object
-    :return list of dates
-    """
-    return group_request_times(
-        DatabaseConnectionWrapper().database_connection.endpoint_query(session).get_num_requests(endpoint_id,
-                                                                                                 start_date,
-                                                                                                 end_date))
-
-
-def group_request_times(datetimes):
-    """
-    Returns a list of tuples containing the number of hits per hour
-    :param datetimes: list of datetime objects
-    :return list of tuples ('%Y-%m-%d %H:00:00', count)
+    :param start_date: datetime object (UTC)
+    :param end_date: datetime object (UTC)
+    :return list of tuples (local datetime of the hour, count)
     """
-    hours_dict = defaultdict(int)
-    for dt in datetimes:
-        round_time = dt.strftime('%Y-%m-%d %H:00:00')
-        hours_dict[round_time] += 1
-    return hours_dict.items()
+    endpoint_query = DatabaseConnectionWrapper().database_connection.endpoint_query(session)
+    rows = endpoint_query.get_num_requests_per_hour(
+        endpoint_id, start_date, end_date, get_utc_offset().total_seconds())
+    return [(datetime.datetime.strptime(hour, '%Y-%m-%d %H'), count) for hour, count in rows]
 
 
 def get_users(endpoint_id, limit=None):
@@ -183,5 +171,5 @@ def filter_by_endpoint_id(endpoint_id):
 
 
 def filter_by_time(current_time, hits_criterion=None):
-    return DatabaseConnectionWrapper().database_connection.endpoint_query.filter_by_time(current_time,
-                                                                                         hits_criterion=hits_criterion)
+    endpoint_query = DatabaseConnectionWrapper().database_connection.endpoint_query
+    return endpoint_query.filter_by_time(current_time, hits_criterion=hits_criterion)
@@ -1,7 +1,8 @@
 from flask_monitoringdashboard.database import DatabaseConnectionWrapper
 
 
-def add_outlier(session, request_id, cpu_percent, memory, stacktrace, request):
+def add_outlier(session, request_id, cpu_percent, memory, stacktrace, request, endpoint_id=None,
+                time_requested=None):
     """
     Adds an Outlier object in the database.
     :param session: session for the database
@@ -10,6 +11,10 @@ def add_outlier(session, request_id, cpu_percent, memory, stacktrace, request):
     :param memory: memory load of the server when processing the request
     :param stacktrace: stack trace of the request
     :param request: triple containing the headers, environment and url
+    :param endpoint_id: id of the endpoint of the request. If specified, the database doesn't have
+    to look it up.
+    :param time_requested: time of the request. If specified, the database doesn't have to look it
+    up.
     """
     database_connection_wrapper = DatabaseConnectionWrapper()
     headers, environ, url = request
@@ -22,7 +27,9 @@ def add_outlier(session, request_id, cpu_percent, memory, stacktrace, request):
             cpu_percent=cpu_percent,
             memory=memory,
             stacktrace=stacktrace,
-        )
+        ),
+        endpoint_id,
+        time_requested,
     )
 
 
@@ -13,6 +13,19 @@ def get_latencies_sample(session, endpoint_id, criterion, sample_size=500):
         sample_size)
 
 
+def get_latencies_samples(session, criterion, sample_size=500):
+    """
+    Gets a random sample of the durations of every endpoint, using a few queries for all
+    endpoints together.
+    :param session: session for the database
+    :param criterion: criteria used to filter the requests
+    :param sample_size: maximum number of durations per endpoint
+    :return: A dict that maps the endpoint_id to a list with durations
+    """
+    request_query = DatabaseConnectionWrapper().database_connection.request_query(session)
+    return request_query.get_latencies_samples(criterion, sample_size)
+
+
 def get_error_requests_db(session, endpoint_id, *criterion):
     """
     Gets all requests that did not return a 200 status code.
@@ -38,6 +51,22 @@ def get_all_request_status_code_counts(session, endpoint_id):
         endpoint_id)
 
 
+def get_status_code_frequencies_per_endpoint(session, *criterion):
+    """
+    Gets the frequencies of each status code of every endpoint, using a single query.
+    :param session: session for the database
+    :param criterion: Optional criteria used to filter the requests.
+    :return: A dict that maps the endpoint_id to a dict with the frequency of every status code,
+    e.g. `{1: {200: 105, 404: 3}}`
+    """
+    frequencies = {}
+    request_query = DatabaseConnectionWrapper().database_connection.request_query(session)
+    rows = request_query.get_status_code_frequencies_per_endpoint(*criterion)
+    for endpoint_id, status_code, count in rows:
+        frequencies.setdefault(endpoint_id, {})[status_code] = count
+    return frequencies
+
+
 def get_status_code_frequencies(session, endpoint_id, *criterion):
     """
     Gets the frequencies of each status code.
@@ -55,7 +84,7 @@ def get_status_code_frequencies(session, endpoint_id, *criterion):
         *criterion)
 
 
-def add_request(session, duration, endpoint_id, ip, group_by, status_code):
+def add_request(session, duration, endpoint_id, ip, group_by, status_code, time_requested=None):
     """ Adds a request to the database. Returns the id.
     :param status_code:  status code of the request
     :param session: session for the database
@@ -63,6 +92,7 @@ def add_request(session, duration, endpoint_id, ip, group_by, status_code):
     :param endpoint_id: id of the endpoint
     :param ip: IP address of the requester
     :param group_by: a criteria by which the requests can be grouped
+    :param time_requested: moment when the request was handled. Defaults to the current time
     :return the id of the request after it was stored in the database
     """
     database_connection_wrapper = DatabaseConnectionWrapper()
@@ -73,12 +103,29 @@ def add_request(session, duration, endpoint_id, ip, group_by, status_code):
         group_by=group_by,
         status_code=status_code,
     )
+    if time_requested:
+        request.time_requested = time_requested
     request_query = database_connection_wrapper.database_connection.request_query(session)
     request_query.create_obj(request)
-    request_query.commit()
+    # the request is committed together with the rest of the session, only its id is needed here
+    request_query.flush()
     return request.id
 
 
+def add_requests(session, requests):
+    """ Adds multiple requests to the database in a single round trip.
+    :param session: session for the database
+    :param requests: list of dicts, each with the same keys as the arguments of add_request
+    """
+    if not requests:
+        return
+    database_connection_wrapper = DatabaseConnectionWrapper()
+    request_query = database_connection_wrapper.database_connection.request_query(session)
+    request_query.bulk_create([
+        database_connection_wrapper.database_connection.request(**values) for values in requests
+    ])
+
+
 def get_date_of_first_request(session):
     """ Returns the date (as unix timestamp) of the first request since FMD was deployed.
     :param session: session for the database
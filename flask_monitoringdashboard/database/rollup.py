@@ -0,0 +1,224 @@
+"""
+Contains all functions that access the RequestRollup objects.
+A rollup contains the aggregates (count, errors, sum, min and max of the duration, and a quantile
+sketch of the durations) of all requests of an endpoint and version within a time bucket. Buckets
+are kept at three granularities, such that the dashboard can answer most questions without
+scanning the Request table.
+"""
+import datetime
+
+from flask_monitoringdashboard import config
+from flask_monitoringdashboard.core.sketch import DDSketch
+from flask_monitoringdashboard.database import DatabaseConnectionWrapper
+
+MINUTE = 60
+HOUR = 60 * 60
+DAY = 24 * 60 * 60
+GRANULARITIES = (MINUTE, HOUR, DAY)
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def get_bucket(time, granularity):
+    """
+    :param time: datetime object (UTC)
+    :param granularity: length of the bucket in seconds
+    :return: the start of the bucket that contains the given time
+    """
+    seconds = (time - EPOCH) // datetime.timedelta(seconds=1)
+    return EPOCH + datetime.timedelta(seconds=seconds - seconds % granularity)
+
+
+def get_next_bucket(time, granularity):
+    """
+    :return: the start of the first bucket that starts at or after the given time
+    """
+    bucket = get_bucket(time, granularity)
+    if bucket < time:
+        return bucket + datetime.timedelta(seconds=granularity)
+    return bucket
+
+
+def is_error(status_code):
+    return status_code is not None and 400 <= status_code < 600
+
+
+def aggregate_requests(requests):
+    """
+    Aggregates requests into rollups, such that every rollup has to be written only once.
+    :param requests: iterable of (endpoint_id, version_requested, time_requested, duration,
+    status_code) tuples
+    :return: a list of dicts with the values of the RequestRollup rows
+    """
+    rollups = {}
+    for endpoint_id, version, time_requested, duration, status_code in requests:
+        error = 1 if is_error(status_code) else 0
+        for granularity in GRANULARITIES:
+            key = (endpoint_id, version, granularity, get_bucket(time_requested, granularity))
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollups[key] = dict(
+                    endpoint_id=endpoint_id,
+                    version_requested=version,
+                    granularity=granularity,
+                    bucket=key[3],
+                    count=1,
+                    error_count=error,
+                    duration_sum=duration,
+                    duration_min=duration,
+                    duration_max=duration,
+                    sketch=DDSketch(config.sketch_relative_accuracy),
+                )
+                rollups[key]['sketch'].add(duration)
+            else:
+                rollup['count'] += 1
+                rollup['error_count'] += error
+                rollup['duration_sum'] += duration
+                rollup['duration_min'] = min(rollup['duration_min'], duration)
+                rollup['duration_max'] = max(rollup['duration_max'], duration)
+                rollup['sketch'].add(duration)
+    return list(rollups.values())
+
+
+def add_rollups(session, measurements):
+    """
+    Adds a list of measurements to the rollups.
+    :param session: session for the database
+    :param measurements: list of Measurement objects
+    """
+    update_rollups(session, aggregate_requests(
+        (m.endpoint_id, config.version, m.time_requested, m.duration, m.status_code)
+        for m in measurements
+    ))
+
+
+def update_rollups(session, rollups):
+    """
+    Adds the values of the given rollups to the stored ones. A rollup that doesn't exist yet is
+    created. The changes are committed together with the rest of the session.
+    :param session: session for the database
+    :param rollups: list of dicts, as returned by aggregate_requests
+    """
+    DatabaseConnectionWrapper().database_connection.rollup_query(session).update_rollups(rollups)
+
+
+def get_ranges(start=None):
+    """
+    Covers the time from `start` until now with as few buckets as possible: minute buckets until
+    the next full hour, hour buckets until the next full day, and day buckets afterwards.
+    :param start: datetime object (UTC), or None for all time. The result has a resolution of a
+    minute.
+    :return: list of (granularity, start, end) tuples. None means unbounded.
+    """
+    if start is None:
+        return [(DAY, None, None)]
+    minute = get_bucket(start, MINUTE)
+    hour = get_next_bucket(minute, HOUR)
+    day = get_next_bucket(hour, DAY)
+    ranges = [(MINUTE, minute, hour), (HOUR, hour, day), (DAY, day, None)]
+    return [(granularity, begin, end) for granularity, begin, end in ranges
+            if end is None or begin < end]
+
+
+def get_rollup_totals(session, start=None):
+    """
+    :param session: session for the database
+    :param start: datetime object (UTC), or None for all time
+    :return: a list of (endpoint_id, count, error_count, duration_sum, duration_min, duration_max)
+    tuples, one for every endpoint that has been requested since `start`.
+    """
+    return DatabaseConnectionWrapper().database_connection.rollup_query(session).get_rollup_totals(
+        get_ranges(start))
+
+
+def get_rollup_hits(session, start=None):
+    """
+    :param session: session for the database
+    :param start: datetime object (UTC), or None for all time
+    :return: a tuple of two lists with (endpoint_id, value) tuples: the number of hits and the
+    number of errors
+    """
+    totals = get_rollup_totals(session, start)
+    return [(row[0], row[1]) for row in totals], [(row[0], row[2]) for row in totals]
+
+
+def get_rollup_sketches(session, start=None, endpoint_id=None, by_version=False):
+    """
+    Merges the sketches of all rollups since `start`.
+    :param session: session for the database
+    :param start: datetime object (UTC), or None for all time
+    :param endpoint_id: if specified, only the rollups of this endpoint are used
+    :param by_version: if True, the sketches are merged per version instead of per endpoint
+    :return: a dict that maps the endpoint_id (or version) to a DDSketch
+    """
+    sketches = {}
+    rollup_query = DatabaseConnectionWrapper().database_connection.rollup_query(session)
+    for row_endpoint_id, version, sketch in rollup_query.get_rollup_sketches(
+            get_ranges(start), endpoint_id):
+        key = version if by_version else row_endpoint_id
+        if key in sketches:
+            sketches[key].merge(sketch)
+        else:
+            sketches[key] = sketch
+    return sketches
+
+
+def get_rollup_quantiles(session, quantiles, start=None, endpoint_id=None, by_version=False):
+    """
+    Computes quantiles (e.g. the median, p95 and p99) from the sketches in the rollups.
+    :param session: session for the database
+    :param quantiles: list of quantiles between 0 and 1, e.g. [0.5, 0.95, 0.99]
+    :param start: datetime object (UTC), or None for all time
+    :param endpoint_id: if specified, only the rollups of this endpoint are used
+    :param by_version: if True, the quantiles are computed per version instead of per endpoint
+    :return: a list of (endpoint_id or version, [values]) tuples
+    """
+    sketches = get_rollup_sketches(session, start, endpoint_id, by_version)
+    return [(key, sketch.quantiles(quantiles)) for key, sketch in sketches.items()]
+
+
+def get_rollup_medians(session, start=None):
+    """
+    :param session: session for the database
+    :param start: datetime object (UTC), or None for all time
+    :return: a list of (endpoint_id, median) tuples
+    """
+    return [(key, values[0]) for key, values in get_rollup_quantiles(session, [0.5], start)]
+
+
+def get_rollup_buckets(session, granularity, start, end, endpoint_id=None):
+    """
+    :param session: session for the database
+    :param granularity: length of the buckets in seconds
+    :param start: datetime object (UTC), the first bucket that is returned
+    :param end: datetime object (UTC), the buckets that start before this moment are returned
+    :param endpoint_id: if None, the buckets of all endpoints are returned
+    :return: a list of (endpoint_id, bucket, count) tuples
+    """
+    return DatabaseConnectionWrapper().database_connection.rollup_query(session).get_rollup_buckets(
+        granularity, start, end, endpoint_id)
+
+
+def rebuild_rollups(session, batch_size=10000):
+    """
+    Recomputes all rollups from the Request table. This is needed once for the requests that
+    were stored before the rollups existed. Stop the monitored application while rebuilding,
+    otherwise new requests are counted twice.
+    :param session: session for the database
+    :param batch_size: number of requests that is read at once
+    :return: the number of requests that has been processed
+    """
+    rollup_query = DatabaseConnectionWrapper().database_connection.rollup_query(session)
+    rollup_query.delete_rollups()
+    rollup_query.commit()
+    after, total = None, 0
+    while True:
+        after, rows = rollup_query.get_requests_for_rollup(after, batch_size)
+        if not rows:
+            return total
+        update_rollups(session, aggregate_requests(
+            (endpoint_id, version or '', time_requested, duration, status_code)
+            for endpoint_id, version, time_requested, duration, status_code in rows
+        ))
+        rollup_query.commit()
+        total += len(rows)
@@ -2,10 +2,10 @@
 Contains all functions that access an StackLine object.
 """
 from flask_monitoringdashboard.database import DatabaseConnectionWrapper
-from flask_monitoringdashboard.database.code_line import get_code_line
+from flask_monitoringdashboard.database.code_line import get_code_line_ids
 
 
-def add_stack_line(session, request_id, position, indent, duration, code_line):
+def add_stack_line(session, request_id, position, indent, duration, code_line, endpoint_id=None):
     """
     Adds a StackLine to the database (and possibly a CodeLine)
     :param session: Session for the database
@@ -14,21 +14,51 @@ def add_stack_line(session, request_id, position, indent, duration, code_line):
     :param indent: indent-value
     :param duration: duration of this line (in ms)
     :param code_line: quadruple that consists of: (filename, line_number, function_name, code)
+    :param endpoint_id: id of the endpoint of the request. If specified, the database doesn't have
+    to look it up.
     """
-    fn, ln, name, code = code_line
-    db_code_line = get_code_line(session, fn, ln, name, code)
+    code_id = get_code_line_ids(session, [code_line])[code_line]
     database_connection_wrapper = DatabaseConnectionWrapper()
     database_connection_wrapper.database_connection.stack_line_query(session).create_stack_line(
         database_connection_wrapper.database_connection.stack_line(
             request_id=request_id,
             position=position,
             indent=indent,
-            code_id=db_code_line.id,
+            code_id=code_id,
             duration=duration,
-        )
+        ),
+        endpoint_id,
     )
 
 
+def add_stack_lines(session, request_id, stack_lines, endpoint_id=None, time_requested=None):
+    """
+    Adds all StackLines of a request to the database (and possibly the CodeLines) in a few round
+    trips, instead of a couple per line.
+    :param session: Session for the database
+    :param request_id: id of the request
+    :param stack_lines: list of (indent, duration, code_line) tuples, ordered by their position.
+    code_line is a quadruple that consists of: (filename, line_number, function_name, code)
+    :param endpoint_id: id of the endpoint of the request. If specified, the database doesn't have
+    to look it up.
+    :param time_requested: time of the request. If specified, the database doesn't have to look it
+    up.
+    """
+    code_ids = get_code_line_ids(session, [code_line for _, _, code_line in stack_lines])
+    database_connection_wrapper = DatabaseConnectionWrapper()
+    stack_line = database_connection_wrapper.database_connection.stack_line
+    database_connection_wrapper.database_connection.stack_line_query(session).bulk_create([
+        stack_line(
+            request_id=request_id,
+            position=position,
+            indent=indent,
+            code_id=code_ids[code_line],
+            duration=duration,
+        )
+        for position, (indent, duration, code_line) in enumerate(stack_lines)
+    ], endpoint_id, time_requested)
+
+
 def get_profiled_requests(session, endpoint_id, offset, per_page):
     """
     Gets the requests of an endpoint sorted by request time, together with the stack lines.
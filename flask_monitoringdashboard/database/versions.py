@@ -24,8 +24,9 @@ def get_versions(session, endpoint_id=None, limit=None):
                                                                                                limit=limit)
 
 
-def get_2d_version_data_filter(endpoint_id):
-    return DatabaseConnectionWrapper().database_connection.version_query.get_2d_version_data_filter(endpoint_id)
+def get_2d_version_data_filter(endpoint_id, column=None, values=None, versions=None):
+    return DatabaseConnectionWrapper().database_connection.version_query.get_2d_version_data_filter(
+        endpoint_id, column, values, versions)
 
 
 def get_first_requests(session, endpoint_id, limit=None):
@@ -38,3 +39,14 @@ def get_first_requests(session, endpoint_id, limit=None):
     """
     return DatabaseConnectionWrapper().database_connection.version_query(session).get_first_requests(endpoint_id,
                                                                                                      limit=limit)
+
+
+def get_hits_per_endpoint_and_version(session, versions):
+    """
+    Returns the number of hits of every endpoint in the given versions, using a single query.
+    :param session: session for the database
+    :param versions: list of versions
+    :return: list of (endpoint name, version, hits) tuples
+    """
+    version_query = DatabaseConnectionWrapper().database_connection.version_query(session)
+    return version_query.get_hits_per_endpoint_and_version(versions)
@@ -4,6 +4,7 @@ from flask import jsonify
 
 from flask_monitoringdashboard import blueprint, config
 from flask_monitoringdashboard.core.auth import secure
+from flask_monitoringdashboard.core.ingestion import get_ingestion_stats
 from flask_monitoringdashboard.core.timezone import to_local_datetime
 from flask_monitoringdashboard.core.utils import get_details
 from flask_monitoringdashboard.database import DatabaseConnectionWrapper
@@ -15,7 +16,8 @@ def deploy_details():
     """
     :return: A JSON-object with deployment details
     """
-    with DatabaseConnectionWrapper().database_connection.session_scope() as session:
+    database_connection = DatabaseConnectionWrapper().database_connection
+    with database_connection.session_scope() as session:
         details = get_details(session)
     try:
         details['first-request'] = to_local_datetime(
@@ -27,6 +29,8 @@ def deploy_details():
     except:
         details['first-request'] = to_local_datetime(datetime.datetime.utcnow())
         details['first-request-version'] = to_local_datetime(datetime.datetime.utcnow())
+    details['ingestion'] = get_ingestion_stats()
+    details['pool'] = database_connection.get_pool_stats()
     return jsonify(details)
 
 
@@ -5,13 +5,7 @@ from flask import request, jsonify
 from flask_monitoringdashboard import blueprint
 from flask_monitoringdashboard.core.auth import secure
 from flask_monitoringdashboard.core.date_interval import DateInterval
-from flask_monitoringdashboard.core.reporting.questions.median_latency import \
-    MedianLatency
-from flask_monitoringdashboard.core.reporting.questions.status_code_distribution import (
-    StatusCodeDistribution,
-)
-from flask_monitoringdashboard.database import DatabaseConnectionWrapper
-from flask_monitoringdashboard.database.endpoint import get_endpoints
+from flask_monitoringdashboard.core.reporting.report import make_report
 from flask_monitoringdashboard.database.request import create_time_based_sample_criterion, create_version_criterion
 
 
@@ -19,40 +13,6 @@ def get_date(p):
     return datetime.utcfromtimestamp(int(request.args.get(p)))
 
 
-def make_endpoint_summary(endpoint, requests_criterion, baseline_requests_criterion):
-    questions = [MedianLatency(), StatusCodeDistribution()]
-
-    summary = dict(
-        endpoint_id=endpoint.id,
-        endpoint_name=endpoint.name,
-        answers=[],
-        has_anything_significant=False,
-    )
-
-    for question in questions:
-        answer = question.get_answer(endpoint, requests_criterion,
-                                     baseline_requests_criterion)
-
-        if answer.is_significant():
-            summary['has_anything_significant'] = True
-
-        summary['answers'].append(answer.serialize())
-
-    return summary
-
-
-def make_endpoint_summaries(requests_criterion, baseline_requests_criterion):
-    endpoint_summaries = []
-
-    with DatabaseConnectionWrapper().database_connection.session_scope() as db_session:
-        for endpoint in get_endpoints(db_session):
-            endpoint_summary = make_endpoint_summary(endpoint, requests_criterion,
-                                                     baseline_requests_criterion)
-            endpoint_summaries.append(endpoint_summary)
-
-    return dict(summaries=endpoint_summaries)
-
-
 @blueprint.route('/api/reporting/make_report/intervals', methods=['POST'])
 @secure
 def make_report_intervals():
@@ -78,7 +38,7 @@ def make_report_intervals():
     requests_criterion = create_time_based_sample_criterion(interval.start_date(),
                                                             interval.end_date())
 
-    summaries = make_endpoint_summaries(requests_criterion, baseline_requests_criterion)
+    summaries = make_report(requests_criterion, baseline_requests_criterion)
 
     return jsonify(summaries)
 
@@ -100,5 +60,5 @@ def make_report_commits():
     baseline_requests_criterion = create_version_criterion(baseline_commit_version)
     requests_criterion = create_version_criterion(commit_version)
 
-    summaries = make_endpoint_summaries(requests_criterion, baseline_requests_criterion)
+    summaries = make_report(requests_criterion, baseline_requests_criterion)
     return jsonify(summaries)
@@ -15,6 +15,7 @@ def test_deployment(dashboard_user, session, config):
     assert data['config-version'] == config.version
     assert data['link'] == 'dashboard'
     assert data['total-requests'] == RequestQuery(session).count(Request)
+    assert isinstance(data['pool'], dict)
 
 
 def test_deployment_config(dashboard_user, config):
@@ -1,5 +1,6 @@
 import pytest
 from flask_monitoringdashboard.database import DatabaseConnectionWrapper
+from flask_monitoringdashboard.database.rollup import rebuild_rollups
 
 
 database_connection_wrapper = DatabaseConnectionWrapper()
@@ -226,4 +227,26 @@ def test_endpoint_users_post(dashboard_user, request_1, request_2, endpoint):
     assert row1['values'] == [request_1.duration]
 
     assert row2['user'] == request_2.group_by
-    assert row2['values'] == [request_2.duration]
\ No newline at end of file
+    assert row2['values'] == [request_2.duration]
+
+
+@pytest.mark.parametrize('request_2__status_code', [500])
+def test_overview_rollups(dashboard_user, request_1, request_2, endpoint, session, config,
+                          monkeypatch):
+    rebuild_rollups(session)
+    monkeypatch.setattr(config, 'use_rollups', True)
+    response = dashboard_user.get('dashboard/api/overview')
+    assert response.status_code == 200
+
+    [data] = [row for row in response.json if row['id'] == endpoint.id]
+
+    assert data['hits-overall'] == 2
+    assert data['hits-today'] == 2
+    assert data['hits-today-errors'] == 1
+    assert data['hits-week'] == 2
+    assert data['hits-week-errors'] == 1
+
+    # a sketch returns the lower median, within the configured relative accuracy
+    expected = min(request_1.duration, request_2.duration)
+    assert data['median-overall'] == pytest.approx(expected, rel=config.sketch_relative_accuracy)
+    assert data['median-today'] == pytest.approx(expected, rel=config.sketch_relative_accuracy)
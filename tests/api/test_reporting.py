@@ -41,6 +41,7 @@ def test_make_report_post_not_significant(dashboard_user, endpoint, request_1, r
         },
     )
     assert response.status_code == 200
+    assert set(response.json['timing']) == {'fetch', 'evaluate', 'total'}
     assert len(response.json['summaries']) == EndpointQuery(session).count(Endpoint)
     [data] = [row for row in response.json['summaries'] if row['endpoint_id'] == endpoint.id]
 
@@ -1,6 +1,9 @@
 from datetime import datetime
 
 import pytest
+import pytz
+
+from flask_monitoringdashboard.database.rollup import rebuild_rollups
 
 
 @pytest.mark.parametrize('request_1__time_requested', [datetime(2020, 1, 1)])
@@ -32,3 +35,42 @@ def test_hourly_load(dashboard_user, endpoint):
         else:
             assert row == [0]
 
+
+@pytest.mark.parametrize('request_1__time_requested', [datetime(2019, 12, 31, hour=23, minute=30)])
+@pytest.mark.parametrize('request_2__time_requested', [datetime(2020, 1, 1, hour=21, minute=30)])
+@pytest.mark.usefixtures('request_1', 'request_2')
+def test_hourly_load_timezone(dashboard_user, endpoint, config, monkeypatch):
+    monkeypatch.setattr(config, 'timezone', pytz.timezone('Etc/GMT-2'))  # UTC+2
+    response = dashboard_user.get(
+        'dashboard/api/hourly_load/2020-01-01/2020-01-01/{0}'.format(endpoint.id))
+
+    assert response.status_code == 200
+    for index, row in enumerate(response.json['data']):
+        assert row == ([1] if index in [1, 23] else [0])
+
+
+@pytest.mark.parametrize('request_1__time_requested', [datetime(2020, 1, 1, hour=2)])
+@pytest.mark.parametrize('request_2__time_requested', [datetime(2020, 1, 2, hour=23)])
+@pytest.mark.usefixtures('request_1', 'request_2')
+def test_num_requests_rollups(dashboard_user, endpoint, session, config, monkeypatch):
+    rebuild_rollups(session)
+    monkeypatch.setattr(config, 'use_rollups', True)
+    response = dashboard_user.get('dashboard/api/requests/2020-01-01/2020-01-02')
+
+    assert response.status_code == 200
+    [data] = [row for row in response.json['data'] if row['name'] == endpoint.name]
+    assert data['values'] == [1, 1]
+
+
+@pytest.mark.parametrize('request_1__time_requested', [datetime(2020, 1, 1, hour=2)])
+@pytest.mark.parametrize('request_2__time_requested', [datetime(2020, 1, 1, hour=2, minute=30)])
+@pytest.mark.usefixtures('request_1', 'request_2')
+def test_hourly_load_rollups(dashboard_user, endpoint, session, config, monkeypatch):
+    rebuild_rollups(session)
+    monkeypatch.setattr(config, 'use_rollups', True)
+    response = dashboard_user.get(
+        'dashboard/api/hourly_load/2020-01-01/2020-01-01/{0}'.format(endpoint.id))
+
+    assert response.status_code == 200
+    for index, row in enumerate(response.json['data']):
+        assert row == ([2] if index == 2 else [0])
@@ -1,3 +1,4 @@
+import uuid
 from datetime import datetime
 
 import pytest
@@ -44,6 +45,21 @@ def test_multi_version_post(dashboard_user, request_1, request_2, endpoint):
     assert data == [[100, 100]]
 
 
+def test_multi_version_percentages(dashboard_user, endpoint, endpoint_factory, request_factory):
+    other = endpoint_factory()
+    version, unused_version = str(uuid.uuid4()), str(uuid.uuid4())
+    for _ in range(3):
+        request_factory(endpoint=endpoint, version_requested=version)
+    request_factory(endpoint=other, version_requested=version)
+
+    response = dashboard_user.post('dashboard/api/multi_version', json={'data': {
+        'endpoints': [endpoint.name, other.name, 'unknown'],
+        'versions': [version, unused_version],
+    }})
+    assert response.status_code == 200
+    assert response.json == [[75, 0], [25, 0], [0, 0]]
+
+
 def test_version_user_get(dashboard_user, endpoint):
     """GET is not allowed. It should return the overview page."""
     response = dashboard_user.get('dashboard/api/version_user/{0}'.format(endpoint.id))
@@ -0,0 +1,75 @@
+"""
+Microbenchmark for the grouped profiler. Run it with:
+
+    python -m tests.benchmarks.grouped_profiler
+
+It groups 100 profiled requests of 500 stack lines each, once with the original implementation
+(linear-scan StringHash.unhash and a backward scan per stack line to find its path) and once with
+the current one (reverse index and a single pass over the stack lines).
+"""
+import time
+from collections import namedtuple
+from unittest import mock
+
+from flask_monitoringdashboard.controllers.profiler import group_profiled_requests
+from flask_monitoringdashboard.core.profiler.util import PathHash
+from flask_monitoringdashboard.core.profiler.util.string_hash import StringHash
+
+NUM_REQUESTS = 100
+NUM_LINES = 500
+REPEAT = 3
+
+Request = namedtuple('Request', ['stack_lines'])
+StackLine = namedtuple('StackLine', ['indent', 'duration', 'code'])
+CodeLine = namedtuple('CodeLine', ['filename', 'line_number', 'function_name', 'code'])
+
+
+def linear_unhash(self, hash):
+    """ StringHash.unhash before the reverse index was added. """
+    for k, v in self._h.items():
+        if v == hash:
+            return k
+    raise ValueError('Value not possible to unhash: {}'.format(hash))
+
+
+def per_index_paths(self, stack_lines):
+    """ Path computation before PathHash.get_stacklines_paths was added. """
+    return [self.get_stacklines_path(stack_lines, index) for index in range(len(stack_lines))]
+
+
+def make_requests():
+    requests = []
+    for r in range(NUM_REQUESTS):
+        stack_lines = []
+        for i in range(NUM_LINES):
+            code = CodeLine('file{}.py'.format(i % 20), i, 'fun{}'.format(i), 'line_{}'.format(i))
+            stack_lines.append(StackLine(i % 10, float(r), code))
+        requests.append(Request(stack_lines))
+    return requests
+
+
+def measure(requests):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        group_profiled_requests(requests)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    requests = make_requests()
+    with mock.patch.object(StringHash, 'unhash', linear_unhash), mock.patch.object(
+        PathHash, 'get_stacklines_paths', per_index_paths
+    ):
+        before = measure(requests)
+    after = measure(requests)
+    print('{} requests x {} lines'.format(NUM_REQUESTS, NUM_LINES))
+    print('before:  {:8.1f} ms'.format(before * 1000))
+    print('after:   {:8.1f} ms'.format(after * 1000))
+    print('speed-up:{:8.1f}x'.format(before / after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Microbenchmark for the statistics of the MedianLatency report question. Run it with:
+
+    python -m tests.benchmarks.reporting_statistics
+
+It computes the medians and median tests of 1,000 endpoints with samples of 500 latencies, once
+with the original implementation (np.median and scipy.stats.median_test per endpoint) and once
+with the vectorized one (MedianLatency.prepare).
+"""
+import random
+import time
+
+import numpy as np
+from scipy.stats import median_test
+
+from flask_monitoringdashboard.core.reporting.questions.median_latency import MedianLatency
+
+NUM_ENDPOINTS = 1000
+SAMPLE_SIZE = 500
+REPEAT = 3
+
+
+def make_data():
+    return {
+        endpoint_id: (
+            [random.expovariate(1 / 100) for _ in range(SAMPLE_SIZE)],
+            [random.expovariate(1 / 110) for _ in range(SAMPLE_SIZE)],
+        )
+        for endpoint_id in range(NUM_ENDPOINTS)
+    }
+
+
+def per_endpoint(data):
+    """ MedianLatency before the statistics were vectorized. """
+    result = {}
+    for endpoint_id, (sample, baseline_sample) in data.items():
+        _, p, _, _ = median_test(sample, baseline_sample)
+        result[endpoint_id] = (float(np.median(sample)), float(np.median(baseline_sample)), p)
+    return result
+
+
+def measure(function, data):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    data = make_data()
+    before = measure(per_endpoint, data)
+    after = measure(MedianLatency().prepare, data)
+    print('{} endpoints x {} latencies'.format(NUM_ENDPOINTS, SAMPLE_SIZE))
+    print('before:  {:8.1f} ms'.format(before * 1000))
+    print('after:   {:8.1f} ms'.format(after * 1000))
+    print('speed-up:{:8.1f}x'.format(before / after))
+
+
+if __name__ == '__main__':
+    main()
@@ -79,7 +79,7 @@ class CodeLineFactory(ModelFactory):
     filename = 'abc.py'
     line_number = factory.LazyFunction(lambda: int(random() * 100))
     function_name = 'f'
-    code = 'a=b'
+    code = factory.LazyFunction(lambda: 'a = {}'.format(uuid.uuid4()))
 
 
 class StackLineFactory(ModelFactory):
@@ -1,44 +1,40 @@
 import threading
-import time
 
 from flask import request
 import pytest
 from werkzeug.routing import Rule
 
 from flask_monitoringdashboard.core.cache import memory_cache, init_cache
+from flask_monitoringdashboard.core.ingestion import flush
 from flask_monitoringdashboard.core.profiler import (
-    start_thread_last_requested,
-    start_performance_thread,
+    record_last_requested,
+    record_performance,
     start_profiler_and_outlier_thread,
     start_outlier_thread,
 )
 
 
-def wait_until_threads_finished(num_threads):
-    while threading.active_count() > num_threads:
-        time.sleep(0.01)
-
-
 @pytest.mark.usefixtures('request_context')
-def test_start_thread_last_requested(endpoint, config):
+def test_record_last_requested(endpoint, config):
     config.app.url_map.add(Rule('/', endpoint=endpoint.name))
     init_cache()
     num_threads = threading.active_count()
-    start_thread_last_requested(endpoint)
-    wait_until_threads_finished(num_threads)
+    record_last_requested(endpoint)
+    assert threading.active_count() == num_threads
 
     assert memory_cache.get(endpoint.name).last_requested
 
 
 @pytest.mark.usefixtures('request_context')
-def test_start_performance_thread(endpoint, config):
+def test_record_performance(endpoint, config):
     config.app.url_map.add(Rule('/', endpoint=endpoint.name))
     init_cache()
     request.environ['REMOTE_ADDR'] = '127.0.0.1'
+    record_performance(endpoint, 1234, 200)
     num_threads = threading.active_count()
-    start_performance_thread(endpoint, 1234, 200)
-    assert threading.active_count() == num_threads + 1
-    wait_until_threads_finished(num_threads)
+    record_performance(endpoint, 1234, 200)
+    assert threading.active_count() == num_threads
+    assert flush()
 
     assert memory_cache.get(endpoint.name).average_duration > 0
 
@@ -52,7 +48,8 @@ def test_start_outlier_thread(endpoint, config):
     outlier = start_outlier_thread(endpoint)
     assert threading.active_count() == num_threads + 1
     outlier.stop(duration=1, status_code=200)
-    wait_until_threads_finished(num_threads)
+    outlier.join()
+    assert flush()
 
 
 @pytest.mark.usefixtures('request_context')
@@ -60,8 +57,18 @@ def test_start_profiler_and_outlier_thread(endpoint, config):
     config.app.url_map.add(Rule('/', endpoint=endpoint.name))
     init_cache()
     request.environ['REMOTE_ADDR'] = '127.0.0.1'
+    profiler = start_profiler_and_outlier_thread(endpoint)
+    assert not profiler.stopped
+    profiler.stop(duration=1, status_code=200)
+    assert profiler.join(timeout=5)
+    profiler._outlier_profiler.join()
+    assert flush()
+
+    # the sampler thread is shared, so profiling another request does not start a new thread
     num_threads = threading.active_count()
-    thread = start_profiler_and_outlier_thread(endpoint)
-    assert threading.active_count() == num_threads + 2
-    thread.stop(duration=1, status_code=200)
-    wait_until_threads_finished(num_threads)
+    profiler = start_profiler_and_outlier_thread(endpoint)
+    profiler._outlier_profiler.stop_by_profiler()
+    profiler._outlier_profiler.join()
+    assert threading.active_count() == num_threads
+    profiler.stop(duration=1, status_code=200)
+    assert profiler.join(timeout=5)
@@ -20,6 +20,7 @@ def test_after_run(endpoint, config):
     request.environ['REMOTE_ADDR'] = '127.0.0.1'
     current_thread = threading.current_thread().ident
     ip = request.environ['REMOTE_ADDR']
-    thread = StacktraceProfiler(current_thread, endpoint, ip, group_by=None)
-    thread._keeprunning = False
-    thread.run()
+    profiler = StacktraceProfiler(current_thread, endpoint, ip, group_by=None)
+    profiler.start()
+    profiler.stop(duration=1, status_code=200)
+    assert profiler.join(timeout=5)
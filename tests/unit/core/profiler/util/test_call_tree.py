@@ -0,0 +1,33 @@
+from flask_monitoringdashboard.core.profiler.util import CallTree
+
+
+def test_add():
+    call_tree = CallTree()
+    call_tree.add([('fn', 42, 'a')], 10)
+    call_tree.add([('fn', 42, 'a'), ('fn', 12, 'c')], 5)
+    call_tree.add([('fn', 42, 'a'), ('fn', 12, 'c')], 3)
+    assert call_tree.walk() == [(1, ('fn', 42, 'a'), 18), (2, ('fn', 12, 'c'), 8)]
+
+
+def test_walk():
+    call_tree = CallTree()
+    call_tree.add([('fn', 42, 'a'), ('fn', 12, 'c')], 610)
+    call_tree.add([('fn', 42, 'a'), ('fn', 13, 'b'), ('fn', 7, 'd')], 614)
+    call_tree.add([('fn', 42, 'a')], 10)
+    assert call_tree.walk(key=lambda location: location[2]) == [
+        (1, ('fn', 42, 'a'), 1234),
+        (2, ('fn', 13, 'b'), 614),
+        (3, ('fn', 7, 'd'), 614),
+        (2, ('fn', 12, 'c'), 610),
+    ]
+
+
+def test_walk_insertion_order():
+    call_tree = CallTree()
+    call_tree.add([('fn', 42, 'a'), ('fn', 12, 'c')], 1)
+    call_tree.add([('fn', 42, 'a'), ('fn', 13, 'b')], 1)
+    assert [location for _, location, _ in call_tree.walk()] == [
+        ('fn', 42, 'a'),
+        ('fn', 12, 'c'),
+        ('fn', 13, 'b'),
+    ]
@@ -0,0 +1,17 @@
+import inspect
+
+from flask_monitoringdashboard.core.profiler.util.frame_walker import walk_frames, get_source_line
+
+
+def test_walk_frames():
+    frame = inspect.currentframe()
+    stack = walk_frames(frame)
+    assert [(code.co_filename, code.co_name) for code, _ in stack] == \
+        [(info.filename, info.function) for info in reversed(inspect.getouterframes(frame, 0))]
+    assert stack[-1][0] is frame.f_code
+
+
+def test_get_source_line():
+    frame = inspect.currentframe()
+    assert get_source_line(frame.f_code.co_filename, frame.f_code.co_firstlineno) == \
+        'def test_get_source_line():'
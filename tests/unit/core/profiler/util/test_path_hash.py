@@ -46,3 +46,10 @@ def test_get_code(path_hash, stack_line, filename, line_number):
 def test_get_stacklines_path(path_hash, stack_line, stack_line_2, filename, line_number):
     assert path_hash.get_stacklines_path([stack_line, stack_line_2], 0) == '1:0'
     assert path_hash.get_stacklines_path([stack_line, stack_line_2], 1) == '1:0->1:0'
+
+
+def test_get_stacklines_paths(path_hash, stack_line, stack_line_2):
+    stack_lines = [stack_line, stack_line_2, stack_line_2, stack_line]
+    assert path_hash.get_stacklines_paths(stack_lines) == [
+        path_hash.get_stacklines_path(stack_lines, index) for index in range(len(stack_lines))
+    ]
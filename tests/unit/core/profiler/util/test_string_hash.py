@@ -12,3 +12,11 @@ def test_unhash(string_hash):
 
     with pytest.raises(ValueError):
         string_hash.unhash('unkown')
+
+
+def test_unhash_out_of_range(string_hash):
+    string_hash.hash('abc')
+    with pytest.raises(ValueError):
+        string_hash.unhash(1)
+    with pytest.raises(ValueError):
+        string_hash.unhash(-1)
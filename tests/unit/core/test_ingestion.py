@@ -0,0 +1,157 @@
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from flask_monitoringdashboard.core.ingestion import (
+    IngestionQueue,
+    Measurement,
+    DROP_NEWEST,
+    DROP_OLDEST,
+    BLOCK,
+    enqueue,
+    flush,
+    get_ingestion_stats,
+    store_measurements,
+)
+from flask_monitoringdashboard.database.count import count_requests
+from flask_monitoringdashboard.database.count_group import get_value
+from flask_monitoringdashboard.database.rollup import get_rollup_hits
+
+
+def test_drop_oldest():
+    queue = IngestionQueue(2, DROP_OLDEST)
+    for i in range(3):
+        assert queue.put(i)
+    assert queue.get_batch(10, timeout=0) == [1, 2]
+    assert queue.stats()['dropped'] == 1
+
+
+def test_drop_newest():
+    queue = IngestionQueue(2, DROP_NEWEST)
+    assert queue.put(0)
+    assert queue.put(1)
+    assert not queue.put(2)
+    assert queue.get_batch(10, timeout=0) == [0, 1]
+    assert queue.stats()['dropped'] == 1
+
+
+def test_block():
+    queue = IngestionQueue(1, BLOCK)
+    queue.put(0)
+    thread = threading.Thread(target=queue.put, args=(1,))
+    thread.start()
+    assert queue.get_batch(10, timeout=0) == [0]
+    thread.join(timeout=1)
+    assert queue.get_batch(10, timeout=0) == [1]
+    assert queue.stats()['dropped'] == 0
+
+
+def test_get_batch_by_size():
+    queue = IngestionQueue(10)
+    for i in range(3):
+        queue.put(i)
+    assert queue.get_batch(2, timeout=10) == [0, 1]
+
+
+def test_get_batch_by_time():
+    queue = IngestionQueue(10)
+    queue.put(0)
+    assert queue.get_batch(2, timeout=0.01) == [0]
+    assert queue.get_batch(2, timeout=0.01) == []
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        IngestionQueue(1, 'unknown')
+
+
+def test_join():
+    queue = IngestionQueue(10)
+    queue.put(0)
+    assert not queue.join(timeout=0.01)
+    queue.task_done(len(queue.get_batch(10, timeout=0)))
+    assert queue.join(timeout=0.01)
+    assert queue.stats()['written'] == 1
+
+
+def test_get_batch_during_join():
+    queue = IngestionQueue(10)
+    queue.put(0)
+    batch = queue.get_batch(10, timeout=0)
+    thread = threading.Thread(target=queue.join, args=(1,))
+    thread.start()
+    # the queue is empty, so the pending join doesn't end the wait
+    start = time.time()
+    assert queue.get_batch(10, timeout=0.1) == []
+    assert time.time() - start >= 0.09
+    queue.task_done(len(batch))
+    thread.join(timeout=1)
+    assert not thread.is_alive()
+
+
+def test_enqueue(session, endpoint, config):
+    num_requests = count_requests(session, endpoint.id)
+    assert enqueue(Measurement(endpoint, 12, '127.0.0.1', None, 200))
+    assert flush()
+    assert count_requests(session, endpoint.id) == num_requests + 1
+    assert get_ingestion_stats()['written'] >= 1
+
+
+def test_enqueue_rollups(session, endpoint, config, monkeypatch):
+    monkeypatch.setattr(config, 'use_rollups', True)
+    assert enqueue(Measurement(endpoint, 12, '127.0.0.1', None, 500))
+    assert enqueue(Measurement(endpoint, 30, '127.0.0.1', None, 200))
+    assert flush()
+    hits, errors = get_rollup_hits(session)
+    assert get_value(hits, endpoint.id) == 2
+    assert get_value(errors, endpoint.id) == 1
+
+
+def test_store_measurements_rollup_failure(session, endpoint, config, monkeypatch):
+    monkeypatch.setattr(config, 'use_rollups', True)
+    num_requests = count_requests(session, endpoint.id)
+    measurements = [Measurement(endpoint, 12, '127.0.0.1', None, 200) for _ in range(5)]
+    with mock.patch('flask_monitoringdashboard.core.ingestion.add_rollups',
+                    side_effect=ValueError):
+        assert store_measurements(measurements) == 5
+    assert count_requests(session, endpoint.id) == num_requests
+
+
+def test_store_measurements_failure(session, endpoint):
+    num_requests = count_requests(session, endpoint.id)
+    outlier = ('[]', 'memory', 'stack', ('h', 'e', 'u'))
+    measurements = [
+        Measurement(endpoint, 12, '127.0.0.1', None, 200),
+        Measurement(endpoint, 12, '127.0.0.1', None, 200, outlier=outlier),
+    ]
+    with mock.patch('flask_monitoringdashboard.core.ingestion.add_outlier',
+                    side_effect=ValueError):
+        assert store_measurements(measurements) == 2
+    # the request without an outlier is rolled back as well
+    assert count_requests(session, endpoint.id) == num_requests
+    assert store_measurements(measurements) == 0
+    assert count_requests(session, endpoint.id) == num_requests + 2
+
+
+def test_enqueue_without_rollups(session, endpoint, config):
+    assert not config.use_rollups
+    assert enqueue(Measurement(endpoint, 12, '127.0.0.1', None, 200))
+    assert flush()
+    hits, _ = get_rollup_hits(session)
+    assert get_value(hits, endpoint.id) == 0
+
+
+def test_store_measurements_profile(session, endpoint):
+    profile = mock.Mock()
+    profile.get_stack_lines.return_value = [(0, 12, ('file.py', 1, 'None', 'def f():'))]
+    broken_profile = mock.Mock()
+    broken_profile.get_stack_lines.side_effect = ValueError
+    measurements = [
+        Measurement(endpoint, 12, '127.0.0.1', None, 200, profile=profile),
+        Measurement(endpoint, 12, '127.0.0.1', None, 200, profile=broken_profile),
+    ]
+    assert store_measurements(measurements) == 1
+    assert measurements[0].stack_lines == profile.get_stack_lines.return_value
+    assert measurements[0].profile is None
@@ -0,0 +1,19 @@
+from datetime import datetime, timedelta
+
+from flask_monitoringdashboard.core.reporting.report import make_report
+from flask_monitoringdashboard.database.request import create_time_based_sample_criterion
+
+
+def test_make_report(endpoint, request_1, request_2):
+    requests_criterion = create_time_based_sample_criterion(
+        datetime.utcnow() - timedelta(days=1), datetime.utcnow())
+    baseline_requests_criterion = create_time_based_sample_criterion(
+        datetime.utcnow() - timedelta(days=2), datetime.utcnow() - timedelta(days=1))
+
+    report = make_report(requests_criterion, baseline_requests_criterion)
+
+    [summary] = [
+        summary for summary in report['summaries'] if summary['endpoint_id'] == endpoint.id]
+    assert summary['endpoint_name'] == endpoint.name
+    assert len(summary['answers']) == 2
+    assert report['timing']['total'] >= report['timing']['fetch']
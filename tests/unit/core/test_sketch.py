@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from flask_monitoringdashboard.core.sketch import DDSketch
+
+
+@pytest.fixture
+def values():
+    return np.random.RandomState(42).lognormal(4, 1.5, 10000)
+
+
+@pytest.mark.parametrize('relative_accuracy', [0.01, 0.05])
+def test_quantiles(values, relative_accuracy):
+    sketch = DDSketch.from_values(values, relative_accuracy)
+    assert sketch.count == len(values)
+    for q, value in zip([0.5, 0.95, 0.99], sketch.quantiles([0.5, 0.95, 0.99])):
+        expected = np.percentile(values, q * 100, method='lower')
+        assert abs(value - expected) <= relative_accuracy * expected
+
+
+def test_empty():
+    assert DDSketch().quantile(0.5) is None
+
+
+def test_zero():
+    sketch = DDSketch.from_values([0, 0, 10])
+    assert sketch.quantile(0.5) == 0
+    assert sketch.quantile(1) == pytest.approx(10, rel=0.01)
+
+
+def test_merge(values):
+    sketch = DDSketch.from_values(values[:5000]).merge(DDSketch.from_values(values[5000:]))
+    assert sketch.to_dict() == DDSketch.from_values(values).to_dict()
+
+
+def test_merge_other_accuracy(values):
+    sketch = DDSketch.from_values(values[:5000], 0.01)
+    sketch.merge(DDSketch.from_values(values[5000:], 0.02))
+    assert sketch.count == len(values)
+    expected = np.percentile(values, 50)
+    assert abs(sketch.quantile(0.5) - expected) <= 0.03 * expected
+
+
+def test_max_bins(values):
+    sketch = DDSketch(0.01, max_bins=100)
+    for value in values:
+        sketch.add(value)
+    assert len(sketch.bins) <= 100
+    assert sketch.count == len(values)
+    expected = np.percentile(values, 99, method='lower')
+    assert abs(sketch.quantile(0.99) - expected) <= 0.01 * expected
+
+
+def test_to_dict(values):
+    sketch = DDSketch.from_values(values)
+    restored = DDSketch.from_dict(sketch.to_dict())
+    assert restored.quantiles([0.5, 0.99]) == sketch.quantiles([0.5, 0.99])
+
+
+def test_relative_accuracy():
+    with pytest.raises(ValueError):
+        DDSketch(0)
@@ -0,0 +1,46 @@
+import math
+import random
+
+import numpy as np
+import pytest
+from scipy.stats import median_test
+
+from flask_monitoringdashboard.core.statistics import median_tests, medians, percentiles
+from flask_monitoringdashboard.core.utils import simplify
+
+
+def test_percentiles():
+    values = [random.random() for _ in range(100)]
+    assert percentiles(values, [0, 50, 100]) == pytest.approx(
+        [min(values), float(np.median(values)), max(values)])
+
+
+def test_simplify():
+    assert simplify([1, 2, 3], 5) == [1, 2, 3]
+    assert simplify(list(range(101)), 5) == [0, 25, 50, 75, 100]
+
+
+def test_medians():
+    result = medians([[1, 5, 2], [4], []])
+    assert result[:2].tolist() == [2, 4]
+    assert math.isnan(result[2])
+
+
+def test_median_tests():
+    random.seed(0)
+    samples = [
+        [random.randint(0, 20) for _ in range(random.randint(1, 50))] for _ in range(50)]
+    baseline_samples = [
+        [random.randint(0, 25) for _ in range(random.randint(1, 50))] for _ in range(50)]
+    expected = []
+    for sample, baseline_sample in zip(samples, baseline_samples):
+        try:
+            expected.append(median_test(sample, baseline_sample)[1])
+        except ValueError:
+            expected.append(1)
+    assert median_tests(samples, baseline_samples).tolist() == pytest.approx(expected)
+
+
+def test_median_tests_undefined():
+    assert median_tests([[5, 5], [], [1]], [[5], [1], []]).tolist() == [1, 1, 1]
+    assert median_tests([], []).tolist() == []
@@ -4,7 +4,14 @@ This file contains all unit tests that count a number of results in the database
 """
 import pytest
 
-from flask_monitoringdashboard.database.code_line import get_code_line
+from flask_monitoringdashboard.database.code_line import (
+    CodeLineCache,
+    code_line_cache,
+    get_code_line,
+    get_code_lines,
+    get_code_line_ids,
+    init_code_line_cache,
+)
 
 
 @pytest.mark.parametrize('filename', ['filename'])
@@ -19,3 +26,56 @@ def test_get_code_line(session, filename, line_number, function, code):
     assert code_line1.filename == code_line2.filename
     assert code_line1.line_number == code_line2.line_number
     assert code_line1.code == code_line2.code
+
+
+def test_get_code_lines(session):
+    existing = get_code_line(session, 'filename', 1, 'f', 'x = 5')
+    code_lines = [
+        ('filename', 1, 'f', 'x = 5'), ('filename', 2, 'f', 'y = 6'), ('other', 1, 'g', 'z')]
+    result = get_code_lines(session, code_lines + code_lines)
+    assert set(result) == set(code_lines)
+    assert result['filename', 1, 'f', 'x = 5'].id == existing.id
+    assert len({code_line.id for code_line in result.values()}) == 3
+    again = get_code_lines(session, code_lines)
+    assert again['other', 1, 'g', 'z'].id == result['other', 1, 'g', 'z'].id
+
+
+def test_code_line_cache_lru(config, monkeypatch):
+    monkeypatch.setattr(config, 'code_line_cache_size', 2)
+    cache = CodeLineCache()
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_code_line_cache_validate():
+    cache = CodeLineCache()
+    cache.validate('sqlite://')
+    cache.put('a', 1)
+    cache.validate('sqlite://')
+    assert cache.get('a') == 1
+    cache.validate('mysql://')
+    assert cache.get('a') is None
+
+
+def test_get_code_line_ids(session):
+    code_line = ('filename', 3, 'f', 'cached = True')
+    code_id = get_code_line_ids(session, [code_line])[code_line]
+    assert code_id == get_code_line(session, *code_line).id
+    assert code_line_cache.get(code_line) == code_id
+
+    code_line_cache.put(code_line, -1)  # served from the cache, without querying the database
+    assert get_code_line_ids(session, [code_line]) == {code_line: -1}
+    code_line_cache.clear()
+
+
+def test_init_code_line_cache(session):
+    code_line = get_code_line(session, 'filename', 4, 'f', 'warm = True')
+    session.commit()
+    code_line_cache.clear()
+    init_code_line_cache(session)
+    assert code_line_cache.get(('filename', 4, 'f', 'warm = True')) == code_line.id
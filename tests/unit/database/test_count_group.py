@@ -1,10 +1,12 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from random import randint
 
 import pytest
+import pytz
 
 from flask_monitoringdashboard.database.count_group import (
     count_requests_group,
+    count_requests_hits,
     count_requests_per_day,
 )
 from flask_monitoringdashboard.database import DatabaseConnectionWrapper
@@ -28,3 +30,27 @@ def test_count_requests_per_day(session, request_1, endpoint):
     assert count_requests_per_day(session, []) == []
 
     assert count_requests_per_day(session, [request_1.time_requested.date()]) == [[(endpoint.id, 1)]]
+
+
+def test_count_requests_hits(session, endpoint, request_factory):
+    now = datetime.utcnow()
+    today, week_ago = now - timedelta(hours=1), now - timedelta(days=7)
+    request_factory(endpoint=endpoint, time_requested=now)
+    request_factory(endpoint=endpoint, time_requested=now, status_code=500)
+    request_factory(endpoint=endpoint, time_requested=now - timedelta(days=2), status_code=404)
+    request_factory(endpoint=endpoint, time_requested=now - timedelta(days=30))
+    request_factory(endpoint=endpoint, time_requested=now - timedelta(days=30), status_code=None)
+
+    counts = [dict(values)[endpoint.id] for values in count_requests_hits(session, today, week_ago)]
+    assert counts == [2, 1, 3, 2, 5]
+
+
+def test_count_requests_per_day_timezone(session, endpoint, request_factory, config, monkeypatch):
+    monkeypatch.setattr(config, 'timezone', pytz.timezone('Etc/GMT-2'))  # UTC+2
+    request_factory(endpoint=endpoint, time_requested=datetime(2020, 5, 16, 21, 30))
+    request_factory(endpoint=endpoint, time_requested=datetime(2020, 5, 16, 22, 30))
+    request_factory(endpoint=endpoint, time_requested=datetime(2020, 5, 17, 12))
+
+    days = [datetime(2020, 5, day).date() for day in [16, 17, 18]]
+    hits = count_requests_per_day(session, days)
+    assert [dict(hits_day).get(endpoint.id) for hits_day in hits] == [1, 2, None]
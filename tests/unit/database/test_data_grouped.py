@@ -1,5 +1,12 @@
+import numpy
+import pytest
+
+from flask_monitoringdashboard.database.data_base_queries.query_base_object import CountQueriesBase
+from flask_monitoringdashboard.database.versions import get_2d_version_data_filter, get_field_name
 from flask_monitoringdashboard.database.data_grouped import (
     get_endpoint_data_grouped,
+    get_endpoint_percentile_grouped,
+    get_two_columns_median_grouped,
     get_version_data_grouped,
 )
 
@@ -20,3 +27,30 @@ def test_get_version_data_grouped(session, request_1):
             assert value == [request_1.duration]
             return
     assert False, "Shouldn't reach here."
+
+
+@pytest.mark.parametrize('q', [0, 0.25, 0.5, 0.9, 1])
+def test_get_endpoint_percentile_grouped(session, endpoint, request_factory, q):
+    durations = [5, 1, 9, 3, 7, 2]
+    for duration in durations:
+        request_factory(endpoint=endpoint, duration=duration)
+
+    data = dict(get_endpoint_percentile_grouped(session, q))
+    assert data[endpoint.id] == pytest.approx(numpy.percentile(durations, q * 100))
+
+
+def test_stream_percentiles():
+    rows = [('a', 1), ('a', 2), ('b', 3), ('b', 5), ('b', 10)]
+    assert CountQueriesBase.stream_percentiles(iter(rows), 0.5) == [('a', 1.5), ('b', 5)]
+
+
+def test_get_two_columns_median_grouped(session, endpoint, request_factory):
+    rows = [('a', '1', 1), ('a', '1', 4), ('a', '2', 2), ('b', '1', 8), ('c', '1', 5)]
+    for group_by, version, duration in rows:
+        request_factory(endpoint=endpoint, group_by=group_by, version_requested=version,
+                        duration=duration)
+
+    column = get_field_name('group_by')
+    data = get_two_columns_median_grouped(
+        session, column, get_2d_version_data_filter(endpoint.id, column, ['a', 'b'], ['1', '2']))
+    assert sorted(data) == [(('a', '1'), 2.5), (('a', '2'), 2), (('b', '1'), 8)]
@@ -0,0 +1,248 @@
+"""
+This file contains the unit tests for the MongoDB read layer, which don't need a MongoDB
+server. (Corresponding to the file:
+'flask_monitoringdashboard/database/data_base_queries/mongo_db_objects.py')
+"""
+import datetime
+from unittest import mock
+
+import pytest
+from pymongo import uri_parser
+from pymongo.errors import AutoReconnect, NetworkTimeout, OperationFailure
+
+from flask_monitoringdashboard import config
+from flask_monitoringdashboard.core.sketch import DDSketch
+from flask_monitoringdashboard.database.data_base_queries.mongo_db_objects import \
+    MongoDBDatabaseConnection, Outlier, OutlierQuery, PoolStatistics, RequestQuery, RollupQuery, \
+    StackLine, StackLineQuery, safe_mongo_call
+
+
+@pytest.fixture
+def no_sleep():
+    target = 'flask_monitoringdashboard.database.data_base_queries.mongo_db_objects.time.sleep'
+    with mock.patch(target) as sleep:
+        yield sleep
+
+
+def test_safe_mongo_call_empty_result(no_sleep):
+    call = mock.Mock(return_value=None)
+    assert safe_mongo_call(call)() is None
+    assert call.call_count == 1
+    assert not no_sleep.called
+
+
+def test_safe_mongo_call_connection_failure(no_sleep):
+    call = mock.Mock(side_effect=[AutoReconnect(), AutoReconnect(), 'result'])
+    assert safe_mongo_call(call)() == 'result'
+    assert call.call_count == 3
+    assert [args[0] for args, _ in no_sleep.call_args_list] == \
+        [config.mongo_retry_backoff, config.mongo_retry_backoff * 2]
+
+
+def test_safe_mongo_call_bounded(no_sleep):
+    call = mock.Mock(side_effect=AutoReconnect())
+    with pytest.raises(AutoReconnect):
+        safe_mongo_call(call)()
+    assert call.call_count == config.mongo_retry_attempts
+
+
+def test_safe_mongo_call_other_error(no_sleep):
+    call = mock.Mock(side_effect=OperationFailure('error'))
+    with pytest.raises(OperationFailure):
+        safe_mongo_call(call)()
+    assert call.call_count == 1
+
+
+def test_get_client_options():
+    options = MongoDBDatabaseConnection.get_client_options(
+        uri_parser.parse_uri('mongodb://localhost/fmd?readPreference=secondary')['options'])
+    assert 'readPreference' not in options
+    assert options['readConcernLevel'] == config.mongo_read_concern
+    assert options['maxPoolSize'] == config.mongo_max_pool_size
+    assert options['socketTimeoutMS'] == int(config.mongo_socket_timeout * 1000)
+    assert options['retryWrites']
+
+
+def test_get_client_options_unacknowledged(config):
+    with mock.patch.object(config, 'mongo_write_concern', '0'), \
+            mock.patch.object(config, 'mongo_compressors', 'zstd,snappy'):
+        options = MongoDBDatabaseConnection.get_client_options({})
+    assert options['w'] == 0
+    assert 'journal' not in options
+    assert options['compressors'] == 'zstd,snappy'
+
+
+def test_pool_statistics():
+    statistics = PoolStatistics()
+    for _ in range(3):
+        statistics.connection_created(None)
+    statistics.connection_checked_out(None)
+    statistics.connection_checked_out(None)
+    statistics.connection_checked_in(None)
+    statistics.connection_closed(None)
+    statistics.connection_check_out_failed(None)
+    stats = statistics.stats()
+    assert stats['open'] == 2
+    assert stats['in_use'] == 1
+    assert stats['idle'] == 1
+    assert stats['created'] == 3
+    assert stats['checkout_failures'] == 1
+
+
+def test_bulk_create_stack_lines_with_endpoint_id():
+    database = mock.MagicMock()
+    time_requested = datetime.datetime.utcnow()
+    stack_lines = [StackLine(request_id='request', position=i) for i in range(3)]
+    StackLineQuery(database).bulk_create(stack_lines, endpoint_id=42, time_requested=time_requested)
+    collection = database['{}StackLine'.format(config.table_prefix)]
+    [(inserted,), _] = collection.insert_many.call_args
+    assert [stack_line['endpoint_id'] for stack_line in inserted] == [42, 42, 42]
+    assert [stack_line.get('time_requested') for stack_line in inserted] == \
+        [time_requested, None, None]
+    database['{}Request'.format(config.table_prefix)].find.assert_not_called()
+
+
+def test_bulk_create_stack_lines_without_endpoint_id():
+    database = mock.MagicMock()
+    time_requested = datetime.datetime.utcnow()
+    collection = database['{}StackLine'.format(config.table_prefix)]
+    collection.find.return_value = [
+        dict(id='request', endpoint_id=42, time_requested=time_requested)]
+    stack_lines = [StackLine(request_id='request', position=i) for i in range(2)]
+    StackLineQuery(database).bulk_create(stack_lines)
+    [(inserted,), _] = collection.insert_many.call_args
+    assert [stack_line['endpoint_id'] for stack_line in inserted] == [42, 42]
+    assert inserted[0]['time_requested'] == time_requested
+
+
+def test_create_outlier_record_with_endpoint_id():
+    database = mock.MagicMock()
+    time_requested = datetime.datetime.utcnow()
+    OutlierQuery(database).create_outlier_record(Outlier(request_id='request'), endpoint_id=42,
+                                                 time_requested=time_requested)
+    collection = database['{}Outlier'.format(config.table_prefix)]
+    [(inserted,), _] = collection.insert_one.call_args
+    assert inserted['endpoint_id'] == 42
+    assert inserted['time_requested'] == time_requested
+    database['{}Request'.format(config.table_prefix)].find_one.assert_not_called()
+
+
+def test_embed_stack_lines(config):
+    database = mock.MagicMock()
+    stack_lines = [StackLine(request_id='request', position=i, indent=i, duration=10 - i,
+                             code_id=str(i))
+                   for i in reversed(range(3))]
+    with mock.patch.object(config, 'mongo_embedded_profiles', True):
+        StackLineQuery(database).bulk_create(stack_lines, endpoint_id=42)
+    collection = database['{}Request'.format(config.table_prefix)]
+    collection.update_one.assert_called_once_with(
+        {"id": "request"}, {"$set": {"stack_lines": [['0', 0, 10], ['1', 1, 9], ['2', 2, 8]]}})
+    collection.insert_many.assert_not_called()
+
+
+def test_get_embedded_profiles(config):
+    database = mock.MagicMock()
+    collection = database['{}Request'.format(config.table_prefix)]
+    cursor = mock.MagicMock()
+    cursor.sort.return_value.skip.return_value.limit.return_value = [dict(
+        id='request', endpoint_id=42, time_requested=datetime.datetime.utcnow(),
+        stack_lines=[['a', 0, 10.0], ['b', 1, 5.0]],
+    )]
+    code_lines = [dict(id='a', code='x = 1'), dict(id='b', code='y = 2')]
+    collection.find.side_effect = lambda query: cursor if 'stack_lines' in query else code_lines
+
+    with mock.patch.object(config, 'mongo_embedded_profiles', True):
+        [request] = StackLineQuery(database).get_profiled_requests(42, offset=5, per_page=10)
+
+    cursor.sort.assert_called_once_with([("time_requested", -1)])
+    cursor.sort.return_value.skip.assert_called_once_with(5)
+    cursor.sort.return_value.skip.return_value.limit.assert_called_once_with(10)
+    assert request.id == 'request'
+    assert [line.position for line in request.stack_lines] == [0, 1]
+    assert [line.indent for line in request.stack_lines] == [0, 1]
+    assert [line.code.code for line in request.stack_lines] == ['x = 1', 'y = 2']
+
+
+def test_get_outliers_sorted():
+    database = mock.MagicMock()
+    collection = database['{}Outlier'.format(config.table_prefix)]
+    collection.aggregate.return_value = [dict(id='outlier', request_id='request', endpoint_id=42,
+                                              request=dict(id='request', endpoint_id=42))]
+    [outlier] = OutlierQuery(database).get_outliers_sorted(42, offset=20, per_page=10)
+    [(pipeline,), _] = collection.aggregate.call_args
+    assert [list(stage)[0] for stage in pipeline] == [
+        '$match', '$sort', '$skip', '$limit', '$lookup', '$unwind', '$project']
+    assert pipeline[-1] == {'$project': {'request.stack_lines': 0}}
+    assert pipeline[1] == {'$sort': {'time_requested': -1, '__creation_datetime__': -1}}
+    assert pipeline[2:4] == [{'$skip': 20}, {'$limit': 10}]
+    assert outlier.id == 'outlier'
+    assert outlier.request.id == 'request'
+
+
+def test_get_paginated_profiles(config):
+    database = mock.MagicMock()
+    collection = database['{}StackLine'.format(config.table_prefix)]
+    collection.aggregate.return_value = [dict(
+        request=dict(id='request', endpoint_id=42),
+        stack_lines=[dict(request_id='request', position=1, indent=1, code_id='b'),
+                     dict(request_id='request', position=0, indent=0, code_id='a')],
+    )]
+    collection.find.return_value = [dict(id='a', code='x = 1'), dict(id='b', code='y = 2')]
+    [request] = StackLineQuery(database).get_profiled_requests(42, offset=0, per_page=10)
+    [(pipeline,), _] = collection.aggregate.call_args
+    assert [list(stage)[0] for stage in pipeline][:4] == ['$match', '$sort', '$skip', '$limit']
+    assert pipeline[0] == {'$match': {'endpoint_id': 42, 'position': 0}}
+    assert pipeline[1] == {'$sort': {'time_requested': -1, '__creation_datetime__': -1}}
+    assert request.id == 'request'
+    assert [line.position for line in request.stack_lines] == [0, 1]
+    assert [line.code.code for line in request.stack_lines] == ['x = 1', 'y = 2']
+
+
+def test_find_by_request_id_embedded(config):
+    database = mock.MagicMock()
+    collection = database['{}Request'.format(config.table_prefix)]
+    collection.find_one.return_value = dict(
+        id='request', endpoint_id=42, stack_lines=[['a', 0, 10.0]])
+    with mock.patch.object(config, 'mongo_embedded_profiles', True):
+        stack_line = StackLineQuery(database).find_by_request_id('request')
+    [(_, projection), _] = collection.find_one.call_args
+    assert projection == {"endpoint_id": 1, "stack_lines": {"$slice": 1}}
+    assert stack_line.code_id == 'a'
+    assert stack_line.endpoint_id == 42
+
+
+def test_get_latencies_samples():
+    database = mock.MagicMock()
+    collection = database['{}Request'.format(config.table_prefix)]
+    collection.aggregate.return_value = [dict(_id=1, durations=[10.0, 20.0])]
+    samples = RequestQuery(database).get_latencies_samples([], sample_size=5)
+    assert samples == {1: [10.0, 20.0]}
+    [(pipeline,), _] = collection.aggregate.call_args
+    assert [list(stage)[0] for stage in pipeline] == ['$match', '$project', '$group']
+    assert pipeline[2]['$group']['durations']['$topN']['n'] == 5
+    collection.count_documents.assert_not_called()
+
+
+def test_get_latencies_samples_per_endpoint():
+    database = mock.MagicMock()
+    collection = database['{}Request'.format(config.table_prefix)]
+    collection.find.return_value = [dict(id=1), dict(id=2)]
+    collection.aggregate.side_effect = [
+        OperationFailure('$topN is not supported'), [dict(duration=10.0), dict(duration=20.0)], []]
+    samples = RequestQuery(database).get_latencies_samples([], sample_size=5)
+    assert samples == {1: [10.0, 20.0]}
+    [(pipeline,), _] = collection.aggregate.call_args_list[1]
+    assert pipeline[:2] == [{'$match': {'endpoint_id': 1}}, {'$sample': {'size': 5}}]
+
+
+def test_update_rollups_not_retried(no_sleep):
+    database = mock.MagicMock()
+    collection = database['{}RequestRollup'.format(config.table_prefix)]
+    collection.bulk_write.side_effect = NetworkTimeout('timed out')
+    rollup = dict(endpoint_id=42, version_requested='1.0', granularity=3600, bucket=0, count=1,
+                  error_count=0, duration_sum=10.0, duration_min=10.0, duration_max=10.0,
+                  sketch=DDSketch.from_values([10.0]))
+    with pytest.raises(NetworkTimeout):
+        RollupQuery(database).update_rollups([rollup])
+    # the server may have applied the $inc already, so retrying could count the requests twice
+    assert collection.bulk_write.call_count == 1
@@ -6,14 +6,17 @@ from __future__ import division  # can be removed once we leave python 2.7
 
 import time
 from datetime import datetime, timedelta
+from unittest import mock
 
 import pytest
 
 from flask_monitoringdashboard.core.date_interval import DateInterval
 from flask_monitoringdashboard.database.count import count_requests
+from flask_monitoringdashboard.database.data_base_queries.query_base_object import RequestQueryBase
 from flask_monitoringdashboard.database.endpoint import get_avg_duration, get_endpoints
-from flask_monitoringdashboard.database.request import add_request, \
-    get_date_of_first_request, get_latencies_sample, create_time_based_sample_criterion
+from flask_monitoringdashboard.database.request import add_request, add_requests, \
+    get_date_of_first_request, get_latencies_sample, create_time_based_sample_criterion, \
+    get_latencies_samples, get_status_code_frequencies_per_endpoint
 from flask_monitoringdashboard.database.versions import get_versions
 
 
@@ -25,6 +28,47 @@ def test_get_latencies_sample(session, request_1, endpoint):
     assert data == [request_1.duration]
 
 
+def test_get_latencies_sample_size(session, endpoint, request_factory):
+    durations = {request_factory(endpoint=endpoint, duration=i).duration for i in range(20)}
+    interval = DateInterval(datetime.utcnow() - timedelta(days=1), datetime.utcnow())
+    requests_criterion = create_time_based_sample_criterion(interval.start_date(),
+                                                            interval.end_date())
+    data = get_latencies_sample(session, endpoint.id, requests_criterion, sample_size=5)
+    assert len(data) == 5
+    assert len(set(data)) == 5
+    assert set(data) <= durations
+
+
+def test_get_latencies_samples(session, endpoint_factory, request_factory):
+    small, large = endpoint_factory(), endpoint_factory()
+    request = request_factory(endpoint=small)
+    durations = {request_factory(endpoint=large, duration=i).duration for i in range(20)}
+    interval = DateInterval(datetime.utcnow() - timedelta(days=1), datetime.utcnow())
+    requests_criterion = create_time_based_sample_criterion(interval.start_date(),
+                                                            interval.end_date())
+    samples = get_latencies_samples(session, requests_criterion, sample_size=5)
+    assert samples[small.id] == [request.duration]
+    assert len(samples[large.id]) == 5
+    assert set(samples[large.id]) <= durations
+
+
+def test_get_status_code_frequencies_per_endpoint(session, endpoint_factory, request_factory):
+    endpoint_1, endpoint_2 = endpoint_factory(), endpoint_factory()
+    for status_code in [200, 200, 404]:
+        request_factory(endpoint=endpoint_1, status_code=status_code)
+    request_factory(endpoint=endpoint_2, status_code=500)
+    frequencies = get_status_code_frequencies_per_endpoint(session)
+    assert frequencies[endpoint_1.id] == {200: 2, 404: 1}
+    assert frequencies[endpoint_2.id] == {500: 1}
+
+
+def test_reservoir_sample():
+    sample = RequestQueryBase.reservoir_sample(iter(range(100)), 10)
+    assert len(set(sample)) == 10
+    assert all(0 <= value < 100 for value in sample)
+    assert RequestQueryBase.reservoir_sample(iter(range(3)), 10) == [0, 1, 2]
+
+
 def test_add_request(endpoint, session):
     try:
         num_requests = len(endpoint.requests)
@@ -41,6 +85,22 @@ def test_add_request(endpoint, session):
     assert count_requests(session, endpoint.id) == num_requests + 1
 
 
+def test_add_requests(endpoint, session):
+    num_requests = count_requests(session, endpoint.id)
+    add_requests(session, [
+        dict(
+            duration=200,
+            endpoint_id=endpoint.id,
+            ip='127.0.0.1',
+            group_by=None,
+            status_code=200,
+            time_requested=datetime.utcnow(),
+        )
+        for _ in range(3)
+    ])
+    assert count_requests(session, endpoint.id) == num_requests + 3
+
+
 @pytest.mark.parametrize('request_1__time_requested', [datetime(2020, 2, 3)])
 def test_get_versions(session, request_1):
     for version, first_request in get_versions(session):
@@ -66,3 +126,22 @@ def test_get_date_of_first_request(session, request_1):
 
 def test_get_avg_duration(session, request_1, request_2, endpoint):
     assert get_avg_duration(session, endpoint.id) == (request_1.duration + request_2.duration) / 2
+
+
+def test_get_latencies_sample_sparse(session, endpoint_factory):
+    endpoint, other = endpoint_factory(), endpoint_factory()
+    requests = []
+    for i in range(10):
+        requests.append(dict(duration=i, endpoint_id=endpoint.id, ip='127.0.0.1', group_by=None,
+                             status_code=200, time_requested=datetime.utcnow()))
+        requests.extend(dict(duration=100, endpoint_id=other.id, ip='127.0.0.1', group_by=None,
+                             status_code=200, time_requested=datetime.utcnow()) for _ in range(25))
+    add_requests(session, requests)
+    interval = DateInterval(datetime.utcnow() - timedelta(days=1), datetime.utcnow())
+    requests_criterion = create_time_based_sample_criterion(interval.start_date(),
+                                                            interval.end_date())
+    # the ids are too sparse for id-range sampling, so the database shuffles the rows
+    with mock.patch.object(RequestQueryBase, 'reservoir_sample', side_effect=AssertionError):
+        data = get_latencies_sample(session, endpoint.id, requests_criterion, sample_size=5)
+    assert len(set(data)) == 5
+    assert set(data) <= set(range(10))
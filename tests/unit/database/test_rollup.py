@@ -0,0 +1,87 @@
+"""
+This file contains all unit tests for the rollups in the database. (Corresponding to the
+file: 'flask_monitoringdashboard/database/rollup.py')
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from flask_monitoringdashboard.database.count_group import get_value
+from flask_monitoringdashboard.database.rollup import (
+    DAY,
+    HOUR,
+    MINUTE,
+    aggregate_requests,
+    get_bucket,
+    get_ranges,
+    get_rollup_buckets,
+    get_rollup_hits,
+    get_rollup_medians,
+    get_rollup_quantiles,
+    get_rollup_totals,
+    rebuild_rollups,
+    update_rollups,
+)
+
+
+def test_get_bucket():
+    time = datetime(2020, 5, 17, 13, 42, 31, 500)
+    assert get_bucket(time, MINUTE) == datetime(2020, 5, 17, 13, 42)
+    assert get_bucket(time, HOUR) == datetime(2020, 5, 17, 13)
+    assert get_bucket(time, DAY) == datetime(2020, 5, 17)
+
+
+def test_get_ranges():
+    assert get_ranges() == [(DAY, None, None)]
+    assert get_ranges(datetime(2020, 5, 17, 13, 42, 31)) == [
+        (MINUTE, datetime(2020, 5, 17, 13, 42), datetime(2020, 5, 17, 14)),
+        (HOUR, datetime(2020, 5, 17, 14), datetime(2020, 5, 18)),
+        (DAY, datetime(2020, 5, 18), None),
+    ]
+    assert get_ranges(datetime(2020, 5, 17)) == [(DAY, datetime(2020, 5, 17), None)]
+
+
+def test_aggregate_requests():
+    time = datetime(2020, 5, 17, 13, 42)
+    rollups = aggregate_requests([
+        (1, '1.0', time, 10, 200),
+        (1, '1.0', time + timedelta(seconds=30), 30, 500),
+        (1, '1.0', time + timedelta(minutes=1), 20, None),
+    ])
+    [day] = [rollup for rollup in rollups if rollup['granularity'] == DAY]
+    assert (day['count'], day['error_count'], day['duration_sum']) == (3, 1, 60)
+    assert (day['duration_min'], day['duration_max']) == (10, 30)
+    assert len([rollup for rollup in rollups if rollup['granularity'] == MINUTE]) == 2
+
+
+def test_update_rollups(session, endpoint):
+    time = datetime.utcnow() - timedelta(days=30)
+    rollups = aggregate_requests(
+        [(endpoint.id, '1.0', time, 10, 200), (endpoint.id, '1.0', time, 30, 404)])
+    update_rollups(session, rollups)
+    update_rollups(session, aggregate_requests([(endpoint.id, '1.0', time, 5, 200)]))
+
+    [row] = [row for row in get_rollup_totals(session) if row[0] == endpoint.id]
+    assert tuple(row[1:]) == (3, 1, 45, 5, 30)
+    assert not [row for row in get_rollup_totals(session, datetime.utcnow() - timedelta(days=1))
+                if row[0] == endpoint.id]
+
+    [(_, [median, maximum])] = get_rollup_quantiles(session, [0.5, 1], endpoint_id=endpoint.id)
+    assert median == pytest.approx(10, rel=0.01)
+    assert maximum == pytest.approx(30, rel=0.01)
+    [(_, [median])] = get_rollup_quantiles(session, [0.5], endpoint_id=endpoint.id, by_version=True)
+    assert median == pytest.approx(10, rel=0.01)
+
+    [(_, bucket, count)] = get_rollup_buckets(
+        session, HOUR, time - timedelta(hours=1), time + timedelta(hours=1), endpoint.id)
+    assert (bucket, count) == (get_bucket(time, HOUR), 3)
+
+
+@pytest.mark.parametrize('request_2__status_code', [500])
+def test_rebuild_rollups(session, endpoint, request_1, request_2):
+    assert rebuild_rollups(session, batch_size=1) >= 2
+    hits, errors = get_rollup_hits(session, datetime.utcnow() - timedelta(days=1))
+    assert get_value(hits, endpoint.id) == 2
+    assert get_value(errors, endpoint.id) == 1
+    assert get_value(get_rollup_medians(session), endpoint.id) == pytest.approx(
+        min(request_1.duration, request_2.duration), rel=0.01)
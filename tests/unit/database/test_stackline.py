@@ -1,5 +1,6 @@
 from flask_monitoringdashboard.database.stack_line import (
     add_stack_line,
+    add_stack_lines,
     get_profiled_requests,
     get_grouped_profiled_requests,
 )
@@ -33,3 +34,15 @@ def test_get_grouped_profiled_requests(session, request_1, endpoint):
     add_stack_line(session, request_id=request_1.id, position=0, indent=1, duration=1, code_line="code")
     StackLineQuery(session).commit()
     assert get_grouped_profiled_requests(session, endpoint_id=endpoint.id)
+
+
+def test_add_stack_lines(session, endpoint, request_1):
+    code_line = ('filename', 42, 'f', 'x = 5')
+    stack_lines = [(0, 10, code_line), (1, 5, code_line), (1, 5, ('fn', 1, 'g', 'y = 6'))]
+    add_stack_lines(session, request_id=request_1.id, stack_lines=stack_lines)
+    StackLineQuery(session).commit()
+    [request] = get_profiled_requests(session, endpoint_id=endpoint.id, offset=0, per_page=10)
+    result = sorted(request.stack_lines, key=lambda stack_line: stack_line.position)
+    assert [stack_line.indent for stack_line in result] == [0, 1, 1]
+    assert result[0].code_id == result[1].code_id != result[2].code_id
+    assert result[2].code.code == 'y = 6'
@@ -0,0 +1,20 @@
+from flask import Flask
+
+from flask_monitoringdashboard.cli import fmd
+
+
+def test_indexes(config):
+    runner = Flask(__name__).test_cli_runner()
+
+    result = runner.invoke(fmd, ['indexes'])
+    assert result.exit_code == 0, result.output
+
+    result = runner.invoke(fmd, ['indexes', '--verify'])
+    assert result.exit_code == 0, result.output
+    assert 'All indexes exist' in result.output
+
+
+def test_rebuild_rollups(config, request_1):
+    result = Flask(__name__).test_cli_runner().invoke(fmd, ['rebuild-rollups'])
+    assert result.exit_code == 0, result.output
+    assert 'The rollups have been rebuilt' in result.output